@@ -0,0 +1,130 @@
+"""
+飞书群发调度器 (Fanout Dispatcher)
+
+把同一操作并发地施加到一批对象（通常是用户open_id）上：
+- 线程池并发，受令牌桶限制的飞书API调用速率
+- 失败按指数退避重试
+- 汇总单次群发的成功/失败与耗时分布
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List
+
+from Module.Common.scripts.common import debug_utils
+
+
+class RateLimiter:
+    """令牌桶：每秒补充 rate 个令牌，最多积攒 burst 个"""
+
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = max(float(rate), 0.1)
+        self.capacity = float(burst or max(1, int(self.rate)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 1):
+        """取得令牌，不足时阻塞等待"""
+        tokens = min(float(tokens), self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class FanoutDispatcher:
+    """
+    并发群发调度器
+
+    worker(item) 返回真值表示成功，返回假值或抛异常表示失败并重试；
+    每次尝试前按 cost 取令牌（一次投递包含的飞书API调用数）。
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        rate_per_second: float = 20,
+        max_retries: int = 2,
+        backoff_seconds: float = 0.5,
+    ):
+        self.max_workers = max(1, int(max_workers))
+        self.rate_limiter = RateLimiter(rate_per_second)
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_seconds = backoff_seconds
+
+    def run(
+        self, items: Iterable[str], worker: Callable[[str], Any], cost: int = 1
+    ) -> Dict[str, Any]:
+        """
+        并发执行并等待全部完成
+
+        Returns:
+            Dict: 本次群发报告
+                total / succeeded / failed(失败对象列表) / retries
+                elapsed_ms（整批耗时）/ p50_ms / p95_ms / max_ms（单个对象投递耗时）
+        """
+        items = list(dict.fromkeys(items))
+        latencies: List[float] = []
+        failed: List[str] = []
+        retries = [0]
+        lock = threading.Lock()
+
+        def deliver(item: str):
+            start = time.perf_counter()
+            ok = False
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    with lock:
+                        retries[0] += 1
+                    time.sleep(self.backoff_seconds * (2 ** (attempt - 1)))
+                self.rate_limiter.acquire(cost)
+                try:
+                    ok = bool(worker(item))
+                except Exception as e:
+                    debug_utils.log_and_print(
+                        f"群发投递异常({item}, 第{attempt + 1}次): {e}", log_level="WARNING"
+                    )
+                    ok = False
+                if ok:
+                    break
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+                if not ok:
+                    failed.append(item)
+
+        batch_start = time.perf_counter()
+        if items:
+            with ThreadPoolExecutor(
+                max_workers=min(self.max_workers, len(items)),
+                thread_name_prefix="fanout",
+            ) as pool:
+                list(pool.map(deliver, items))
+        elapsed_ms = (time.perf_counter() - batch_start) * 1000
+
+        latencies.sort()
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 1)
+
+        return {
+            "total": len(items),
+            "succeeded": len(items) - len(failed),
+            "failed": failed,
+            "retries": retries[0],
+            "elapsed_ms": round(elapsed_ms, 1),
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "max_ms": round(latencies[-1], 1) if latencies else 0.0,
+        }
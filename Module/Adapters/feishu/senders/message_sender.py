@@ -11,12 +11,11 @@
 import json
 import os
 from typing import Optional, Dict, Any, Tuple, List, Callable
-from pathlib import Path
 import base64
 from io import BytesIO
 import time
-import asyncio
-from lark_oapi.api.contact.v3 import GetUserRequest
+from concurrent.futures import Future
+from lark_oapi.api.contact.v3 import BatchUserRequest
 from lark_oapi.api.im.v1 import (
     CreateMessageRequest,
     CreateMessageRequestBody,
@@ -57,6 +56,7 @@ from lark_oapi.api.cardkit.v1 import (
 from Module.Common.scripts.common import debug_utils
 from Module.Business.processors import ProcessResult, MessageContext_Refactor
 from ..decorators import feishu_sdk_safe, file_operation_safe
+from .fanout_dispatcher import FanoutDispatcher
 from Module.Services.constants import (
     ServiceNames,
     ReplyModes,
@@ -66,38 +66,39 @@ from Module.Services.constants import (
     ResponseTypes,
 )
 from Module.Services.service_decorators import require_service
+from Module.Services.async_loop_service import get_async_loop
 
 
 class AsyncTaskManager:
+    """延迟任务调度，统一运行在共享后台事件循环上（可在任意线程调用）"""
+
     def __init__(self):
-        self.loop = asyncio.get_event_loop()
+        self.async_loop = get_async_loop()
 
-    async def delay_execute(
-        self, func: Callable, delay_seconds: float, *args, **kwargs
-    ) -> Any:
-        """延迟执行指定的函数"""
+    def _run_safely(self, func: Callable, *args, **kwargs) -> Any:
         try:
-            await asyncio.sleep(delay_seconds)
-            result = await asyncio.to_thread(
-                func, *args, **kwargs
-            )  # 在线程中执行同步函数
-            return result
+            return func(*args, **kwargs)
         except Exception as e:
             debug_utils.log_and_print(f"异步任务执行失败: {str(e)}", log_level="ERROR")
             return None
 
     def schedule_task(
         self, func: Callable, delay_seconds: float, *args, **kwargs
-    ) -> asyncio.Future:
-        """调度异步任务并返回 Future 对象"""
-        return asyncio.ensure_future(
-            self.delay_execute(func, delay_seconds, *args, **kwargs)
+    ) -> Future:
+        """调度延迟任务并返回 Future 对象"""
+        return self.async_loop.call_later(
+            delay_seconds, self._run_safely, func, *args, **kwargs
         )
 
 
 class MessageSender:
     """飞书消息发送器"""
 
+    # 批量通讯录接口单次最多50个用户
+    USER_BATCH_SIZE = 50
+    # 用户名查询失败后的负缓存时长（秒）
+    USER_NAME_NEGATIVE_TTL = 600
+
     def __init__(self, client, app_controller=None):
         """
         初始化消息发送器
@@ -109,8 +110,9 @@ class MessageSender:
         self.client = client
         self.app_controller = app_controller
         self.async_task_manager = AsyncTaskManager()
+        # 用户名负缓存：{open_id: 查询失败时间}
+        self._user_name_failures: Dict[str, float] = {}
 
-    @feishu_sdk_safe("获取用户名失败", return_value="用户_未知")
     def get_user_name(self, open_id: str) -> str:
         """
         获取用户昵称
@@ -121,42 +123,101 @@ class MessageSender:
         Returns:
             str: 用户昵称，获取失败时返回默认值
         """
-        # 先从缓存获取
-        if self.app_controller:
-            success, cached_name = self.app_controller.call_service(
-                ServiceNames.CACHE, "get_user_name", f"user:{open_id}"
-            )
-            if success and cached_name:
-                return cached_name
+        return self.resolve_user_names([open_id]).get(open_id, "用户_未知")
+
+    def resolve_user_names(self, open_ids: List[str]) -> Dict[str, str]:
+        """
+        批量获取用户昵称
+
+        先查缓存服务；未命中的 open_id 按 USER_BATCH_SIZE 分组走批量通讯录接口，
+        整批结束后只写一次用户缓存。请求成功但未返回的用户进入负缓存，
+        USER_NAME_NEGATIVE_TTL 内直接返回默认名，不再请求；
+        请求本身失败（限流、权限、服务端错误）的批次不进负缓存，下次照常重试。
+
+        Args:
+            open_ids: 用户open_id列表（可重复）
+
+        Returns:
+            Dict[str, str]: open_id -> 昵称，获取失败的为默认值
+        """
+        names = {}
+        pending = []
+        now = time.time()
+        for open_id in dict.fromkeys(open_ids):
+            if not open_id:
+                continue
+            # 先从缓存获取
+            if self.app_controller:
+                success, cached_name = self.app_controller.call_service(
+                    ServiceNames.CACHE, "get_user_name", f"user:{open_id}"
+                )
+                if success and cached_name:
+                    names[open_id] = cached_name
+                    continue
+            if now - self._user_name_failures.get(open_id, 0) < self.USER_NAME_NEGATIVE_TTL:
+                names[open_id] = f"用户_{open_id[:8]}"
+                continue
+            pending.append(open_id)
+
+        resolved = {}
+        missing = []
+        for i in range(0, len(pending), self.USER_BATCH_SIZE):
+            chunk = pending[i : i + self.USER_BATCH_SIZE]
+            batch_names = self._batch_get_users(chunk)
+            if batch_names is None:
+                continue
+            resolved.update(batch_names)
+            missing.extend(open_id for open_id in chunk if open_id not in batch_names)
+
+        for open_id in pending:
+            if open_id in resolved:
+                names[open_id] = resolved[open_id]
+                self._user_name_failures.pop(open_id, None)
+            else:
+                names[open_id] = f"用户_{open_id[:8]}"
+        for open_id in missing:
+            self._user_name_failures[open_id] = now
+
+        # 缓存用户名
+        if resolved and self.app_controller:
+            for open_id, name in resolved.items():
+                self.app_controller.call_service(
+                    ServiceNames.CACHE, "update_user", f"user:{open_id}", name
+                )
+            self.app_controller.call_service(ServiceNames.CACHE, "save_user_cache")
+
+        return names
 
+    @feishu_sdk_safe("批量获取用户信息失败", return_value=None)
+    def _batch_get_users(self, open_ids: List[str]) -> Optional[Dict[str, str]]:
+        """调用批量通讯录接口，返回查到的 open_id -> 昵称；请求失败返回None"""
         request = (
-            GetUserRequest.builder()
+            BatchUserRequest.builder()
+            .user_ids(open_ids)
             .user_id_type(ReceiverIdTypes.OPEN_ID)
-            .user_id(open_id)
             .build()
         )
-        response = self.client.contact.v3.user.get(request)
-        if response.success() and response.data and response.data.user:
-            user = response.data.user
+        response = self.client.contact.v3.user.batch(request)
+        if not response.success():
+            debug_utils.log_and_print(
+                f"批量获取用户信息失败: {response.code} - {response.msg}",
+                log_level="WARNING",
+            )
+            return None
+
+        names = {}
+        for user in (response.data.items if response.data else None) or []:
+            open_id = getattr(user, "open_id", None)
+            if not open_id:
+                continue
             # 优先级：nickname > display_name > name > open_id
-            name = (
+            names[open_id] = (
                 getattr(user, "nickname", None)
                 or getattr(user, "display_name", None)
                 or getattr(user, "name", None)
                 or f"用户_{open_id[:8]}"
             )
-            # 缓存用户名
-            if self.app_controller:
-                self.app_controller.call_service(
-                    ServiceNames.CACHE, "update_user", f"user:{open_id}", name
-                )
-                self.app_controller.call_service(ServiceNames.CACHE, "save_user_cache")
-            return name
-
-        debug_utils.log_and_print(
-            f"获取用户名失败: {response.code} - {response.msg}", log_level="WARNING"
-        )
-        return f"用户_{open_id[:8]}"
+        return names
 
     @feishu_sdk_safe("发送飞书回复失败", return_value=False)
     def send_feishu_reply(
@@ -344,6 +405,82 @@ class MessageSender:
             user_id, content_json, result.response_type, "open_id"
         )
 
+    def broadcast_card(
+        self, user_ids: List[str], card_data: Dict[str, Any], card_name: str = ""
+    ) -> Dict[str, Any]:
+        """
+        把同一张卡片并发发送给多个用户
+
+        每个用户独立创建卡片实体并私聊发送（实体创建失败则直接发送卡片JSON）；
+        并发、速率和重试由配置 fanout 段控制。
+        message_id -> card_id 映射逐个记入内存，全部发送完成后统一写一次。
+
+        Args:
+            user_ids: 接收用户open_id列表
+            card_data: 卡片JSON
+            card_name: 记录到映射中的卡片名
+
+        Returns:
+            Dict[str, Any]: FanoutDispatcher 的群发报告
+        """
+        config_service = (
+            self.app_controller.get_service(ServiceNames.CONFIG)
+            if self.app_controller
+            else None
+        )
+        fanout_config = config_service.get("fanout", {}) if config_service else {}
+        dispatcher = FanoutDispatcher(
+            max_workers=fanout_config.get("max_workers", 8),
+            rate_per_second=fanout_config.get("rate_per_second", 20),
+            max_retries=fanout_config.get("max_retries", 2),
+            backoff_seconds=fanout_config.get("backoff_seconds", 0.5),
+        )
+        cache_service = (
+            self.app_controller.get_service(ServiceNames.CACHE)
+            if self.app_controller
+            else None
+        )
+        # 重试时复用已创建的卡片实体
+        card_ids: Dict[str, str] = {}
+
+        def deliver(user_id: str) -> bool:
+            card_id = card_ids.get(user_id) or self.create_card_entity(
+                {"type": "card_json", "data": card_data}
+            )
+            if card_id:
+                card_ids[user_id] = card_id
+                content = {"type": "card", "data": {"card_id": card_id}}
+            else:
+                # 卡片实体创建失败时直接发送卡片JSON
+                content = card_data
+
+            msg_success, msg_id = self._send_create_message(
+                user_id, json.dumps(content), "interactive"
+            )
+            if msg_success and card_id and cache_service:
+                cache_service.update_message_id_card_id_mapping(
+                    msg_id, card_id, card_name
+                )
+            return msg_success
+
+        # 一次投递 = 创建卡片实体 + 发送消息，两次API调用
+        report = dispatcher.run(user_ids, deliver, cost=2)
+
+        if cache_service and report["succeeded"]:
+            cache_service.save_message_id_card_id_mapping()
+
+        debug_utils.log_and_print(
+            f"群发{card_name}完成: {report['succeeded']}/{report['total']} 成功, "
+            f"重试 {report['retries']} 次, 总耗时 {report['elapsed_ms']}ms, "
+            f"单用户 p50 {report['p50_ms']}ms / p95 {report['p95_ms']}ms",
+            log_level="INFO" if not report["failed"] else "WARNING",
+        )
+        if report["failed"]:
+            debug_utils.log_and_print(
+                f"群发{card_name}失败用户: {report['failed']}", log_level="WARNING"
+            )
+        return report
+
     @feishu_sdk_safe("发送交互式卡片失败", return_value=(False, None))
     def send_interactive_card(
         self,
@@ -595,116 +732,145 @@ class MessageSender:
         return False
 
     @file_operation_safe("上传单张图片失败", return_value="")
-    def upload_and_get_image_key(self, image_path: str) -> bool:
-        """上传并获取图片key"""
+    def upload_and_get_image_key(self, image_path: str) -> str:
+        """上传并获取图片key（相同内容的图片复用已有key）"""
         with open(image_path, "rb") as image_file:
-            upload_response = self.client.im.v1.image.create(
-                CreateImageRequest.builder()
-                .request_body(
-                    CreateImageRequestBody.builder()
-                    .image_type("message")
-                    .image(image_file)
-                    .build()
-                )
-                .build()
-            )
-            if (
-                upload_response.success()
-                and upload_response.data
-                and upload_response.data.image_key
-            ):
-                return upload_response.data.image_key
+            image_data = image_file.read()
+
+        image_key = self.get_or_upload_image_key(image_data)
+        if not image_key:
             debug_utils.log_and_print(
-                f"图片上传失败: {upload_response.code} - {upload_response.msg}, image_path: {image_path}",
-                log_level="ERROR",
+                f"图片上传失败, image_path: {image_path}", log_level="ERROR"
             )
-            return ""
+        return image_key
+
+    def get_or_upload_image_key(self, image_data: bytes) -> str:
+        """
+        获取图片的image_key，内容相同的图片只上传一次
+
+        按图片内容sha256查缓存服务中的image_key，未命中再上传并记录；
+        示例图片、重复的二维码、命中生成缓存的每日总结图片都不会重复上传
+
+        Args:
+            image_data: 图片字节数据
+
+        Returns:
+            str: image_key，上传失败返回空字符串
+        """
+        cache_service = (
+            self.app_controller.get_service(ServiceNames.CACHE)
+            if self.app_controller
+            else None
+        )
+        image_hash = ""
+        if cache_service:
+            image_hash = cache_service.hash_image(image_data)
+            image_key = cache_service.get_image_key(image_hash)
+            if image_key:
+                return image_key
+
+        image_key = self._upload_image_data(image_data)
+        if image_key and cache_service:
+            cache_service.update_image_key(image_hash, image_key)
+            cache_service.save_image_key_cache()
+        return image_key
+
+    @feishu_sdk_safe("图片上传失败", return_value="")
+    def _upload_image_data(self, image_data: bytes) -> str:
+        """上传图片到飞书，返回image_key，失败返回空字符串"""
+        upload_response = self.client.im.v1.image.create(
+            CreateImageRequest.builder()
+            .request_body(
+                CreateImageRequestBody.builder()
+                .image_type("message")
+                .image(BytesIO(image_data))
+                .build()
+            )
+            .build()
+        )
+        if (
+            upload_response.success()
+            and upload_response.data
+            and upload_response.data.image_key
+        ):
+            return upload_response.data.image_key
+
+        debug_utils.log_and_print(
+            f"图片上传失败: {upload_response.code} - {upload_response.msg}",
+            log_level="ERROR",
+        )
+        return ""
 
     @file_operation_safe("音频上传处理失败", return_value=False)
     def upload_and_send_audio(
         self, original_data, audio_data: bytes, return_mode="reply"
     ) -> bool:
         """上传音频并发送消息"""
-        temp_mp3_path = None
-        temp_opus_path = None
-
-        try:
-            # 获取音频服务
-            if not self.app_controller:
-                debug_utils.log_and_print("应用控制器不可用", log_level="ERROR")
-                return False
-
-            audio_service = self.app_controller.get_service(ServiceNames.AUDIO)
-            if not audio_service:
-                debug_utils.log_and_print("音频服务不可用", log_level="ERROR")
-                return False
-
-            # 创建临时MP3文件
-            temp_mp3_path = audio_service.create_temp_audio_file(audio_data, ".mp3")
+        # 获取音频服务
+        if not self.app_controller:
+            debug_utils.log_and_print("应用控制器不可用", log_level="ERROR")
+            return False
 
-            # 转换为opus格式
-            temp_opus_path, duration_ms = audio_service.convert_to_opus(temp_mp3_path)
+        audio_service = self.app_controller.get_service(ServiceNames.AUDIO)
+        if not audio_service:
+            debug_utils.log_and_print("音频服务不可用", log_level="ERROR")
+            return False
 
-            if not temp_opus_path or not os.path.exists(temp_opus_path):
-                debug_utils.log_and_print("音频转换失败", log_level="ERROR")
-                return False
+        # 管道模式转换为opus，不经过临时文件
+        opus_data, duration_ms = audio_service.convert_bytes_to_opus(audio_data)
 
-            # 上传到飞书
-            file_key = self._upload_opus_to_feishu(temp_opus_path, duration_ms)
+        if not opus_data:
+            debug_utils.log_and_print("音频转换失败", log_level="ERROR")
+            return False
 
-            if file_key and return_mode == "reply":
-                # 发送音频消息
-                content_json = json.dumps({"file_key": file_key})
-                result = ProcessResult.success_result(
-                    "audio",
-                    json.loads(content_json),
-                    parent_id=original_data.event.message.message_id,
-                )
-                return self.send_feishu_reply(original_data, result)
-            elif file_key and return_mode == "file":
-                return {"file_key": file_key, "duration_ms": duration_ms}
+        # 上传到飞书
+        file_key = self._upload_opus_to_feishu(opus_data, duration_ms)
 
-            debug_utils.log_and_print("音频上传到飞书失败", log_level="ERROR")
-            return False
+        if file_key and return_mode == "reply":
+            # 发送音频消息
+            content_json = json.dumps({"file_key": file_key})
+            result = ProcessResult.success_result(
+                "audio",
+                json.loads(content_json),
+                parent_id=original_data.event.message.message_id,
+            )
+            return self.send_feishu_reply(original_data, result)
+        elif file_key and return_mode == "file":
+            return {"file_key": file_key, "duration_ms": duration_ms}
 
-        finally:
-            # 清理临时文件 - 使用音频服务的清理方法
-            if temp_mp3_path and audio_service:
-                audio_service.cleanup_temp_file(temp_mp3_path)
-            if temp_opus_path and audio_service:
-                audio_service.cleanup_temp_file(temp_opus_path)
+        debug_utils.log_and_print("音频上传到飞书失败", log_level="ERROR")
+        return False
 
     @file_operation_safe("音频上传异常", return_value=None)
-    def _upload_opus_to_feishu(self, opus_path: str, duration_ms: int) -> Optional[str]:
-        """上传opus音频文件到飞书"""
-        with open(opus_path, "rb") as audio_file:
-            opus_filename = Path(opus_path).name
-
-            upload_response = self.client.im.v1.file.create(
-                CreateFileRequest.builder()
-                .request_body(
-                    CreateFileRequestBody.builder()
-                    .file_type("opus")
-                    .file_name(opus_filename)
-                    .duration(str(int(duration_ms)))
-                    .file(audio_file)
-                    .build()
-                )
+    def _upload_opus_to_feishu(
+        self, opus_data: bytes, duration_ms: int, opus_filename: str = "audio.opus"
+    ) -> Optional[str]:
+        """上传opus音频数据到飞书"""
+        upload_response = self.client.im.v1.file.create(
+            CreateFileRequest.builder()
+            .request_body(
+                CreateFileRequestBody.builder()
+                .file_type("opus")
+                .file_name(opus_filename)
+                .duration(str(int(duration_ms)))
+                .file(BytesIO(opus_data))
                 .build()
             )
+            .build()
+        )
 
-            if (
-                upload_response.success()
-                and upload_response.data
-                and upload_response.data.file_key
-            ):
-                return upload_response.data.file_key
+        if (
+            upload_response.success()
+            and upload_response.data
+            and upload_response.data.file_key
+        ):
+            return upload_response.data.file_key
 
-            debug_utils.log_and_print(
-                f"音频上传失败: {upload_response.code} - {upload_response.msg}",
-                log_level="ERROR",
-            )
-            return None
+        debug_utils.log_and_print(
+            f"音频上传失败: {upload_response.code} - {upload_response.msg}",
+            log_level="ERROR",
+        )
+        return None
 
     @file_operation_safe("富文本上传发送失败", return_value=False)
     def upload_and_send_rich_text(self, original_data, result: ProcessResult) -> bool:
@@ -723,23 +889,8 @@ class MessageSender:
             return self.send_feishu_reply(original_data, result)
 
         # 上传图片
-        image_file = BytesIO(image_data)
-        upload_response = self.client.im.v1.image.create(
-            CreateImageRequest.builder()
-            .request_body(
-                CreateImageRequestBody.builder()
-                .image_type("message")
-                .image(image_file)
-                .build()
-            )
-            .build()
-        )
-
-        if not (
-            upload_response.success()
-            and upload_response.data
-            and upload_response.data.image_key
-        ):
+        image_key = self.get_or_upload_image_key(image_data)
+        if not image_key:
             debug_utils.log_and_print("富文本图片上传失败", log_level="ERROR")
             return False
 
@@ -749,8 +900,6 @@ class MessageSender:
             debug_utils.log_and_print("富文本内容为空", log_level="ERROR")
             return False
 
-        image_key = upload_response.data.image_key
-
         # 在第二行插入图片（在链接行后面）
         rich_text_content["zh_cn"]["content"].insert(
             1, [{"tag": "img", "image_key": image_key}]
@@ -767,23 +916,8 @@ class MessageSender:
         self, original_data, image_data: bytes
     ) -> bool:
         """上传并发送单张图片数据"""
-        image_stream = BytesIO(image_data)
-        upload_response = self.client.im.v1.image.create(
-            CreateImageRequest.builder()
-            .request_body(
-                CreateImageRequestBody.builder()
-                .image_type("message")
-                .image(image_stream)
-                .build()
-            )
-            .build()
-        )
-
-        if (
-            upload_response.success()
-            and upload_response.data
-            and upload_response.data.image_key
-        ):
+        image_key = self.get_or_upload_image_key(image_data)
+        if image_key:
             if not hasattr(original_data.event, "message"):
                 parent_id = original_data.event.context.open_message_id
             else:
@@ -791,15 +925,12 @@ class MessageSender:
             # 发送图片消息
             image_result = ProcessResult.success_result(
                 "image",
-                {"image_key": upload_response.data.image_key},
+                {"image_key": image_key},
                 parent_id=parent_id,
             )
             return self.send_feishu_reply(original_data, image_result)
 
-        debug_utils.log_and_print(
-            f"示例图片上传失败: {upload_response.code} - {upload_response.msg}",
-            log_level="ERROR",
-        )
+        debug_utils.log_and_print("示例图片上传失败", log_level="ERROR")
         return False
 
     @feishu_sdk_safe("更新交互式卡片失败", return_value=False)
@@ -842,35 +973,15 @@ class MessageSender:
         Returns:
             bool: 发送是否成功
         """
-        image_stream = BytesIO(image_data)
-        upload_response = self.client.im.v1.image.create(
-            CreateImageRequest.builder()
-            .request_body(
-                CreateImageRequestBody.builder()
-                .image_type("message")
-                .image(image_stream)
-                .build()
-            )
-            .build()
-        )
-
-        if (
-            upload_response.success()
-            and upload_response.data
-            and upload_response.data.image_key
-        ):
-
+        image_key = self.get_or_upload_image_key(image_data)
+        if image_key:
             # 使用context中的message_id作为parent_id
             return self._send_reply_message(
                 message_id=context.parent_message_id,
-                content=json.dumps({"image_key": upload_response.data.image_key}),
+                content=json.dumps({"image_key": image_key}),
                 msg_type="image",
             )[0]
 
-        debug_utils.log_and_print(
-            f"图片上传失败: {upload_response.code} - {upload_response.msg}",
-            log_level="ERROR",
-        )
         return False
 
     @feishu_sdk_safe("发送飞书回复失败", return_value=False)
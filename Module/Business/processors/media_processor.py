@@ -24,7 +24,7 @@ from Module.Services.constants import (
     RouteTypes,
     RoutineRecordModes,
 )
-from Module.Common.scripts.common.translation import extract_phonetics
+from libs.utils.text_utils.pinyin_util import extract_phonetics
 from Module.Business.processors import RouteResult
 
 
@@ -367,6 +367,54 @@ class MediaProcessor(BaseProcessor):
             reply_message_type="card",  # 设置回复消息类型，为后续卡片切换预留
         )
 
+    @staticmethod
+    def _transcribe_sequential(stt_services, classify, match_types):
+        """按优先级依次调用STT服务（hedge_mode=off）"""
+        # 循环调用 STT 服务，直到找到匹配结果或所有服务都尝试完
+        final_result = None
+        for service_config in stt_services:
+            # 记录开始时间
+            service_config["start_time"] = time.time()
+
+            # 调用 STT 服务
+            service_config["success"], service_config["text"] = service_config[
+                "method"
+            ](*service_config["args"], **service_config["kwargs"])
+
+            # 记录结束时间和耗时
+            service_config["end_time"] = time.time()
+            service_config["duration"] = (
+                service_config["end_time"] - service_config["start_time"]
+            )
+
+            if service_config["success"]:
+                # 分析匹配结果
+                service_config["match_type"], service_config["matched_event"] = (
+                    classify(service_config["text"])
+                )
+
+                # 如果找到匹配结果，直接使用，不再尝试下一个服务
+                if service_config["match_type"] in [
+                    match_types["EXACT"],
+                    match_types["PINYIN"],
+                ]:
+                    final_result = service_config
+                    break
+            else:
+                # 如果服务调用失败，继续尝试下一个
+                continue
+
+        # 如果没有找到匹配结果，使用最后一个成功的服务结果
+        return final_result or MediaProcessor._last_successful_stt(stt_services)
+
+    @staticmethod
+    def _last_successful_stt(stt_services):
+        """没有服务匹配到事件时的回退：最后一个转写成功的服务结果"""
+        for service_config in reversed(stt_services):
+            if service_config["success"]:
+                return service_config
+        return None
+
     @require_service("audio", "音频服务未启动")
     @safe_execute("音频STT异步处理失败")
     def process_audio_stt_async(
@@ -478,46 +526,23 @@ class MediaProcessor(BaseProcessor):
             },
         ]
 
-        # 循环调用 STT 服务，直到找到匹配结果或所有服务都尝试完
-        final_result = None
-        for service_config in stt_services:
-            # 记录开始时间
-            service_config["start_time"] = time.time()
-
-            # 调用 STT 服务
-            service_config["success"], service_config["text"] = service_config[
-                "method"
-            ](*service_config["args"], **service_config["kwargs"])
-
-            # 记录结束时间和耗时
-            service_config["end_time"] = time.time()
-            service_config["duration"] = (
-                service_config["end_time"] - service_config["start_time"]
-            )
-
-            if service_config["success"]:
-                # 分析匹配结果
-                service_config["match_type"], service_config["matched_event"] = (
-                    _classify_stt(service_config["text"])
+        if audio_service.stt_hedge_mode != "off":
+            # 对冲请求：取最先返回且匹配到事件的转写，不再等慢的服务超时后才降级；
+            # 都没匹配上时与顺序模式一致，回退到最后一个成功的结果
+            matched_types = (MATCH_TYPES["EXACT"], MATCH_TYPES["PINYIN"])
+            final_result = audio_service.transcribe_hedged(
+                stt_services,
+                accept=lambda success, text: success
+                and _classify_stt(text)[0] in matched_types,
+            ) or self._last_successful_stt(stt_services)
+            if final_result:
+                final_result["match_type"], final_result["matched_event"] = (
+                    _classify_stt(final_result["text"])
                 )
-
-                # 如果找到匹配结果，直接使用，不再尝试下一个服务
-                if service_config["match_type"] in [
-                    MATCH_TYPES["EXACT"],
-                    MATCH_TYPES["PINYIN"],
-                ]:
-                    final_result = service_config
-                    break
-            else:
-                # 如果服务调用失败，继续尝试下一个
-                continue
-
-        # 如果没有找到匹配结果，使用最后一个成功的服务结果
-        if not final_result:
-            for service_config in reversed(stt_services):
-                if service_config["success"]:
-                    final_result = service_config
-                    break
+        else:
+            final_result = self._transcribe_sequential(
+                stt_services, _classify_stt, MATCH_TYPES
+            )
 
         # 构建结果文本
         result_text = "🎵 语音识别结果:\n\n"
@@ -10,7 +10,6 @@
 """
 
 import os
-import json
 import copy
 import math
 import glob
@@ -20,6 +19,7 @@ from collections import OrderedDict
 
 
 from Module.Common.scripts.common import debug_utils
+from libs.utils import json_codec
 from Module.Common.scripts.common.translation import extract_phonetics
 from Module.Business.shared_process import (
     hex_to_hsl,
@@ -399,9 +399,7 @@ class RoutineRecord(BaseProcessor):
             self.save_event_definitions(user_id, default_data)
             return default_data
 
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return data
+        return json_codec.load_file(file_path)
 
     @safe_execute("加载事件记录失败")
     def load_event_records(self, user_id: str) -> Dict[str, Any]:
@@ -429,9 +427,7 @@ class RoutineRecord(BaseProcessor):
             self.save_event_records(user_id, default_data)
             return default_data
 
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return data
+        return json_codec.load_file(file_path)
 
     @safe_execute("加载周报记录失败")
     def load_weekly_record(self, user_id: str) -> Dict[str, Any]:
@@ -452,9 +448,7 @@ class RoutineRecord(BaseProcessor):
             self.save_weekly_record(user_id, default_data)
             return default_data
 
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return data
+        return json_codec.load_file(file_path)
 
     @safe_execute("保存事件定义失败")
     def save_event_definitions(self, user_id: str, data: Dict[str, Any]) -> bool:
@@ -479,8 +473,7 @@ class RoutineRecord(BaseProcessor):
             data["backup_time"] = self._get_formatted_time()
 
         try:
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            json_codec.dump_file(file_path, data, pretty=True)
             return True
         except Exception as e:
             debug_utils.log_and_print(f"保存事件定义文件失败: {e}", log_level="ERROR")
@@ -509,8 +502,7 @@ class RoutineRecord(BaseProcessor):
             data["backup_time"] = self._get_formatted_time()
 
         try:
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            json_codec.dump_file(file_path, data, pretty=True)
             return True
         except Exception as e:
             debug_utils.log_and_print(f"保存事件记录文件失败: {e}", log_level="ERROR")
@@ -531,8 +523,7 @@ class RoutineRecord(BaseProcessor):
             data["backup_time"] = self._get_formatted_time()
 
         try:
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            json_codec.dump_file(file_path, data, pretty=True)
             return True
         except Exception as e:
             debug_utils.log_and_print(f"保存周报记录文件失败: {e}", log_level="ERROR")
@@ -1804,8 +1795,7 @@ class RoutineRecord(BaseProcessor):
         backup_path = os.path.join(backup_dir, backup_filename)
 
         # 保存备份文件
-        with open(backup_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        json_codec.dump_file(backup_path, data, pretty=True)
 
         # 清理旧备份，只保留最新的2份
         self._cleanup_old_backups(backup_dir, file_type, max_count=2)
@@ -25,7 +25,7 @@ class BiliDailyData:
             if notion_service:
                 try:
                     # 刷新缓存，获取最新数据（适合早上汇总场景）
-                    notion_service.update_bili_cache()
+                    notion_service.update_bili_cache(blocking=True)
 
                     # 直接获取缓存数据，不调用统计方法
                     videos = notion_service.cache_data.get(
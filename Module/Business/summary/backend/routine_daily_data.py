@@ -149,21 +149,16 @@ class RoutineDailyData:
             color_palette, subject_name=main_color.get("max_weight_category", "")
         )
 
+        # 同一配色的封面提示词相同，走结果缓存，不重复生成
         image_service = self.app_controller.get_service(ServiceNames.IMAGE)
         match image_generator:
             case "coze_image_generator":
-                result = image_service.coze_image_generator.generate_image(
-                    raw_prompt,
-                )
-            case "hunyuan_image_generator":
-                result = image_service.hunyuan_image_generator.generate_image(
-                    raw_prompt,
-                    size="3:4",
+                result = image_service.generate_image_cached(
+                    image_generator, raw_prompt
                 )
             case _:
-                result = image_service.hunyuan_image_generator.generate_image(
-                    raw_prompt,
-                    size="3:4",
+                result = image_service.generate_image_cached(
+                    "hunyuan_image_generator", raw_prompt, size="3:4"
                 )
 
         image_path = result.get("file_path")
@@ -16,6 +16,7 @@ from .pending_cache_service import PendingCacheService
 from .message_aggregation_service import MessageAggregationService
 from .user_business_permission_service import UserBusinessPermissionService
 from .bili_adskip_service import BiliAdskipService
+from .async_loop_service import AsyncLoopService, get_async_loop
 from .constants import ServiceNames
 
 __all__ = [
@@ -30,7 +31,9 @@ __all__ = [
     'PendingCacheService',
     'MessageAggregationService',
     'UserBusinessPermissionService',
-    'BiliAdskipService'
+    'BiliAdskipService',
+    'AsyncLoopService',
+    'get_async_loop'
 ]
 
 # 服务注册表（用于应用控制器）
@@ -0,0 +1,117 @@
+"""
+后台事件循环服务 (Async Loop Service)
+
+进程内唯一的长驻事件循环，运行在独立的守护线程中，供同步代码调用协程：
+1. run_sync(coro, timeout)：在后台循环中执行协程并阻塞等待结果
+2. submit / call_later：提交协程或延迟执行同步函数，不阻塞调用方
+3. get_http_session()：后台循环上共享的 aiohttp 会话，复用连接
+
+替代各服务"每次调用新建事件循环"的做法：省掉循环创建开销，
+绑定在循环上的 HTTP 客户端也能跨调用复用。
+"""
+
+import asyncio
+import atexit
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Coroutine, Optional
+
+import aiohttp
+
+from Module.Common.scripts.common import debug_utils
+
+
+class AsyncLoopService:
+    """后台事件循环服务"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._http_session: Optional[aiohttp.ClientSession] = None
+        self._thread = threading.Thread(
+            target=self._run_loop, name="async_loop_service", daemon=True
+        )
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def in_loop_thread(self) -> bool:
+        """当前是否运行在后台循环线程中"""
+        return threading.current_thread() is self._thread
+
+    def submit(self, coro: Coroutine) -> Future:
+        """提交协程到后台循环，返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run_sync(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """
+        在后台循环中执行协程并等待结果
+
+        Args:
+            coro: 协程对象
+            timeout: 超时时间（秒），None 表示一直等待
+
+        Returns:
+            协程的返回值；协程抛出的异常原样抛出
+
+        Raises:
+            TimeoutError: 超时（协程会被取消）
+            RuntimeError: 在后台循环线程内调用（会自锁）
+        """
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError("不能在后台事件循环线程中调用 run_sync")
+
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f"协程执行超过 {timeout} 秒")
+
+    def call_later(
+        self, delay_seconds: float, func: Callable, *args, **kwargs
+    ) -> Future:
+        """延迟 delay_seconds 秒后在线程中执行同步函数，返回 Future"""
+
+        async def _delayed():
+            await asyncio.sleep(delay_seconds)
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+        return self.submit(_delayed())
+
+    async def get_http_session(self) -> aiohttp.ClientSession:
+        """共享的 aiohttp 会话（须在后台循环内 await）"""
+        if self._http_session is None or self._http_session.closed:
+            self._http_session = aiohttp.ClientSession()
+        return self._http_session
+
+    def close(self):
+        """关闭共享会话并停止循环"""
+        if not self.loop.is_running():
+            return
+
+        async def _close_session():
+            if self._http_session and not self._http_session.closed:
+                await self._http_session.close()
+
+        try:
+            self.run_sync(_close_session(), timeout=5)
+        except Exception as e:
+            debug_utils.log_and_print(f"关闭共享HTTP会话失败: {e}", log_level="WARNING")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+_instance: Optional[AsyncLoopService] = None
+_instance_lock = threading.Lock()
+
+
+def get_async_loop() -> AsyncLoopService:
+    """获取进程内共享的后台事件循环服务（首次调用时启动）"""
+    global _instance
+    with _instance_lock:
+        if _instance is None:
+            _instance = AsyncLoopService()
+            atexit.register(_instance.close)
+        return _instance
@@ -3,7 +3,7 @@
 
 该模块提供音频处理功能，包括：
 1. 文本转语音 (TTS)
-2. 音频格式转换 (FFmpeg)
+2. 音频格式转换 (FFmpeg，支持文件模式和 stdin/stdout 管道模式)
 3. 临时文件管理
 4. 音频上传处理
 """
@@ -11,10 +11,15 @@
 import os
 import json
 import shutil
+import struct
 import subprocess
 import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, Iterable, List, Callable
 import requests
 from groq import Groq
 from deepgram import DeepgramClient, PrerecordedOptions, FileSource
@@ -25,6 +30,42 @@ from ..service_decorators import (
     external_api_safe,
     file_processing_safe,
 )
+from .tts_cache import TTSCache
+
+
+# Ogg Opus 的 granule position 以 48kHz 采样计数
+OPUS_GRANULE_RATE = 48000
+
+
+def _ogg_opus_duration_ms(data: bytes) -> int:
+    """
+    从 Ogg Opus 数据流本身计算时长：最后一个有效页的 granule position 减去 OpusHead 的 pre-skip
+
+    Args:
+        data: 完整的 Ogg Opus 数据
+
+    Returns:
+        int: 时长毫秒，无法解析时返回0
+    """
+    head = data.find(b"OpusHead")
+    if head < 0 or len(data) < head + 12:
+        return 0
+    pre_skip = struct.unpack_from("<H", data, head + 10)[0]
+
+    # 从尾部往前找最后一个结构完整、且有 granule 的页（"OggS" 也可能出现在负载里）
+    pos = len(data)
+    while True:
+        pos = data.rfind(b"OggS", 0, pos)
+        if pos < 0 or len(data) < pos + 27:
+            return 0
+        version = data[pos + 4]
+        granule = struct.unpack_from("<q", data, pos + 6)[0]
+        segment_count = data[pos + 26]
+        body_start = pos + 27 + segment_count
+        if version == 0 and granule >= 0 and body_start <= len(data):
+            page_end = body_start + sum(data[pos + 27:body_start])
+            if page_end <= len(data):
+                return max(0, int((granule - pre_skip) * 1000 / OPUS_GRANULE_RATE))
 
 
 class AudioService:
@@ -37,6 +78,16 @@ class AudioService:
     3. 文件管理和清理
     """
 
+    # 并发转换上限 - ffmpeg 编码是CPU密集型，避免并发请求把CPU占满
+    CONVERSION_WORKERS = 2
+    # 单次转换超时（秒）
+    CONVERSION_TIMEOUT = 60
+
+    # STT 对冲请求模式：off=按顺序降级, delay=主服务超过 hedge_delay 仍未返回时启动下一个, immediate=同时启动
+    STT_HEDGE_MODES = ("off", "delay", "immediate")
+    # 每个STT服务保留的最近耗时样本数
+    STT_LATENCY_SAMPLES = 200
+
     def __init__(self, app_controller=None):
         """
         初始化音频服务
@@ -47,6 +98,21 @@ class AudioService:
         self.app_controller = app_controller
         self._load_config()
 
+        # 转换任务都经过这个有界线程池执行
+        self._conversion_pool = ThreadPoolExecutor(
+            max_workers=self.CONVERSION_WORKERS, thread_name_prefix="audio_convert"
+        )
+
+        # STT 对冲请求
+        self.stt_hedge_mode = self.stt_config.get("hedge_mode", "delay")
+        if self.stt_hedge_mode not in self.STT_HEDGE_MODES:
+            self.stt_hedge_mode = "delay"
+        self.stt_hedge_delay = float(self.stt_config.get("hedge_delay_seconds", 1.5))
+        self.stt_timeout = float(self.stt_config.get("timeout_seconds", 60))
+        self._stt_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="audio_stt")
+        self._stt_stats: Dict[str, Dict[str, Any]] = {}
+        self._stt_stats_lock = threading.RLock()
+
         # 初始化TTS服务
         self.tts_service = None
         if self.coze_api_base and self.coze_workflow_id and self.coze_access_token:
@@ -59,6 +125,28 @@ class AudioService:
                 small_voice_id=self.small_voice_id,
             )
 
+        # TTS 缓存（原始音频 + opus）
+        self.tts_cache = None
+        if self.tts_cache_config.get("enabled", True):
+            default_cache_dir = (
+                os.path.join(self.app_controller.project_root_path, "cache", "tts")
+                if self.app_controller
+                else os.path.join("cache", "tts")
+            )
+            self.tts_cache = TTSCache(
+                cache_dir=self.tts_cache_config.get("cache_dir", default_cache_dir),
+                max_entries=self.tts_cache_config.get("max_entries", 500),
+                max_bytes=int(self.tts_cache_config.get("max_mb", 200)) * 1024 * 1024,
+            )
+            prewarm_phrases = self.tts_cache_config.get("prewarm_phrases", [])
+            if prewarm_phrases and self.tts_service:
+                threading.Thread(
+                    target=self.prewarm_tts,
+                    args=(prewarm_phrases,),
+                    name="tts_prewarm",
+                    daemon=True,
+                ).start()
+
     def _load_config(self):
         """加载配置"""
         if self.app_controller:
@@ -85,6 +173,14 @@ class AudioService:
             # Access token 从环境变量获取
             self.coze_access_token = os.getenv("COZE_API_KEY", "")
 
+            # TTS 缓存配置
+            self.tts_cache_config = (
+                config_service.get("tts_cache", {}) if config_service else {}
+            )
+
+            # STT 对冲配置
+            self.stt_config = config_service.get("stt", {}) if config_service else {}
+
             # Groq 配置
             self.groq_api_key = os.getenv("GROQ_API_KEY", "")
             self.groq_stt_model = os.getenv("GROQ_STT_MODEL", "whisper-large-v3-turbo")
@@ -108,6 +204,8 @@ class AudioService:
             self.voice_id = "peach"
             self.cn_voice_id = "7468512265134768179"
             self.small_voice_id = "7481299960424562742"
+            self.tts_cache_config = {}
+            self.stt_config = {}
 
             # Groq 配置
             self.groq_api_key = os.getenv("GROQ_API_KEY", "")
@@ -143,7 +241,7 @@ class AudioService:
         self, input_path: str, output_dir: str = None, overwrite: bool = True
     ) -> Tuple[Optional[str], int]:
         """
-        音频格式转换为opus
+        音频格式转换为opus（文件模式）
 
         Args:
             input_path: 输入音频文件路径
@@ -153,6 +251,96 @@ class AudioService:
         Returns:
             Tuple[Optional[str], int]: (输出文件路径, 音频时长毫秒)
         """
+        return self._conversion_pool.submit(
+            self._convert_file_to_opus, input_path, output_dir, overwrite
+        ).result()
+
+    @file_processing_safe("音频格式转换失败", return_value=(None, 0))
+    def convert_bytes_to_opus(self, audio_data: bytes) -> Tuple[Optional[bytes], int]:
+        """
+        音频格式转换为opus（管道模式）：音频经 stdin 送入 ffmpeg，opus 从 stdout 读回，不落盘
+
+        Args:
+            audio_data: 输入音频数据（ffmpeg 可自动识别的格式，如mp3）
+
+        Returns:
+            Tuple[Optional[bytes], int]: (opus数据, 音频时长毫秒)
+        """
+        if not audio_data:
+            debug_utils.log_and_print("输入音频数据为空", log_level="ERROR")
+            return None, 0
+
+        # 缓存过的 TTS 音频直接取已转换的 opus
+        if self.tts_cache:
+            cached = self.tts_cache.get_opus_by_raw(audio_data)
+            if cached:
+                return cached.opus, cached.duration_ms
+
+        opus_data, duration_ms = self._conversion_pool.submit(
+            self._pipe_to_opus, audio_data
+        ).result()
+        if opus_data and self.tts_cache:
+            self.tts_cache.put_opus(audio_data, opus_data, duration_ms)
+        return opus_data, duration_ms
+
+    def _pipe_to_opus(self, audio_data: bytes) -> Tuple[Optional[bytes], int]:
+        """在转换线程池中执行的管道转换"""
+        ffmpeg_cmd = self._get_ffmpeg_command()
+        if not ffmpeg_cmd:
+            debug_utils.log_and_print("FFmpeg不可用", log_level="ERROR")
+            return None, 0
+
+        cmd = [
+            ffmpeg_cmd,
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-i",
+            "pipe:0",
+            "-strict",
+            "-2",
+            "-acodec",
+            "opus",
+            "-ac",
+            "1",
+            "-ar",
+            "48000",
+            "-f",
+            "opus",
+            "pipe:1",
+        ]
+
+        try:
+            # communicate 同时读写 stdin/stdout/stderr，避免管道缓冲区写满互相阻塞
+            completed = subprocess.run(
+                cmd,
+                input=audio_data,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=self.CONVERSION_TIMEOUT,
+                check=False,
+            )
+        except subprocess.TimeoutExpired:
+            debug_utils.log_and_print(
+                f"音频转换超时（{self.CONVERSION_TIMEOUT}s）", log_level="ERROR"
+            )
+            return None, 0
+
+        if completed.returncode != 0 or not completed.stdout:
+            debug_utils.log_and_print(
+                f"音频转换失败，返回码: {completed.returncode}, "
+                f"{completed.stderr.decode('utf-8', errors='replace').strip()}",
+                log_level="ERROR",
+            )
+            return None, 0
+
+        opus_data = completed.stdout
+        return opus_data, _ogg_opus_duration_ms(opus_data)
+
+    def _convert_file_to_opus(
+        self, input_path: str, output_dir: str = None, overwrite: bool = True
+    ) -> Tuple[Optional[str], int]:
+        """在转换线程池中执行的文件转换"""
         input_path = Path(input_path)
 
         # 检查输入文件
@@ -254,12 +442,36 @@ class AudioService:
         if not self.tts_service:
             return False, None, "TTS服务未配置"
 
+        cache_key = (text, self.tts_service.effective_voice_id, "coze", "mp3")
+        if self.tts_cache:
+            cached = self.tts_cache.get(*cache_key)
+            if cached:
+                return True, cached.raw, ""
+
         audio_data = self.generate_tts(text)
         if audio_data:
+            if self.tts_cache:
+                self.tts_cache.put(*cache_key, audio_data)
             return True, audio_data, ""
 
         return False, None, "TTS生成失败"
 
+    def prewarm_tts(self, phrases: Iterable[str]):
+        """
+        预热TTS缓存：为固定文案（提醒、问候等）提前生成音频并转换为opus
+
+        Args:
+            phrases: 文本列表
+        """
+        warmed = 0
+        for phrase in phrases:
+            if not phrase or not phrase.strip():
+                continue
+            success, audio_data, _ = self.process_tts_request(phrase)
+            if success and self.convert_bytes_to_opus(audio_data)[0]:
+                warmed += 1
+        debug_utils.log_and_print(f"TTS缓存预热完成: {warmed} 条", log_level="INFO")
+
     def create_temp_audio_file(self, audio_data: bytes, suffix: str = ".mp3") -> str:
         """
         创建临时音频文件
@@ -300,7 +512,10 @@ class AudioService:
             "ffmpeg_available": ffmpeg_available,
             "ffmpeg_path": self.ffmpeg_path or "system",
             "tts_available": tts_available,
+            "tts_cache": self.tts_cache.get_status() if self.tts_cache else None,
             "stt_available": bool(self.groq_api_key),
+            "stt_hedge_mode": self.stt_hedge_mode,
+            "stt_stats": self.get_stt_stats(),
             "tts_config": (
                 {
                     "api_base": self.coze_api_base,
@@ -336,6 +551,136 @@ class AudioService:
             },
         }
 
+    # ===============STT 对冲请求=================
+
+    def transcribe_hedged(
+        self,
+        attempts: List[Dict[str, Any]],
+        accept: Optional[Callable[[bool, str], bool]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        对冲式STT：按优先级启动服务，前一个在 hedge_delay 内没有给出可用结果（或已失败）就启动下一个，
+        取最先返回的可用结果，其余请求作废（未启动的取消，已在途的结果丢弃）
+
+        Args:
+            attempts: 按优先级排列的 {"name", "method", "args", "kwargs"}，
+                      会被原地补充 start_time/end_time/duration/success/text
+            accept: 判断结果是否可用，默认转写成功且文本非空
+
+        Returns:
+            Optional[Dict]: 胜出的 attempt，全部失败或超时返回None
+        """
+        if accept is None:
+            accept = lambda success, text: success and bool(text and text.strip())
+
+        immediate = self.stt_hedge_mode == "immediate"
+        pending: Dict[Future, Dict[str, Any]] = {}
+        next_index = 0
+        started = time.time()
+        deadline = started + self.stt_timeout
+        hedge_at = started + self.stt_hedge_delay
+
+        def launch():
+            nonlocal next_index, hedge_at
+            attempt = attempts[next_index]
+            next_index += 1
+            attempt["start_time"] = time.time()
+            hedge_at = attempt["start_time"] + self.stt_hedge_delay
+            with self._stt_stats_lock:
+                self._stt_stat(attempt["name"])["attempts"] += 1
+            future = self._stt_pool.submit(
+                attempt["method"], *attempt.get("args", ()), **attempt.get("kwargs", {})
+            )
+            future.add_done_callback(
+                lambda f, a=attempt: self._record_stt_latency(a["name"], a["start_time"], f)
+            )
+            pending[future] = attempt
+
+        launch()
+        while immediate and next_index < len(attempts):
+            launch()
+
+        while pending:
+            now = time.time()
+            if now >= deadline:
+                break
+            timeout = deadline - now
+            if next_index < len(attempts):
+                timeout = min(timeout, max(0.0, hedge_at - now))
+
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                attempt = pending.pop(future)
+                try:
+                    success, text = future.result()
+                except Exception as e:
+                    success, text = False, f"转写失败: {e}"
+                attempt["end_time"] = time.time()
+                attempt["duration"] = attempt["end_time"] - attempt["start_time"]
+                attempt["success"], attempt["text"] = success, text
+
+                if accept(success, text):
+                    for loser in pending:
+                        loser.cancel()
+                    with self._stt_stats_lock:
+                        self._stt_stat(attempt["name"])["wins"] += 1
+                    return attempt
+
+            # 在途请求都失败了，或对冲延迟已到 → 启动下一个
+            if next_index < len(attempts) and (not pending or time.time() >= hedge_at):
+                launch()
+
+        for future in pending:
+            future.cancel()
+        return None
+
+    def _stt_stat(self, name: str) -> Dict[str, Any]:
+        with self._stt_stats_lock:
+            return self._stt_stats.setdefault(
+                name,
+                {
+                    "attempts": 0,
+                    "wins": 0,
+                    "failures": 0,
+                    "latencies": deque(maxlen=self.STT_LATENCY_SAMPLES),
+                },
+            )
+
+    def _record_stt_latency(self, name: str, start_time: float, future: Future):
+        """请求完成回调（包括对冲中落败的请求）"""
+        if future.cancelled():
+            return
+        with self._stt_stats_lock:
+            stat = self._stt_stat(name)
+            stat["latencies"].append(time.time() - start_time)
+            try:
+                success = bool(future.result()[0])
+            except Exception:
+                success = False
+            if not success:
+                stat["failures"] += 1
+
+    def get_stt_stats(self) -> Dict[str, Any]:
+        """各STT服务的胜率和耗时"""
+        result = {}
+        with self._stt_stats_lock:
+            for name, stat in self._stt_stats.items():
+                latencies = sorted(stat["latencies"])
+                result[name] = {
+                    "attempts": stat["attempts"],
+                    "wins": stat["wins"],
+                    "failures": stat["failures"],
+                    "win_rate": round(stat["wins"] / stat["attempts"], 3) if stat["attempts"] else 0.0,
+                    "latency_avg_s": round(sum(latencies) / len(latencies), 3) if latencies else None,
+                    "latency_p50_s": round(latencies[len(latencies) // 2], 3) if latencies else None,
+                    "latency_p95_s": (
+                        round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3)
+                        if latencies
+                        else None
+                    ),
+                }
+        return result
+
     @external_api_safe(
         "Groq STT转写失败", return_value=(False, ""), api_name="Groq STT"
     )
@@ -462,6 +807,11 @@ class CozeTTS:
         self.cn_voice_id = cn_voice_id
         self.small_voice_id = small_voice_id
 
+    @property
+    def effective_voice_id(self) -> str:
+        """实际使用的音色"""
+        return self.small_voice_id or self.cn_voice_id or self.voice_id
+
     def generate(self, text: str) -> Optional[bytes]:
         """
         生成语音
@@ -480,7 +830,7 @@ class CozeTTS:
             "Authorization": f"Bearer {self.access_token}",
             "Content-Type": "application/json",
         }
-        final_voice_id = self.small_voice_id or self.cn_voice_id or self.voice_id
+        final_voice_id = self.effective_voice_id
 
         payload = {
             "workflow_id": self.workflow_id,
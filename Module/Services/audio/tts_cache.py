@@ -0,0 +1,263 @@
+"""
+TTS 音频缓存 (TTS Cache)
+
+按 (text, voice, engine, format) 做内容寻址的磁盘缓存，同时保存：
+1. TTS 原始音频 (如 mp3)
+2. 转换后的 opus 及其时长
+
+提醒、问候这类重复文本命中缓存时，既不调用 TTS 接口，也不再跑 ffmpeg。
+转换环节只拿得到音频字节，因此另外维护 原始音频哈希 -> 缓存键 的索引，
+convert_bytes_to_opus 可以凭输入字节直接找到已缓存的 opus。
+
+目录结构：
+    cache/tts/index.json        条目元数据，按最近使用排序
+    cache/tts/<key>.<format>    原始音频
+    cache/tts/<key>.opus        转换后的 opus
+"""
+
+import atexit
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from Module.Common.scripts.common import debug_utils
+from libs.utils import json_codec
+
+
+@dataclass
+class TTSCacheEntry:
+    """缓存命中结果"""
+
+    raw: bytes
+    opus: Optional[bytes]
+    duration_ms: int
+
+
+class TTSCache:
+    """
+    TTS 磁盘缓存，LRU 淘汰（条目数和总字节数双上限）
+
+    线程安全；index.json 在新增/淘汰时立即写入，命中只更新内存中的顺序，
+    退出时再落盘。
+    """
+
+    INDEX_FILENAME = "index.json"
+
+    def __init__(
+        self,
+        cache_dir: str = "cache/tts",
+        max_entries: int = 500,
+        max_bytes: int = 200 * 1024 * 1024,
+    ):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.index_file = os.path.join(cache_dir, self.INDEX_FILENAME)
+
+        # key -> {"format", "raw_hash", "raw_size", "opus_size", "duration_ms", "text", "last_used"}
+        # 最近使用的在末尾
+        self.entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self.raw_hash_to_key: Dict[str, str] = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._lock = threading.RLock()
+
+        self._load_index()
+        atexit.register(self.flush)
+
+    # ===============索引=================
+
+    @staticmethod
+    def make_key(text: str, voice: str, engine: str, audio_format: str) -> str:
+        """缓存键：(text, voice, engine, format) 的 sha256"""
+        raw = json_codec.dumps([text, voice, engine, audio_format])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def hash_audio(audio_data: bytes) -> str:
+        return hashlib.sha256(audio_data).hexdigest()
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.{suffix}")
+
+    def _load_index(self):
+        try:
+            data = json_codec.load_file(self.index_file)
+        except (OSError, ValueError):
+            return
+
+        # 按 last_used 恢复 LRU 顺序，丢弃文件已缺失的条目
+        for key, meta in sorted(data.items(), key=lambda kv: kv[1].get("last_used", 0)):
+            if not meta.get("raw_hash") or not os.path.exists(
+                self._path(key, meta.get("format", "mp3"))
+            ):
+                continue
+            if meta.get("opus_size") and not os.path.exists(self._path(key, "opus")):
+                meta["opus_size"] = 0
+                meta["duration_ms"] = 0
+            self.entries[key] = meta
+            self.raw_hash_to_key[meta["raw_hash"]] = key
+            self.total_bytes += meta.get("raw_size", 0) + meta.get("opus_size", 0)
+
+    def flush(self):
+        """index.json 落盘"""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                json_codec.dump_file(self.index_file, dict(self.entries))
+                self._dirty = False
+            except OSError as e:
+                debug_utils.log_and_print(f"TTS缓存索引保存失败: {e}", log_level="WARNING")
+
+    def _remove(self, key: str):
+        meta = self.entries.pop(key, None)
+        if not meta:
+            return
+        if self.raw_hash_to_key.get(meta["raw_hash"]) == key:
+            del self.raw_hash_to_key[meta["raw_hash"]]
+        self.total_bytes -= meta.get("raw_size", 0) + meta.get("opus_size", 0)
+        for suffix in (meta.get("format", "mp3"), "opus"):
+            try:
+                os.unlink(self._path(key, suffix))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                debug_utils.log_and_print(f"TTS缓存文件删除失败: {e}", log_level="WARNING")
+
+    def _evict(self):
+        while self.entries and (
+            len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes
+        ):
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+            self._dirty = True
+
+    def _touch(self, key: str):
+        self.entries.move_to_end(key)
+        self.entries[key]["last_used"] = time.time()
+        self._dirty = True
+
+    # ===============读写=================
+
+    def get(
+        self, text: str, voice: str, engine: str, audio_format: str
+    ) -> Optional[TTSCacheEntry]:
+        """按文本查找，未命中返回None"""
+        key = self.make_key(text, voice, engine, audio_format)
+        with self._lock:
+            meta = self.entries.get(key)
+            if not meta:
+                self.misses += 1
+                return None
+            entry = self._read_entry(key, meta)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touch(key)
+            return entry
+
+    def get_opus_by_raw(self, audio_data: bytes) -> Optional[TTSCacheEntry]:
+        """按原始音频内容查找已转换的 opus（供转换环节跳过 ffmpeg）"""
+        with self._lock:
+            key = self.raw_hash_to_key.get(self.hash_audio(audio_data))
+            meta = self.entries.get(key) if key else None
+            if not meta or not meta.get("opus_size"):
+                return None
+            entry = self._read_entry(key, meta)
+            if entry is None or entry.opus is None:
+                return None
+            self._touch(key)
+            return entry
+
+    def _read_entry(self, key: str, meta: Dict) -> Optional[TTSCacheEntry]:
+        try:
+            with open(self._path(key, meta.get("format", "mp3")), "rb") as f:
+                raw = f.read()
+            opus = None
+            if meta.get("opus_size"):
+                with open(self._path(key, "opus"), "rb") as f:
+                    opus = f.read()
+        except OSError:
+            # 文件被外部清理，丢弃条目
+            self._remove(key)
+            self._dirty = True
+            return None
+        return TTSCacheEntry(raw=raw, opus=opus, duration_ms=meta.get("duration_ms", 0))
+
+    @staticmethod
+    def _write_file(path: str, data: bytes):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def put(self, text: str, voice: str, engine: str, audio_format: str, raw: bytes):
+        """保存 TTS 原始音频"""
+        if not raw:
+            return
+        key = self.make_key(text, voice, engine, audio_format)
+        with self._lock:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                self._remove(key)
+                self._write_file(self._path(key, audio_format), raw)
+            except OSError as e:
+                debug_utils.log_and_print(f"TTS缓存写入失败: {e}", log_level="WARNING")
+                return
+
+            raw_hash = self.hash_audio(raw)
+            self.entries[key] = {
+                "format": audio_format,
+                "raw_hash": raw_hash,
+                "raw_size": len(raw),
+                "opus_size": 0,
+                "duration_ms": 0,
+                "text": text[:50],
+                "last_used": time.time(),
+            }
+            self.raw_hash_to_key[raw_hash] = key
+            self.total_bytes += len(raw)
+            self._dirty = True
+            self._evict()
+            self.flush()
+
+    def put_opus(self, raw: bytes, opus: bytes, duration_ms: int):
+        """为已缓存的原始音频补充转换结果；原始音频不在缓存中则忽略"""
+        if not opus:
+            return
+        with self._lock:
+            key = self.raw_hash_to_key.get(self.hash_audio(raw))
+            meta = self.entries.get(key) if key else None
+            if not meta:
+                return
+            try:
+                self._write_file(self._path(key, "opus"), opus)
+            except OSError as e:
+                debug_utils.log_and_print(f"TTS缓存写入失败: {e}", log_level="WARNING")
+                return
+            self.total_bytes += len(opus) - meta.get("opus_size", 0)
+            meta["opus_size"] = len(opus)
+            meta["duration_ms"] = duration_ms
+            self._dirty = True
+            self._evict()
+            self.flush()
+
+    def get_status(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "total_bytes": self.total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
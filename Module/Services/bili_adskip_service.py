@@ -11,9 +11,9 @@ import asyncio
 import aiohttp
 from typing import Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor
 
 from Module.Common.scripts.common import debug_utils
+from Module.Services.async_loop_service import get_async_loop
 from Module.Services.constants import DefaultValues, EnvVars
 from Module.Services.service_decorators import service_operation_safe
 
@@ -98,10 +98,10 @@ class BiliAdskipService:
     def _get_daily_operation_data(self, date: str) -> Optional[Dict[str, Any]]:
         """获取每日运营数据"""
         try:
-            # 在线程池中执行异步API调用
-            with ThreadPoolExecutor(max_workers=1) as executor:
-                future = executor.submit(self._run_async_in_thread, self._call_daily_operation_api_async, date)
-                success, response_data = future.result(timeout=30)
+            # 在共享后台事件循环中执行异步API调用
+            success, response_data = self._run_async(
+                self._call_daily_operation_api_async, date
+            )
 
             if success and response_data.get("success", False):
                 return response_data
@@ -117,10 +117,10 @@ class BiliAdskipService:
     def _get_weekly_operation_data(self) -> Optional[Dict[str, Any]]:
         """获取每周运营数据"""
         try:
-            # 在线程池中执行异步API调用
-            with ThreadPoolExecutor(max_workers=1) as executor:
-                future = executor.submit(self._run_async_in_thread, self._call_weekly_operation_api_async)
-                success, response_data = future.result(timeout=30)
+            # 在共享后台事件循环中执行异步API调用
+            success, response_data = self._run_async(
+                self._call_weekly_operation_api_async
+            )
 
             if success and response_data.get("success", False):
                 return response_data
@@ -133,15 +133,10 @@ class BiliAdskipService:
             debug_utils.log_and_print(f"获取每周运营数据异常: {e}", log_level="ERROR")
             return None
 
-    def _run_async_in_thread(self, async_func, *args):
-        """在线程中运行异步函数"""
+    def _run_async(self, async_func, *args, timeout: float = 30):
+        """在共享后台事件循环中运行异步函数并等待结果"""
         try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                return loop.run_until_complete(async_func(*args))
-            finally:
-                loop.close()
+            return get_async_loop().run_sync(async_func(*args), timeout=timeout)
         except Exception as e:
             debug_utils.log_and_print(f"异步函数执行失败: {e}", log_level="ERROR")
             return False, {"message": str(e)}
@@ -203,33 +198,34 @@ class BiliAdskipService:
 
         for attempt in range(max_retries + 1):
             try:
-                async with aiohttp.ClientSession(timeout=timeout) as session:
-                    if method.upper() == "GET":
-                        async with session.get(url, params=data, headers=headers) as response:
-                            response_data = await response.json()
-                    else:  # POST
-                        async with session.post(url, headers=headers, json=data) as response:
-                            response_data = await response.json()
-
-                    if response.status == 200:
-                        # 根据check_success_field决定成功条件
-                        if check_success_field:
-                            # 管理员API模式：需要检查success字段
-                            is_success = response_data.get("success", False)
-                            if is_success:
-                                debug_utils.log_and_print(f"✅ {operation_name}操作成功", log_level="INFO")
-                                return True, response_data
-                            else:
-                                error_msg = response_data.get("message", "未知错误")
-                                debug_utils.log_and_print(f"❌ {operation_name}操作失败: {error_msg}", log_level="ERROR")
-                                return False, response_data
-                        else:
-                            # 运营数据API模式：只检查状态码
-                            debug_utils.log_and_print(f"✅ {operation_name}获取成功", log_level="INFO")
+                # 共享会话，跨调用复用连接
+                session = await get_async_loop().get_http_session()
+                if method.upper() == "GET":
+                    async with session.get(url, params=data, headers=headers, timeout=timeout) as response:
+                        response_data = await response.json()
+                else:  # POST
+                    async with session.post(url, headers=headers, json=data, timeout=timeout) as response:
+                        response_data = await response.json()
+
+                if response.status == 200:
+                    # 根据check_success_field决定成功条件
+                    if check_success_field:
+                        # 管理员API模式：需要检查success字段
+                        is_success = response_data.get("success", False)
+                        if is_success:
+                            debug_utils.log_and_print(f"✅ {operation_name}操作成功", log_level="INFO")
                             return True, response_data
+                        else:
+                            error_msg = response_data.get("message", "未知错误")
+                            debug_utils.log_and_print(f"❌ {operation_name}操作失败: {error_msg}", log_level="ERROR")
+                            return False, response_data
                     else:
-                        error_msg = f"HTTP {response.status}: {response_data.get('message', '未知错误') if response_data else '服务器错误'}"
-                        last_error = {"message": error_msg}
+                        # 运营数据API模式：只检查状态码
+                        debug_utils.log_and_print(f"✅ {operation_name}获取成功", log_level="INFO")
+                        return True, response_data
+                else:
+                    error_msg = f"HTTP {response.status}: {response_data.get('message', '未知错误') if response_data else '服务器错误'}"
+                    last_error = {"message": error_msg}
 
             except asyncio.TimeoutError:
                 error_msg = "请求超时"
@@ -271,10 +267,10 @@ class BiliAdskipService:
             return False, {"message": "B站API不可用"}
 
         try:
-            # 在线程池中执行异步API调用
-            with ThreadPoolExecutor(max_workers=1) as executor:
-                future = executor.submit(self._run_async_in_thread, self._call_update_user_api_async, uid, account_type)
-                success, response_data = future.result(timeout=30)
+            # 在共享后台事件循环中执行异步API调用
+            success, response_data = self._run_async(
+                self._call_update_user_api_async, uid, account_type
+            )
 
             return success, response_data
 
@@ -298,10 +294,10 @@ class BiliAdskipService:
             return False, {"message": "B站API不可用"}
 
         try:
-            # 在线程池中执行异步API调用
-            with ThreadPoolExecutor(max_workers=1) as executor:
-                future = executor.submit(self._run_async_in_thread, self._call_update_ads_api_async, bvid, ad_timestamps)
-                success, response_data = future.result(timeout=30)
+            # 在共享后台事件循环中执行异步API调用
+            success, response_data = self._run_async(
+                self._call_update_ads_api_async, bvid, ad_timestamps
+            )
 
             return success, response_data
 
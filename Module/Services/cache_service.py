@@ -1,20 +1,26 @@
 """
 缓存服务
 
-提供缓存管理功能，包括用户信息缓存和事件缓存
+提供缓存管理功能，包括用户信息缓存、事件缓存和飞书图片 image_key 缓存
 原位置：Module/Core/cache_service.py
 """
 
 import os
-import json
 import time
 import datetime
+import hashlib
 from typing import Dict, Any, Optional
 from collections import OrderedDict
 
+from libs.utils import json_codec
+
 from .service_decorators import service_operation_safe, file_processing_safe, cache_operation_safe
 
 
+# 飞书图片 image_key 缓存有效期（30天）
+IMAGE_KEY_TTL_SECONDS = 30 * 24 * 3600
+
+
 class CacheService:
     """缓存管理服务"""
 
@@ -29,6 +35,7 @@ class CacheService:
         self.user_cache_file = os.path.join(cache_dir, "user_cache.json")
         self.event_cache_file = os.path.join(cache_dir, "processed_events.json")
         self.message_id_card_id_mapping_file = os.path.join(cache_dir, "message_id_card_id_mapping.json")
+        self.image_key_cache_file = os.path.join(cache_dir, "image_key_cache.json")
 
         # 用户缓存结构：{open_id: {"name": str, "timestamp": float}}
         self.user_cache: Dict[str, Dict] = self._load_user_cache()
@@ -39,6 +46,9 @@ class CacheService:
         # message_id和card_id的映射
         self.message_id_card_id_mapping: OrderedDict[str, Dict[str, Any]] = self._load_message_id_card_id_mapping()
 
+        # 图片缓存结构：{图片内容sha256: {"image_key": str, "timestamp": float}}
+        self.image_key_cache: Dict[str, Dict] = self._load_image_key_cache()
+
         self.clear_expired()
 
     # ===============缓存加载=================
@@ -51,8 +61,7 @@ class CacheService:
             Dict: 用户缓存数据
         """
         if os.path.exists(self.user_cache_file):
-            with open(self.user_cache_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            data = json_codec.load_file(self.user_cache_file)
             cutoff = time.time() - 604800  # 7天
             return {
                 k: v for k, v in data.items()
@@ -69,8 +78,7 @@ class CacheService:
             Dict: 事件缓存数据
         """
         if os.path.exists(self.event_cache_file):
-            with open(self.event_cache_file, "r", encoding="utf-8") as f:
-                raw_data = json.load(f)
+            raw_data = json_codec.load_file(self.event_cache_file)
 
             cutoff = time.time() - 32 * 3600
             return {k: float(v) for k, v in raw_data.items() if float(v) > cutoff}
@@ -81,8 +89,7 @@ class CacheService:
     def _load_message_id_card_id_mapping(self) -> OrderedDict[str, Dict[str, Any]]:
         """加载message_id和card_id的映射，按创建时间倒序排列"""
         if os.path.exists(self.message_id_card_id_mapping_file):
-            with open(self.message_id_card_id_mapping_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            data = json_codec.load_file(self.message_id_card_id_mapping_file)
 
             # 按create_date倒序排序，最新的在前面
             sorted_items = sorted(
@@ -94,11 +101,24 @@ class CacheService:
             return OrderedDict(sorted_items)
         return OrderedDict()
 
+    @cache_operation_safe("图片image_key缓存加载失败", return_value={})
+    def _load_image_key_cache(self) -> Dict:
+        """加载图片image_key缓存，丢弃过期条目"""
+        if os.path.exists(self.image_key_cache_file):
+            data = json_codec.load_file(self.image_key_cache_file)
+            cutoff = time.time() - IMAGE_KEY_TTL_SECONDS
+            return {
+                k: v for k, v in data.items()
+                if v.get("timestamp", 0) > cutoff
+            }
+        return {}
+
     def save_all(self):
         """保存所有缓存"""
         self.save_user_cache()
         self.save_event_cache()
         self.save_message_id_card_id_mapping()
+        self.save_image_key_cache()
 
     def save_user_cache(self):
         """保存用户缓存"""
@@ -120,20 +140,21 @@ class CacheService:
         ordered_data = OrderedDict(sorted_items)
         self._atomic_save(self.message_id_card_id_mapping_file, ordered_data)
 
+    def save_image_key_cache(self):
+        """保存图片image_key缓存"""
+        self._atomic_save(self.image_key_cache_file, self.image_key_cache)
+
     @file_processing_safe("缓存文件保存失败")
     def _atomic_save(self, filename: str, data: Dict):
         """
-        原子化保存
+        原子化保存（紧凑格式）
 
         Args:
             filename: 文件路径
             data: 要保存的数据
         """
         os.makedirs(os.path.dirname(filename), exist_ok=True)
-        temp_file = filename + ".tmp"
-        with open(temp_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        os.replace(temp_file, filename)
+        json_codec.dump_file(filename, data)
 
     # ===============用户相关=================
     # 原有接口保持不变
@@ -215,6 +236,40 @@ class CacheService:
         """获取card_id"""
         return self.message_id_card_id_mapping.get(message_id, {})
 
+    # ===============图片相关=================
+    @staticmethod
+    def hash_image(image_data: bytes) -> str:
+        """图片内容哈希，作为image_key缓存的键"""
+        return hashlib.sha256(image_data).hexdigest()
+
+    def get_image_key(self, image_hash: str) -> Optional[str]:
+        """
+        获取已上传图片的image_key
+
+        Args:
+            image_hash: 图片内容sha256
+
+        Returns:
+            Optional[str]: image_key，不存在或已过期返回None
+        """
+        entry = self.image_key_cache.get(image_hash)
+        if entry and entry.get("timestamp", 0) > time.time() - IMAGE_KEY_TTL_SECONDS:
+            return entry["image_key"]
+        return None
+
+    def update_image_key(self, image_hash: str, image_key: str):
+        """
+        记录图片上传得到的image_key
+
+        Args:
+            image_hash: 图片内容sha256
+            image_key: 飞书返回的image_key
+        """
+        self.image_key_cache[image_hash] = {
+            "image_key": image_key,
+            "timestamp": time.time()
+        }
+
     # ===============管理缓存=================
     # 新增：简单的状态查询方法（为后续API做准备）
     def get_status(self) -> Dict[str, Any]:
@@ -223,11 +278,13 @@ class CacheService:
             "user_cache_size": len(self.user_cache),
             "event_cache_size": len(self.event_cache),
             "message_id_card_id_mapping_size": len(self.message_id_card_id_mapping),
+            "image_key_cache_size": len(self.image_key_cache),
             "cache_dir": self.cache_dir,
             "files": {
                 "user_cache_exists": os.path.exists(self.user_cache_file),
                 "event_cache_exists": os.path.exists(self.event_cache_file),
-                "message_id_card_id_mapping_exists": os.path.exists(self.message_id_card_id_mapping_file)
+                "message_id_card_id_mapping_exists": os.path.exists(self.message_id_card_id_mapping_file),
+                "image_key_cache_exists": os.path.exists(self.image_key_cache_file)
             }
         }
 
@@ -264,8 +321,19 @@ class CacheService:
         if before_message_id_card_id_mapping != len(self.message_id_card_id_mapping):
             self.save_message_id_card_id_mapping()
 
+        # 清理过期图片image_key缓存（30天）
+        cutoff_image_key = time.time() - IMAGE_KEY_TTL_SECONDS
+        before_image_key = len(self.image_key_cache)
+        self.image_key_cache = {
+            k: v for k, v in self.image_key_cache.items()
+            if v.get("timestamp", 0) > cutoff_image_key
+        }
+        if before_image_key != len(self.image_key_cache):
+            self.save_image_key_cache()
+
         return {
             "user_cache_cleared": before_user - len(self.user_cache),
             "event_cache_cleared": before_event - len(self.event_cache),
-            "message_id_card_id_mapping_cleared": before_message_id_card_id_mapping - len(self.message_id_card_id_mapping)
+            "message_id_card_id_mapping_cleared": before_message_id_card_id_mapping - len(self.message_id_card_id_mapping),
+            "image_key_cache_cleared": before_image_key - len(self.image_key_cache)
         }
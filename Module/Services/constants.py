@@ -255,6 +255,21 @@ class SchedulerConstKeys:
     ADMIN_ID = "admin_id"
 
 
+class SchedulerOverlapPolicies:
+    """任务上一次还在运行时的处理策略"""
+
+    SKIP = "skip"  # 跳过本次触发
+    QUEUE = "queue"  # 等上一次结束后补跑一次（多次触发合并）
+    ALLOW = "allow"  # 允许并发运行
+
+
+class SchedulerMisfirePolicies:
+    """错过触发时间（停机或严重延迟）后的处理策略"""
+
+    CATCH_UP = "catch_up"  # 补跑一次
+    SKIP = "skip"  # 跳过，等待下一个触发点
+
+
 # ---------- 卡片模块 ----------
 # ========== 卡片配置类型常量 (card_config_type) ==========
 class CardConfigKeys:
@@ -0,0 +1,299 @@
+"""
+图像任务队列与结果缓存 (Image Jobs)
+
+1. ImageJobQueue：图像生成任务排队执行，限制同时打到生成服务的并发数，
+   提供任务ID、进度查询和取消
+2. ImageResultCache：按 (生成器, 提示词, 参数) 缓存生成结果，
+   每日总结封面、蜡封印章这类重复提示词不再重新生成
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from Module.Common.scripts.common import debug_utils
+from libs.utils import json_codec
+
+
+class ImageJobCancelled(Exception):
+    """任务已被取消"""
+
+
+@dataclass
+class ImageJob:
+    """图像生成任务"""
+
+    job_id: str
+    kind: str
+    runner: Callable[["ImageJob"], Any]
+    status: str = "queued"  # queued / running / done / failed / cancelled
+    result: Any = None
+    error: str = ""
+    progress: Dict[str, Any] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+    done_event: threading.Event = field(default_factory=threading.Event)
+
+    @property
+    def finished(self) -> bool:
+        return self.done_event.is_set()
+
+    def check_cancelled(self):
+        """runner 在长耗时步骤之间调用，已取消时中止"""
+        if self.cancel_event.is_set():
+            raise ImageJobCancelled()
+
+
+class ImageJobQueue:
+    """
+    有界并发的图像任务队列
+
+    固定 max_concurrency 个工作线程按提交顺序取任务；排队中的任务可直接取消，
+    运行中的任务置取消标记，由 runner 自行检查中止。
+    """
+
+    # 已结束任务保留数量（供进度查询）
+    FINISHED_JOBS_KEPT = 200
+
+    def __init__(self, max_concurrency: int = 2):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self._queue: Deque[ImageJob] = deque()
+        self._jobs: "OrderedDict[str, ImageJob]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._workers = [
+            threading.Thread(target=self._worker_loop, name=f"image_job_{i}", daemon=True)
+            for i in range(self.max_concurrency)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, kind: str, runner: Callable[[ImageJob], Any]) -> str:
+        """提交任务，返回任务ID"""
+        job = ImageJob(job_id=uuid.uuid4().hex[:12], kind=kind, runner=runner)
+        with self._cond:
+            self._jobs[job.job_id] = job
+            self._queue.append(job)
+            self._trim_finished()
+            self._cond.notify()
+        return job.job_id
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[ImageJob]:
+        """等待任务结束，返回任务（超时则返回时仍未结束）"""
+        job = self._jobs.get(job_id)
+        if job:
+            job.done_event.wait(timeout)
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """取消任务，已结束的任务返回False"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if not job or job.finished:
+                return False
+            job.cancel_event.set()
+            if job.status == "queued":
+                self._queue.remove(job)
+                self._finish(job, "cancelled")
+        return True
+
+    def get_job_info(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """任务状态快照，含排队位置和进度"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if not job:
+                return None
+            info = {
+                "job_id": job.job_id,
+                "kind": job.kind,
+                "status": job.status,
+                "progress": dict(job.progress),
+                "error": job.error,
+                "created_at": job.created_at,
+                "started_at": job.started_at,
+                "finished_at": job.finished_at,
+            }
+            if job.status == "queued":
+                info["queue_position"] = self._queue.index(job) + 1
+            return info
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._cond:
+            running = sum(1 for job in self._jobs.values() if job.status == "running")
+            return {
+                "max_concurrency": self.max_concurrency,
+                "queued": len(self._queue),
+                "running": running,
+            }
+
+    def _trim_finished(self):
+        finished = [jid for jid, job in self._jobs.items() if job.finished]
+        for jid in finished[: max(0, len(finished) - self.FINISHED_JOBS_KEPT)]:
+            del self._jobs[jid]
+
+    def _finish(self, job: ImageJob, status: str, result: Any = None, error: str = ""):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        job.done_event.set()
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job = self._queue.popleft()
+                job.status = "running"
+                job.started_at = time.time()
+
+            try:
+                result = job.runner(job)
+            except ImageJobCancelled:
+                with self._cond:
+                    self._finish(job, "cancelled")
+            except Exception as e:
+                debug_utils.log_and_print(f"图像任务 {job.job_id} 执行失败: {e}", log_level="ERROR")
+                with self._cond:
+                    self._finish(job, "failed", error=str(e))
+            else:
+                with self._cond:
+                    if job.cancel_event.is_set():
+                        self._finish(job, "cancelled")
+                    else:
+                        self._finish(job, "done", result=result)
+
+
+class ImageResultCache:
+    """
+    图像生成结果缓存
+
+    键为 (生成器, 提示词, 参数) 的 sha256；图片复制进 cache_dir 保存，
+    按 TTL 过期、按条目数 LRU 淘汰。取出时复制一份临时文件交给调用方，
+    调用方用完删除不影响缓存。
+    """
+
+    INDEX_FILENAME = "index.json"
+
+    def __init__(
+        self,
+        cache_dir: str = "cache/images/generated",
+        ttl_seconds: int = 7 * 24 * 3600,
+        max_entries: int = 200,
+    ):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.index_file = os.path.join(cache_dir, self.INDEX_FILENAME)
+        # key -> {"files": [文件名], "created_at", "last_used", "prompt"}，最近使用的在末尾
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._load_index()
+
+    @staticmethod
+    def make_key(generator: str, prompt: str, params: Optional[Dict[str, Any]] = None) -> str:
+        raw = json_codec.dumps([generator, prompt, sorted((params or {}).items())])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _load_index(self):
+        try:
+            data = json_codec.load_file(self.index_file)
+        except (OSError, ValueError):
+            return
+        for key, meta in sorted(data.items(), key=lambda kv: kv[1].get("last_used", 0)):
+            self.entries[key] = meta
+
+    def _save_index(self):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            json_codec.dump_file(self.index_file, dict(self.entries))
+        except OSError as e:
+            debug_utils.log_and_print(f"图像缓存索引保存失败: {e}", log_level="WARNING")
+
+    def _remove(self, key: str):
+        meta = self.entries.pop(key, None)
+        for name in (meta or {}).get("files", []):
+            try:
+                os.unlink(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """命中时返回图片临时副本路径列表（调用方负责删除）"""
+        with self._lock:
+            meta = self.entries.get(key)
+            if meta and time.time() - meta.get("created_at", 0) > self.ttl_seconds:
+                self._remove(key)
+                self._save_index()
+                meta = None
+            if not meta:
+                self.misses += 1
+                return None
+
+            copies = []
+            try:
+                for name in meta["files"]:
+                    suffix = os.path.splitext(name)[1]
+                    fd, tmp_path = tempfile.mkstemp(prefix="image_cache_", suffix=suffix)
+                    os.close(fd)
+                    shutil.copyfile(os.path.join(self.cache_dir, name), tmp_path)
+                    copies.append(tmp_path)
+            except OSError:
+                for path in copies:
+                    os.unlink(path)
+                self._remove(key)
+                self._save_index()
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.entries.move_to_end(key)
+            meta["last_used"] = time.time()
+            return copies
+
+    def put(self, key: str, image_paths: List[str], prompt: str = ""):
+        """把生成结果复制进缓存（原文件保持不动）"""
+        if not image_paths:
+            return
+        with self._lock:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                self._remove(key)
+                files = []
+                for i, path in enumerate(image_paths):
+                    name = f"{key}_{i}{os.path.splitext(str(path))[1] or '.png'}"
+                    shutil.copyfile(path, os.path.join(self.cache_dir, name))
+                    files.append(name)
+            except OSError as e:
+                debug_utils.log_and_print(f"图像缓存写入失败: {e}", log_level="WARNING")
+                return
+
+            now = time.time()
+            self.entries[key] = {
+                "files": files,
+                "created_at": now,
+                "last_used": now,
+                "prompt": prompt[:80],
+            }
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+            self._save_index()
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
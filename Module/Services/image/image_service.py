@@ -6,12 +6,15 @@
 2. 图像风格转换 (图像转图像)
 3. 与gradio服务的集成
 4. 错误处理和状态管理
+5. 生成任务排队、结果缓存与后台健康检查
 """
 
 import os
 import json
 import base64
 import random
+import threading
+import time
 import requests
 from typing import Optional, List, Dict, Any
 
@@ -23,6 +26,7 @@ from ..service_decorators import (
     service_operation_safe,
     external_api_safe,
 )
+from .image_jobs import ImageJobCancelled, ImageJobQueue, ImageResultCache
 
 
 class ImageService:
@@ -35,8 +39,16 @@ class ImageService:
     3. gradio服务调用管理
     4. 图像处理结果管理
     5. 二维码生成
+
+    gradio 调用都经过 job_queue 排队，并发上限由 image_jobs.max_concurrency 控制；
+    断线重连由后台健康检查线程完成，请求路径只读取连接状态。
     """
 
+    # 轮询 gradio 任务进度/取消标记的间隔（秒）
+    JOB_POLL_INTERVAL = 0.5
+    # 两次重连尝试的最小间隔（秒），避免请求密集时反复重连
+    REINIT_MIN_INTERVAL = 10
+
     def __init__(self, app_controller=None):
         """
         初始化图像服务
@@ -51,6 +63,37 @@ class ImageService:
         # 健康状态检查
         self.is_healthy = self._check_service_health()
 
+        # 生成任务队列、结果缓存、后台健康检查
+        config_service = (
+            self.app_controller.get_service("config") if self.app_controller else None
+        )
+        jobs_config = config_service.get("image_jobs", {}) if config_service else {}
+        self.job_timeout = jobs_config.get("job_timeout_seconds", 300)
+        self.health_check_interval = jobs_config.get(
+            "health_check_interval_seconds", 60
+        )
+        self.job_queue = ImageJobQueue(jobs_config.get("max_concurrency", 2))
+
+        cache_config = jobs_config.get("result_cache", {})
+        self.result_cache = None
+        if cache_config.get("enabled", True):
+            default_cache_dir = (
+                os.path.join(self.app_controller.project_root_path, "cache", "images", "generated")
+                if self.app_controller
+                else os.path.join("cache", "images", "generated")
+            )
+            self.result_cache = ImageResultCache(
+                cache_dir=cache_config.get("cache_dir", default_cache_dir),
+                ttl_seconds=int(cache_config.get("ttl_hours", 168) * 3600),
+                max_entries=cache_config.get("max_entries", 200),
+            )
+
+        self._last_reinit_at = 0.0
+        self._health_wakeup = threading.Event()
+        threading.Thread(
+            target=self._health_check_loop, name="image_health_check", daemon=True
+        ).start()
+
         # 初始化二维码生成器
         self.qr_generator = QRCodeGenerator()
         # 初始化混元图片生成器
@@ -139,6 +182,29 @@ class ImageService:
         """检查服务健康状态"""
         return self.gradio_client is not None
 
+    def _health_check_loop(self):
+        """后台健康检查：定期或被唤醒时，为断开的 gradio 连接重连"""
+        while True:
+            self._health_wakeup.wait(self.health_check_interval)
+            self._health_wakeup.clear()
+
+            if self.gradio_client is not None or not getattr(self, "server_id", ""):
+                continue
+            if time.time() - self._last_reinit_at < self.REINIT_MIN_INTERVAL:
+                continue
+
+            self._last_reinit_at = time.time()
+            debug_utils.log_and_print(
+                "检测到Gradio服务不可用，后台尝试重新连接", log_level="INFO"
+            )
+            self._reinit_gradio_client()
+
+    def _mark_client_invalid(self):
+        """标记连接失效，并唤醒后台健康检查重连"""
+        self.gradio_client = None
+        self.is_healthy = False
+        self._health_wakeup.set()
+
     @external_api_safe(
         "获取Gradio认证状态失败",
         return_value={"error": "认证状态获取失败", "available": False},
@@ -182,13 +248,17 @@ class ImageService:
             "server_id_configured": (
                 bool(self.server_id) if hasattr(self, "server_id") else False
             ),
+            "job_queue": self.job_queue.get_status(),
+            "result_cache": (
+                self.result_cache.get_status() if self.result_cache else None
+            ),
         }
 
     def generate_ai_image(
         self, prompt: str = None, image_input: Dict = None
     ) -> Optional[List[str]]:
         """
-        使用AI生成图片或处理图片
+        使用AI生成图片或处理图片（经任务队列排队，阻塞等待结果）
 
         Args:
             prompt: 文本提示词，用于AI生图
@@ -197,45 +267,97 @@ class ImageService:
         Returns:
             Optional[List[str]]: 生成的图片文件路径列表
             - 返回None表示系统故障，需要管理员修复
-            - 返回空列表表示提示词不合适或处理失败
+            - 返回空列表表示提示词不合适、处理失败或任务被取消
         """
-        try:
-            # 准备调用参数
-            predict_kwargs = {
-                "image_input1": None,
-                "image_input2": None,
-                "style_key": "贺卡",
-                "additional_text": "",
-                "api_name": "/generate_images",
-            }
+        job_id = self.submit_ai_image_job(prompt=prompt, image_input=image_input)
+        job = self.job_queue.wait(job_id)
 
-            if image_input:
-                predict_kwargs["image_input1"] = image_input
-            elif prompt:
-                predict_kwargs["additional_text"] = "/img " + prompt
+        if job.status == "done":
+            return job.result
+        if job.status == "cancelled":
+            return []
 
-            # 调用gradio服务
-            result = self.gradio_client.predict(**predict_kwargs)
+        # 如果是连接相关错误，标记客户端为无效
+        error_str = job.error.lower()
+        if any(
+            keyword in error_str
+            for keyword in ["connection", "timeout", "ssl", "handshake", "network"]
+        ):
+            debug_utils.log_and_print(
+                "检测到网络连接错误，标记Gradio客户端为无效", log_level="WARNING"
+            )
+            self._mark_client_invalid()
 
-            # 解析结果
-            return self._parse_generation_result(result)
+        return None
 
-        except Exception as e:
-            debug_utils.log_and_print(f"AI图像处理失败: {e}", log_level="ERROR")
-
-            # 如果是连接相关错误，标记客户端为无效
-            error_str = str(e).lower()
-            if any(
-                keyword in error_str
-                for keyword in ["connection", "timeout", "ssl", "handshake", "network"]
-            ):
-                debug_utils.log_and_print(
-                    "检测到网络连接错误，标记Gradio客户端为无效", log_level="WARNING"
-                )
-                self.gradio_client = None
-                self.is_healthy = False
+    def submit_ai_image_job(
+        self, prompt: str = None, image_input: Dict = None
+    ) -> str:
+        """
+        提交AI图像任务，立即返回任务ID
 
-            return None
+        进度用 get_image_job 查询，取消用 cancel_image_job
+        """
+        # 准备调用参数
+        predict_kwargs = {
+            "image_input1": None,
+            "image_input2": None,
+            "style_key": "贺卡",
+            "additional_text": "",
+            "api_name": "/generate_images",
+        }
+
+        if image_input:
+            predict_kwargs["image_input1"] = image_input
+        elif prompt:
+            predict_kwargs["additional_text"] = "/img " + prompt
+
+        return self.job_queue.submit(
+            "gradio", lambda job: self._run_gradio_job(job, predict_kwargs)
+        )
+
+    def get_image_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询任务状态和进度"""
+        return self.job_queue.get_job_info(job_id)
+
+    def cancel_image_job(self, job_id: str) -> bool:
+        """取消任务（排队中直接移除，运行中通知gradio取消）"""
+        return self.job_queue.cancel(job_id)
+
+    def _run_gradio_job(self, job, predict_kwargs: Dict) -> Optional[List[str]]:
+        """在队列工作线程中调用gradio服务，轮询进度并响应取消"""
+        client = self.gradio_client
+        if client is None:
+            raise ConnectionError("Gradio客户端未连接")
+
+        gradio_job = client.submit(**predict_kwargs)
+        deadline = time.time() + self.job_timeout
+        while not gradio_job.done():
+            if job.cancel_event.wait(self.JOB_POLL_INTERVAL):
+                gradio_job.cancel()
+                raise ImageJobCancelled()
+            if time.time() > deadline:
+                gradio_job.cancel()
+                raise TimeoutError(f"图像生成超过 {self.job_timeout} 秒未完成")
+            job.progress = self._read_gradio_progress(gradio_job)
+
+        # 解析结果
+        return self._parse_generation_result(gradio_job.result())
+
+    @staticmethod
+    def _read_gradio_progress(gradio_job) -> Dict[str, Any]:
+        """gradio Job 状态转为可序列化的进度信息"""
+        try:
+            status = gradio_job.status()
+        except Exception:
+            return {}
+        code = getattr(status, "code", None)
+        return {
+            "stage": getattr(code, "name", str(code)),
+            "rank": getattr(status, "rank", None),
+            "queue_size": getattr(status, "queue_size", None),
+            "eta": getattr(status, "eta", None),
+        }
 
     @service_operation_safe("解析图像生成结果失败", return_value=None)
     def _parse_generation_result(self, result) -> Optional[List[str]]:
@@ -332,6 +454,39 @@ class ImageService:
         else:
             return []
 
+    def generate_image_cached(
+        self, image_generator: str, prompt: str, **params
+    ) -> Dict[str, Any]:
+        """
+        按 (生成器, 提示词, 参数) 缓存的图片生成，用于每日总结封面这类重复提示词
+
+        Args:
+            image_generator: "coze_image_generator" 或 "hunyuan_image_generator"（默认）
+            prompt: 图片生成提示词
+            **params: 传给生成器的参数，同时参与缓存键（如 size）
+
+        Returns:
+            Dict: 与生成器返回格式一致；命中缓存时 file_path 为临时副本，
+            调用方用完可直接删除
+        """
+        cache_key = ImageResultCache.make_key(image_generator, prompt, params)
+        if self.result_cache:
+            cached_paths = self.result_cache.get(cache_key)
+            if cached_paths:
+                return {"success": True, "file_path": cached_paths[0], "cached": True}
+
+        match image_generator:
+            case "coze_image_generator":
+                if not self.coze_image_generator:
+                    return {"success": False, "error": "Coze图像生成器未配置"}
+                result = self.coze_image_generator.generate_image(prompt, **params)
+            case _:
+                result = self.hunyuan_image_generator.generate_image(prompt, **params)
+
+        if self.result_cache and result.get("success") and result.get("file_path"):
+            self.result_cache.put(cache_key, [result["file_path"]], prompt=prompt)
+        return result
+
     @service_operation_safe("图像转换处理失败", return_value=None)
     def process_image_to_image(
         self,
@@ -368,18 +523,13 @@ class ImageService:
         return self.generate_ai_image(image_input=image_input)
 
     def is_available(self, need_reinit: bool = False) -> bool:
-        """检查服务是否可用，如果不可用会尝试重新初始化"""
-        # 如果gradio客户端不可用，尝试重新初始化
-        if (
-            not self.gradio_client
-            and hasattr(self, "server_id")
-            and self.server_id
-            and need_reinit
-        ):
-            debug_utils.log_and_print(
-                "检测到Gradio服务不可用，尝试重新连接", log_level="INFO"
-            )
-            self._reinit_gradio_client()
+        """
+        检查服务是否可用
+
+        不可用且 need_reinit 时只唤醒后台健康检查去重连，不在请求路径上阻塞
+        """
+        if not self.gradio_client and need_reinit:
+            self._health_wakeup.set()
 
         return self.is_healthy and self.gradio_client is not None
 
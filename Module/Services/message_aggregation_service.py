@@ -4,15 +4,19 @@
 专门处理来自各种定时任务的信息收集和AI汇总，避免信息冲刷
 """
 
+import os
 import time
 import json
+import heapq
+import itertools
 import threading
-from typing import Dict, Any, List, Optional, Callable
+from typing import Dict, Any, List, Optional, Callable, Tuple
 from dataclasses import dataclass, asdict
 from datetime import datetime, timedelta
 from enum import Enum
 
 from Module.Common.scripts.common import debug_utils
+from libs.utils import json_codec
 from .service_decorators import service_operation_safe
 from Module.Services.constants import ServiceNames
 
@@ -50,6 +54,10 @@ class PendingMessage:
 class MessageAggregationService:
     """信息汇总服务"""
 
+    QUEUE_FILE_NAME = "message_aggregation_queue.jsonl"
+    # 日志行数超出待汇总消息数这么多行时重写快照，防止长期运行时日志无限增长
+    QUEUE_LOG_COMPACT_SLACK = 200
+
     def __init__(self, app_controller=None):
         """
         初始化信息汇总服务
@@ -61,6 +69,15 @@ class MessageAggregationService:
         self.pending_messages: Dict[str, PendingMessage] = {}
         self.aggregation_rules: Dict[str, Dict] = {}
 
+        # 按用户索引的待汇总队列
+        # 堆元素: (-优先级, -创建时间, seq, message_id)，堆顶即最应先汇总的消息
+        self._user_queues: Dict[str, List[Tuple[int, float, int, str]]] = {}
+        self._user_urgent_counts: Dict[str, int] = {}
+        # 已出队、正在发送的消息；发送失败会放回队列，压缩日志时需一并保留
+        self._inflight_messages: Dict[str, PendingMessage] = {}
+        self._queue_seq = itertools.count()
+        self._lock = threading.RLock()
+
         # 聚合配置
         self.aggregation_window = 300  # 聚合时间窗口（秒），默认5分钟
         self.max_messages_per_aggregation = 10  # 每次聚合最大消息数
@@ -73,9 +90,31 @@ class MessageAggregationService:
         # 回调函数
         self.aggregation_callback: Optional[Callable] = None
 
+        # 可选的持久化队列（追加式日志，重启后恢复）
+        self.queue_file: Optional[str] = None
+        self._queue_log_records = 0  # 日志当前行数
+        self._load_persist_config()
+        self._load_persisted_queue()
+
         self._start_aggregation_timer()
         self._start_cleanup_timer()
 
+    def _load_persist_config(self) -> None:
+        """加载持久化配置"""
+        if not self.app_controller:
+            return
+
+        config_service = self.app_controller.get_service(ServiceNames.CONFIG)
+        aggregation_cfg = config_service.get("message_aggregation", {}) if config_service else {}
+        if not aggregation_cfg.get("persist_queue", False):
+            return
+
+        cache_dir = aggregation_cfg.get(
+            "cache_dir", os.path.join(self.app_controller.project_root_path, "cache")
+        )
+        os.makedirs(cache_dir, exist_ok=True)
+        self.queue_file = os.path.join(cache_dir, self.QUEUE_FILE_NAME)
+
     def register_aggregation_callback(self, callback: Callable[[List[PendingMessage], str], bool]) -> None:
         """
         注册聚合回调函数
@@ -116,7 +155,9 @@ class MessageAggregationService:
             metadata=metadata or {}
         )
 
-        self.pending_messages[message_id] = message
+        with self._lock:
+            self._enqueue(message)
+            self._append_queue_log({"op": "add", "message": message.to_dict()})
 
         debug_utils.log_and_print(f"📝 添加待汇总消息: {source_type} [{content}]", log_level="INFO")
 
@@ -151,70 +192,172 @@ class MessageAggregationService:
         """
         self.aggregation_rules[source_type] = rule
 
+    # ================ 用户队列维护 ================
+
+    def _enqueue(self, message: PendingMessage) -> None:
+        """消息入队，O(log n)，调用方需持有锁"""
+        self.pending_messages[message.message_id] = message
+        queue = self._user_queues.setdefault(message.user_id, [])
+        heapq.heappush(
+            queue,
+            (-message.priority.value, -message.created_time, next(self._queue_seq), message.message_id)
+        )
+        if message.priority == MessagePriority.URGENT:
+            self._user_urgent_counts[message.user_id] = self._user_urgent_counts.get(message.user_id, 0) + 1
+
+    def _dequeue_top(self, user_id: str, limit: int) -> List[PendingMessage]:
+        """取出用户优先级最高的若干条消息（记为发送中），调用方需持有锁"""
+        queue = self._user_queues.get(user_id)
+        messages = []
+        while queue and len(messages) < limit:
+            _, _, _, message_id = heapq.heappop(queue)
+            message = self.pending_messages.pop(message_id, None)
+            if not message:
+                continue
+            if message.priority == MessagePriority.URGENT:
+                self._user_urgent_counts[user_id] -= 1
+            self._inflight_messages[message_id] = message
+            messages.append(message)
+        self._drop_empty_user(user_id)
+        return messages
+
+    def _drop_empty_user(self, user_id: str) -> None:
+        """清理空队列的用户索引，调用方需持有锁"""
+        if not self._user_queues.get(user_id):
+            self._user_queues.pop(user_id, None)
+        if not self._user_urgent_counts.get(user_id):
+            self._user_urgent_counts.pop(user_id, None)
+
+    def _user_pending_count(self, user_id: str) -> int:
+        """用户待汇总消息数"""
+        return len(self._user_queues.get(user_id, ()))
+
+    # ================ 持久化队列 ================
+
+    @service_operation_safe("待汇总消息日志写入失败")
+    def _append_queue_log(self, record: Dict[str, Any]) -> None:
+        """追加一条队列日志，调用方需持有锁"""
+        if not self.queue_file:
+            return
+        with open(self.queue_file, 'a', encoding='utf-8') as f:
+            f.write(json_codec.dumps(record) + "\n")
+        self._queue_log_records += 1
+        live_count = len(self.pending_messages) + len(self._inflight_messages)
+        if self._queue_log_records > live_count + self.QUEUE_LOG_COMPACT_SLACK:
+            self._compact_queue_log()
+
+    @service_operation_safe("待汇总消息队列恢复失败")
+    def _load_persisted_queue(self) -> None:
+        """回放队列日志，恢复重启前未汇总的消息"""
+        if not self.queue_file or not os.path.exists(self.queue_file):
+            return
+
+        restored: Dict[str, Dict[str, Any]] = {}
+        with open(self.queue_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json_codec.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 崩溃时可能残留半行
+                if record.get("op") == "add":
+                    message_data = record["message"]
+                    restored[message_data["message_id"]] = message_data
+                elif record.get("op") == "remove":
+                    for message_id in record.get("ids", []):
+                        restored.pop(message_id, None)
+
+        with self._lock:
+            for message_data in restored.values():
+                self._enqueue(PendingMessage.from_dict(message_data))
+            self._compact_queue_log()
+
+        if restored:
+            debug_utils.log_and_print(f"📥 恢复了 {len(restored)} 条待汇总消息", log_level="INFO")
+
+    @service_operation_safe("待汇总消息日志压缩失败")
+    def _compact_queue_log(self) -> None:
+        """用当前队列快照（含发送中的消息）重写日志，调用方需持有锁"""
+        if not self.queue_file:
+            return
+        temp_file = f"{self.queue_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            for message in [*self.pending_messages.values(), *self._inflight_messages.values()]:
+                f.write(json_codec.dumps({"op": "add", "message": message.to_dict()}) + "\n")
+        os.replace(temp_file, self.queue_file)
+        self._queue_log_records = len(self.pending_messages) + len(self._inflight_messages)
+
+    # ================ 聚合触发 ================
+
     @service_operation_safe("消息聚合失败")
     def _check_immediate_aggregation(self, user_id: str) -> None:
         """检查是否需要立即触发聚合"""
-        user_messages = [msg for msg in self.pending_messages.values() if msg.user_id == user_id]
+        with self._lock:
+            has_urgent = self._user_urgent_counts.get(user_id, 0) > 0
+            pending_count = self._user_pending_count(user_id)
 
         # 检查紧急消息
-        urgent_messages = [msg for msg in user_messages if msg.priority == MessagePriority.URGENT]
-        if urgent_messages:
+        if has_urgent:
             self._trigger_aggregation(user_id, reason="urgent_message")
             return
 
         # 检查消息数量阈值
-        if len(user_messages) >= self.max_messages_per_aggregation:
+        if pending_count >= self.max_messages_per_aggregation:
             self._trigger_aggregation(user_id, reason="max_messages_reached")
 
     @service_operation_safe("定时聚合失败")
     def _trigger_aggregation(self, user_id: str = None, reason: str = "scheduled") -> None:
         """触发消息聚合"""
         if user_id:
-            user_messages = [msg for msg in self.pending_messages.values() if msg.user_id == user_id]
+            user_ids = [user_id]
         else:
-            # 全局聚合，按用户分组
-            user_groups = {}
-            for msg in self.pending_messages.values():
-                if msg.user_id not in user_groups:
-                    user_groups[msg.user_id] = []
-                user_groups[msg.user_id].append(msg)
-
-            # 处理每个用户的消息
-            for uid, messages in user_groups.items():
-                if len(messages) >= self.min_messages_for_aggregation:
-                    self._process_user_aggregation(uid, messages, reason)
-            return
+            # 全局聚合，只处理有待汇总消息的用户
+            with self._lock:
+                user_ids = list(self._user_queues.keys())
 
-        if len(user_messages) >= self.min_messages_for_aggregation:
-            self._process_user_aggregation(user_id, user_messages, reason)
+        for uid in user_ids:
+            with self._lock:
+                if self._user_pending_count(uid) < self.min_messages_for_aggregation:
+                    continue
+                messages = self._dequeue_top(uid, self.max_messages_per_aggregation)
+            self._process_user_aggregation(uid, messages, reason)
 
     @service_operation_safe("用户消息聚合处理失败")
     def _process_user_aggregation(self, user_id: str, messages: List[PendingMessage], reason: str) -> None:
-        """处理单个用户的消息聚合"""
+        """
+        处理单个用户的消息聚合
+
+        messages已按优先级和时间出队，发送失败时放回队列
+        """
         if not messages:
             return
 
-        # 按优先级和时间排序
-        sorted_messages = sorted(messages, key=lambda x: (x.priority.value, x.created_time), reverse=True)
-
-        # 限制数量
-        messages_to_aggregate = sorted_messages[:self.max_messages_per_aggregation]
-
-        debug_utils.log_and_print(f"🔄 开始聚合用户 {user_id} 的 {len(messages_to_aggregate)} 条消息 (原因: {reason})", log_level="INFO")
+        debug_utils.log_and_print(f"🔄 开始聚合用户 {user_id} 的 {len(messages)} 条消息 (原因: {reason})", log_level="INFO")
 
-        # 调用AI汇总
-        aggregated_summary = self._generate_ai_summary(messages_to_aggregate)
-
-        # 调用回调函数发送聚合消息
-        if self.aggregation_callback:
-            success = self.aggregation_callback(messages_to_aggregate, aggregated_summary)
-            if success:
-                # 移除已聚合的消息
-                for msg in messages_to_aggregate:
-                    self.pending_messages.pop(msg.message_id, None)
-                debug_utils.log_and_print(f"✅ 用户 {user_id} 的消息聚合完成", log_level="INFO")
-            else:
-                debug_utils.log_and_print(f"❌ 用户 {user_id} 的消息聚合发送失败", log_level="ERROR")
+        success = False
+        try:
+            # 调用AI汇总
+            aggregated_summary = self._generate_ai_summary(messages)
+
+            # 调用回调函数发送聚合消息
+            if self.aggregation_callback:
+                success = self.aggregation_callback(messages, aggregated_summary)
+                if success:
+                    debug_utils.log_and_print(f"✅ 用户 {user_id} 的消息聚合完成", log_level="INFO")
+                else:
+                    debug_utils.log_and_print(f"❌ 用户 {user_id} 的消息聚合发送失败", log_level="ERROR")
+        finally:
+            with self._lock:
+                for msg in messages:
+                    self._inflight_messages.pop(msg.message_id, None)
+                if success:
+                    # 移除已聚合的消息
+                    self._append_queue_log({"op": "remove", "ids": [msg.message_id for msg in messages]})
+                else:
+                    for msg in messages:
+                        self._enqueue(msg)
 
     @service_operation_safe("AI摘要生成失败", return_value="消息摘要生成失败，请查看原始消息")
     def _generate_ai_summary(self, messages: List[PendingMessage]) -> str:
@@ -273,15 +416,29 @@ class MessageAggregationService:
         """启动清理定时器"""
         def cleanup():
             current_time = time.time()
-            expired_messages = []
 
-            for msg_id, msg in list(self.pending_messages.items()):
+            with self._lock:
                 # 清理超过24小时的消息
-                if current_time - msg.created_time > 86400:
-                    expired_messages.append(msg_id)
-
-            for msg_id in expired_messages:
-                self.pending_messages.pop(msg_id, None)
+                expired_messages = [
+                    msg_id for msg_id, msg in self.pending_messages.items()
+                    if current_time - msg.created_time > 86400
+                ]
+                affected_users = set()
+                for msg_id in expired_messages:
+                    affected_users.add(self.pending_messages.pop(msg_id).user_id)
+
+                # 只重建受影响用户的队列
+                for user_id in affected_users:
+                    queue = [entry for entry in self._user_queues.get(user_id, []) if entry[3] in self.pending_messages]
+                    heapq.heapify(queue)
+                    self._user_queues[user_id] = queue
+                    self._user_urgent_counts[user_id] = sum(
+                        1 for entry in queue if entry[0] == -MessagePriority.URGENT.value
+                    )
+                    self._drop_empty_user(user_id)
+
+                if expired_messages:
+                    self._compact_queue_log()
 
             if expired_messages:
                 debug_utils.log_and_print(f"🧹 清理了 {len(expired_messages)} 条过期消息", log_level="INFO")
@@ -297,20 +454,20 @@ class MessageAggregationService:
 
     def get_status(self) -> Dict[str, Any]:
         """获取服务状态"""
-        user_stats = {}
-        for msg in self.pending_messages.values():
-            user_id = msg.user_id
-            if user_id not in user_stats:
-                user_stats[user_id] = 0
-            user_stats[user_id] += 1
+        with self._lock:
+            user_stats = {user_id: len(queue) for user_id, queue in self._user_queues.items()}
+            urgent_stats = dict(self._user_urgent_counts)
+            total_pending = len(self.pending_messages)
 
         return {
             "service_name": "message_aggregation",
             "status": "healthy",
-            "total_pending_messages": len(self.pending_messages),
+            "total_pending_messages": total_pending,
             "users_with_pending": len(user_stats),
             "user_message_stats": user_stats,
+            "user_urgent_stats": urgent_stats,
             "aggregation_window": self.aggregation_window,
+            "persist_queue": bool(self.queue_file),
             "config": {
                 "max_messages_per_aggregation": self.max_messages_per_aggregation,
                 "min_messages_for_aggregation": self.min_messages_for_aggregation
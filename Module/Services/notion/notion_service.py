@@ -4,17 +4,21 @@ Notion服务模块
 该模块提供与Notion数据库的交互功能，特别用于获取和管理B站视频数据
 """
 
+import asyncio
 import os
 import time
-import json
 import random
+import threading
+from collections import OrderedDict
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 
 import pandas as pd
 from Module.Common.scripts import DataSource_Notion as dsn
 from Module.Services.cache_service import CacheService
+from Module.Services.async_loop_service import get_async_loop
 from Module.Common.scripts.common import debug_utils
+from libs.utils import json_codec
 from ..service_decorators import service_operation_safe, external_api_safe, file_processing_safe, cache_operation_safe
 
 
@@ -44,16 +48,50 @@ class NotionService:
         self.bili_cache_key = "bili_videos_cache"
         self.bili_cache_time_key = "bili_videos_cache_time"
         self._read_status_cache_key = "local_read_status"
+        self._pending_read_sync_key = "pending_read_sync"
 
         # 缓存有效期（秒）
         self.cache_expiry = 7200  # 2小时
+        # 到期前多久开始后台预刷新（秒）
+        self.prefetch_margin = 600
+        # 刷新失败后的最短重试间隔（秒）
+        self.refresh_retry_interval = 60
+
+        # 后台刷新状态（单飞：同一时间只有一个刷新在跑）
+        self._refresh_lock = threading.Lock()
+        self._refresh_done = threading.Event()
+        self._refresh_done.set()
+        self._last_refresh_started = 0.0
+        self._last_refresh_duration = None
+        self._last_refresh_ok = None
+        self._refresh_count = 0
 
         # 本地已读状态跟踪（用于卡片显示）
         self._local_read_status = set()  # 存储已读的pageid
 
+        # 已读同步日志：本地先生效，后台批量推送到Notion
+        # {pageid: {"date": 完成日期, "attempts": 失败次数, "next_try": 下次尝试时间}}
+        self._pending_read_sync: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._read_sync_lock = threading.Lock()
+        self._read_sync_wakeup = threading.Event()
+        self._read_sync_thread: Optional[threading.Thread] = None
+        self._save_lock = threading.Lock()
+        # 收集窗口（秒）：窗口内的多次标记合并为一批
+        self.read_sync_batch_window = 1.0
+        # 推送到Notion的并发上限
+        self.read_sync_concurrency = 4
+        # 单条最多尝试次数，超过后放弃并记录错误
+        self.read_sync_max_attempts = 5
+
         # 初始化数据
         self.cache_file = os.path.join(self.cache_service.cache_dir, "notion_bili_cache.json")
+        # 已读标记的追加日志：标记时立即落一行，缓存文件整体写入后截掉已包含的部分
+        self.read_journal_file = os.path.join(self.cache_service.cache_dir, "notion_read_journal.jsonl")
         self._load_cache()
+        self._replay_read_journal()
+        if self._pending_read_sync:
+            # 上次退出时未推送完的已读标记
+            self._ensure_read_sync_worker()
 
     def _load_cache(self) -> None:
         """加载本地缓存"""
@@ -67,24 +105,90 @@ class NotionService:
 
         try:
             if os.path.exists(self.cache_file):
-                with open(self.cache_file, "r", encoding="utf-8") as f:
-                    self.cache_data = json.load(f)
+                self.cache_data = json_codec.load_file(self.cache_file)
 
             # 加载本地已读状态
             read_status_list = self.cache_data.get(self._read_status_cache_key, [])
             self._local_read_status = set(read_status_list)
+
+            # 加载未推送的已读标记，重启后立即重试
+            for pageid, entry in self.cache_data.get(self._pending_read_sync_key, {}).items():
+                entry["next_try"] = 0
+                self._pending_read_sync[pageid] = entry
         except Exception as e:
             debug_utils.log_and_print(f"[NotionService] 加载缓存失败: {e}", log_level="ERROR")
 
+    def _replay_read_journal(self) -> None:
+        """回放缓存文件写入后新增的已读标记（上次退出前还没来得及整体落盘）"""
+        if not os.path.exists(self.read_journal_file):
+            return
+
+        try:
+            with open(self.read_journal_file, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError as e:
+            debug_utils.log_and_print(f"[NotionService] 读取已读日志失败: {e}", log_level="ERROR")
+            return
+
+        for line in lines:
+            try:
+                record = json_codec.loads(line)
+            except ValueError:
+                continue  # 崩溃时可能残留半行
+            pageid = record.get("pageid")
+            if not pageid:
+                continue
+            self._apply_local_read(pageid)
+            self._pending_read_sync[pageid] = {
+                "date": record.get("date"),
+                "attempts": 0,
+                "next_try": 0,
+            }
+
+    def _append_read_journal(self, pageid: str, date: str) -> None:
+        """已读标记追加写入日志，调用方需持有 _read_sync_lock"""
+        try:
+            os.makedirs(self.cache_service.cache_dir, exist_ok=True)
+            with open(self.read_journal_file, "a", encoding="utf-8") as f:
+                f.write(json_codec.dumps({"pageid": pageid, "date": date}) + "\n")
+        except OSError as e:
+            debug_utils.log_and_print(f"[NotionService] 写入已读日志失败: {e}", log_level="ERROR")
+
+    def _truncate_read_journal(self, offset: int) -> None:
+        """丢弃已随缓存文件落盘的前 offset 字节日志，调用方需持有 _read_sync_lock"""
+        if offset <= 0 or not os.path.exists(self.read_journal_file):
+            return
+        with open(self.read_journal_file, "rb") as f:
+            f.seek(offset)
+            tail = f.read()
+        if tail:
+            temp_file = f"{self.read_journal_file}.tmp"
+            with open(temp_file, "wb") as f:
+                f.write(tail)
+            os.replace(temp_file, self.read_journal_file)
+        else:
+            os.remove(self.read_journal_file)
+
     @file_processing_safe("Notion缓存保存失败")
     def _save_cache(self) -> None:
-        """保存缓存到本地"""
-        # 更新已读状态到缓存数据
-        self.cache_data[self._read_status_cache_key] = list(self._local_read_status)
-
-        os.makedirs(self.cache_service.cache_dir, exist_ok=True)
-        with open(self.cache_file, "w", encoding="utf-8") as f:
-            json.dump(self.cache_data, f, ensure_ascii=False, indent=2)
+        """保存缓存到本地（原子写入，刷新线程与已读同步线程串行），随后截掉已包含的已读日志"""
+        with self._save_lock:
+            # 更新已读状态和待同步日志到缓存数据
+            self.cache_data[self._read_status_cache_key] = list(self._local_read_status)
+            with self._read_sync_lock:
+                self.cache_data[self._pending_read_sync_key] = dict(self._pending_read_sync)
+                # 快照之后追加的日志行不在本次写入里，需保留
+                journal_offset = (
+                    os.path.getsize(self.read_journal_file)
+                    if os.path.exists(self.read_journal_file)
+                    else 0
+                )
+
+            os.makedirs(self.cache_service.cache_dir, exist_ok=True)
+            json_codec.dump_file(self.cache_file, self.cache_data)
+
+            with self._read_sync_lock:
+                self._truncate_read_journal(journal_offset)
 
     def _is_cache_valid(self) -> bool:
         """
@@ -100,10 +204,12 @@ class NotionService:
         """
         判断是否需要显示数据同步提示消息
 
+        过期缓存会先直接返回、后台刷新，只有没有任何缓存数据时才需要等待同步
+
         Returns:
             bool: 如果需要同步数据则返回True
         """
-        return not self._is_cache_valid() or not self.cache_data.get(self.bili_cache_key)
+        return not self.cache_data.get(self.bili_cache_key)
 
     def _select_video_by_priority(self, videos: List[Dict]) -> Dict:
         """
@@ -174,12 +280,65 @@ class NotionService:
             "upload_date": video.get("upload_date", ""),
         }
 
-    def update_bili_cache(self) -> None:
+    def update_bili_cache(self, blocking: bool = False) -> None:
         """
-        根据需要更新B站视频缓存
+        根据需要更新B站视频缓存（stale-while-revalidate）
+
+        - 没有缓存数据：等待刷新完成
+        - 缓存过期或临近过期：立即返回现有缓存，后台刷新
+        - blocking=True 时缓存过期也等待刷新完成（如早间汇总需要最新数据）
+
+        Args:
+            blocking: 缓存过期时是否等待刷新
+        """
+        has_data = bool(self.cache_data.get(self.bili_cache_key))
+        cache_age = time.time() - self.cache_data.get(self.bili_cache_time_key, 0)
+
+        if has_data and cache_age < self.cache_expiry - self.prefetch_margin:
+            return
+
+        done = self._start_background_refresh(force=not has_data)
+        if done and (not has_data or (blocking and cache_age >= self.cache_expiry)):
+            done.wait()
+
+    def _start_background_refresh(self, force: bool = False) -> Optional[threading.Event]:
+        """
+        启动后台刷新（单飞），返回本次刷新完成事件
+
+        已有刷新在跑时返回该刷新的事件；上次刷新失败未满重试间隔且非 force 时返回None
         """
-        if not self._is_cache_valid() or not self.cache_data.get(self.bili_cache_key):
+        with self._refresh_lock:
+            if not self._refresh_done.is_set():
+                return self._refresh_done
+            if (
+                not force
+                and self._last_refresh_ok is False
+                and time.time() - self._last_refresh_started < self.refresh_retry_interval
+            ):
+                return None
+
+            self._refresh_done = threading.Event()
+            self._last_refresh_started = time.time()
+            done = self._refresh_done
+
+        threading.Thread(
+            target=self._refresh_worker, args=(done,), name="notion_bili_refresh", daemon=True
+        ).start()
+        return done
+
+    def _refresh_worker(self, done: threading.Event) -> None:
+        """后台刷新线程：拉取Notion数据并记录耗时与结果"""
+        previous_cache_time = self.cache_data.get(self.bili_cache_time_key, 0)
+        start = time.time()
+        try:
             self._update_bili_cache_sync()
+        finally:
+            self._last_refresh_duration = time.time() - start
+            self._last_refresh_ok = (
+                self.cache_data.get(self.bili_cache_time_key, 0) != previous_cache_time
+            )
+            self._refresh_count += 1
+            done.set()
 
     @external_api_safe("Notion数据更新失败", api_name="Notion")
     def _update_bili_cache_sync(self) -> None:
@@ -191,42 +350,26 @@ class NotionService:
         # 使用更可靠的同步执行异步代码的方式
         videos = self._sync_run_coroutine(self._fetch_bili_videos_from_notion())
 
+        # 尚未推送到Notion的已读标记，新数据里仍是未读，需要重新应用
+        with self._read_sync_lock:
+            pending = set(self._pending_read_sync)
+        for v in videos:
+            if v.get("pageid") in pending:
+                v["unread"] = False
+
         # 更新缓存
         self.cache_data[self.bili_cache_key] = videos
         self.cache_data[self.bili_cache_time_key] = time.time()
-        self._local_read_status = set()
+        self._local_read_status = pending
 
         self._save_cache()
 
     def _sync_run_coroutine(self, coroutine):
         """
-        安全地同步执行异步协程
-
-        Args:
-            coroutine: 要执行的异步协程
-
-        Returns:
-            协程的执行结果
-        """
-        import asyncio
-        from concurrent.futures import ThreadPoolExecutor
+        同步执行异步协程
 
-        try:
-            # 尝试获取当前运行的事件循环
-            asyncio.get_running_loop()
-            # 如果没有抛出异常，说明当前已有事件循环在运行
-            # 使用线程池在新线程中运行事件循环
-            with ThreadPoolExecutor() as pool:
-                # 在线程池中创建新的事件循环并运行协程
-                return pool.submit(lambda: self._run_in_new_loop(coroutine)).result()
-        except RuntimeError:
-            # 如果获取不到事件循环，说明不在事件循环中
-            # 直接创建新的事件循环运行
-            return self._run_in_new_loop(coroutine)
-
-    def _run_in_new_loop(self, coroutine):
-        """
-        在新的事件循环中运行协程
+        统一交给共享后台事件循环执行，不再每次新建事件循环，
+        Notion客户端绑定在该循环上的连接可以跨调用复用
 
         Args:
             coroutine: 要执行的异步协程
@@ -234,21 +377,7 @@ class NotionService:
         Returns:
             协程的执行结果
         """
-        import asyncio
-
-        # 确保有一个事件循环
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-        # 运行协程并获取结果
-        try:
-            return loop.run_until_complete(coroutine)
-        finally:
-            # 不关闭事件循环，避免影响其他可能的异步操作
-            pass
+        return get_async_loop().run_sync(coroutine)
 
     async def _fetch_bili_videos_from_notion(self) -> List[Dict]:
         """
@@ -287,6 +416,27 @@ class NotionService:
         if "场合" in df.columns:
             df = df[~df["场合"].str.contains("避免手机", na=False)]
 
+        return self._videos_from_dataframe(df)
+
+    @staticmethod
+    def _videos_from_dataframe(df: pd.DataFrame) -> List[Dict]:
+        """
+        Notion数据表转换为视频字典列表（按列整体计算，不逐行iterrows）
+
+        Args:
+            df: Notion数据库查询结果
+
+        Returns:
+            List[Dict]: 视频数据列表
+        """
+        if df.empty:
+            return []
+
+        def column(name: str, default) -> pd.Series:
+            if name in df.columns:
+                return df[name].fillna(default)
+            return pd.Series(default, index=df.index, dtype=object)
+
         # 定义内容来源的映射
         source_mapping = {
             "homepage": "主页推送",
@@ -301,51 +451,55 @@ class NotionService:
             "Low": "👾低"
         }
 
-        # 转换为字典列表
-        videos = []
-        for _, row in df.iterrows():
-            # 将内容来源转换为中文
-            source = row.get("内容来源", "")
-            chinese_source = source_mapping.get(source, source)
-
-            # 优先级转换为中文
-            priority = row.get("优先级", "Low")
-            chinese_priority = priority_mapping.get(priority, "低")
-
-            # 将时间汇总转换为分钟:秒格式
-            duration_minutes = row.get("预估量", 0)
-            hour_switch = row.get("预估单位", "分钟")
-            if hour_switch == "小时":
-                duration_minutes = duration_minutes * 60
-            # 如果是小数，转为分钟:秒格式
-            minutes = int(duration_minutes)
-            seconds = int((duration_minutes - minutes) * 60)
-            duration_str = f"{minutes}分{seconds}秒" if seconds else f"{minutes}分钟"
-
-            video = {
-                "pageid": row.get("pageid", ""),
-                "title": row.get("待办事项", "无标题视频"),
-                "url": row.get("URL", ""),
-                "author": row.get("作者", ""),
-                "priority": priority,
-                "chinese_priority": chinese_priority,
-                "duration": duration_minutes,  # 时长（分钟）
-                "duration_str": duration_str,
-                "summary": row.get("推荐概要", ""),
-                "upload_date": str(row.get("投稿日期", "")).split(" ")[0],
-                "source": source,
-                "chinese_source": chinese_source,
-                "unread": True
-            }
-            videos.append(video)
+        # 将内容来源、优先级转换为中文
+        source = column("内容来源", "")
+        priority = column("优先级", "Low")
+        chinese_source = source.map(lambda x: source_mapping.get(x, x))
+        chinese_priority = priority.map(lambda x: priority_mapping.get(x, "低"))
+
+        # 将时间汇总转换为分钟:秒格式
+        duration_minutes = pd.to_numeric(column("预估量", 0), errors="coerce").fillna(0)
+        duration_minutes = duration_minutes.where(
+            column("预估单位", "分钟") != "小时", duration_minutes * 60
+        )
+        minutes = duration_minutes.astype(int)
+        seconds = ((duration_minutes - minutes) * 60).astype(int)
+        duration_str = (minutes.astype(str) + "分" + seconds.astype(str) + "秒").where(
+            seconds != 0, minutes.astype(str) + "分钟"
+        )
+
+        # 投稿日期只保留日期部分；datetime 列里的 NaT 不会被 fillna("") 替换，需单独置空
+        upload_date = column("投稿日期", "")
+        upload_date = (
+            upload_date.astype(str).str.split(" ").str[0].where(upload_date.notna(), "")
+        )
 
-        return videos
+        videos = pd.DataFrame({
+            "pageid": column("pageid", ""),
+            "title": column("待办事项", "无标题视频"),
+            "url": column("URL", ""),
+            "author": column("作者", ""),
+            "priority": priority,
+            "chinese_priority": chinese_priority,
+            "duration": duration_minutes,  # 时长（分钟）
+            "duration_str": duration_str,
+            "summary": column("推荐概要", ""),
+            "upload_date": upload_date,
+            "source": source,
+            "chinese_source": chinese_source,
+            "unread": True,
+        }).astype(object)
+
+        return videos.to_dict("records")
 
     @external_api_safe("视频标记已读失败", return_value=False, api_name="Notion")
     def mark_video_as_read(self, pageid: str) -> bool:
         """
         将视频标记为已读
 
+        本地缓存立即生效，Notion更新记入待同步日志（同时追加一行到已读日志文件，
+        重启不丢），由后台批量推送；缓存文件在每批推送后统一写一次
+
         Args:
             pageid: Notion页面ID
 
@@ -355,26 +509,121 @@ class NotionService:
         if not pageid:
             return False
 
-        # 更新Notion页面属性 (同步方式)
-        today_date = datetime.now().strftime("%Y-%m-%d")
-        page_properties = {
-            "完成日期": {"date": {"start": today_date, "end": None}}
-        }
+        self._apply_local_read(pageid)
 
-        # 启动一个异步任务更新Notion，但不等待完成
-        self._update_notion_property_async(pageid, page_properties)
+        # 记入待同步日志并落盘，唤醒后台推送
+        date = datetime.now().strftime("%Y-%m-%d")
+        with self._read_sync_lock:
+            self._pending_read_sync[pageid] = {
+                "date": date,
+                "attempts": 0,
+                "next_try": 0,
+            }
+            self._append_read_journal(pageid, date)
+        self._ensure_read_sync_worker()
+        self._read_sync_wakeup.set()
 
-        # 更新本地缓存 (这部分是同步的)
+        return True
+
+    def _apply_local_read(self, pageid: str) -> None:
+        """本地缓存和已读状态跟踪中标记为已读"""
         if self.bili_cache_key in self.cache_data:
             for v in self.cache_data[self.bili_cache_key]:
                 if v.get("pageid") == pageid:
                     v["unread"] = False
 
-        # 添加到本地已读状态跟踪
         self._local_read_status.add(pageid)
-        self._save_cache()
 
-        return True
+    def _ensure_read_sync_worker(self) -> None:
+        """按需启动后台已读同步线程"""
+        with self._read_sync_lock:
+            if self._read_sync_thread and self._read_sync_thread.is_alive():
+                return
+            self._read_sync_thread = threading.Thread(
+                target=self._read_sync_loop, name="notion_read_sync", daemon=True
+            )
+            self._read_sync_thread.start()
+
+    def _read_sync_loop(self) -> None:
+        """后台已读同步：收集一个窗口内的标记，批量推送到Notion后统一落盘"""
+        while True:
+            with self._read_sync_lock:
+                next_tries = [e["next_try"] for e in self._pending_read_sync.values()]
+            wait = max(0.0, min(next_tries) - time.time()) if next_tries else None
+            self._read_sync_wakeup.wait(wait)
+            self._read_sync_wakeup.clear()
+
+            # 收集窗口，合并连续的多次标记
+            time.sleep(self.read_sync_batch_window)
+
+            now = time.time()
+            with self._read_sync_lock:
+                batch = {
+                    pageid: entry["date"]
+                    for pageid, entry in self._pending_read_sync.items()
+                    if entry["next_try"] <= now
+                }
+            if not batch:
+                continue
+
+            try:
+                results = self._sync_run_coroutine(self._push_read_marks_async(batch))
+            except Exception as e:
+                debug_utils.log_and_print(f"[NotionService] 已读状态批量同步失败: {e}", log_level="ERROR")
+                results = {pageid: False for pageid in batch}
+
+            self._apply_read_sync_results(results)
+            self._save_cache()
+
+    async def _push_read_marks_async(self, batch: Dict[str, str]) -> Dict[str, bool]:
+        """
+        并发推送一批已读标记（并发数受 read_sync_concurrency 限制）
+
+        Args:
+            batch: {pageid: 完成日期}
+
+        Returns:
+            Dict[str, bool]: 每个页面是否更新成功
+        """
+        semaphore = asyncio.Semaphore(self.read_sync_concurrency)
+
+        async def push(pageid: str, date: str) -> bool:
+            page_properties = {
+                "完成日期": {"date": {"start": date, "end": None}}
+            }
+            async with semaphore:
+                try:
+                    await self._update_page_properties_async(pageid, page_properties)
+                    return True
+                except Exception as e:
+                    debug_utils.log_and_print(
+                        f"[NotionService] 更新页面属性失败({pageid}): {e}", log_level="WARNING"
+                    )
+                    return False
+
+        pageids = list(batch)
+        outcomes = await asyncio.gather(*(push(pageid, batch[pageid]) for pageid in pageids))
+        return dict(zip(pageids, outcomes))
+
+    def _apply_read_sync_results(self, results: Dict[str, bool]) -> None:
+        """成功的移出日志；失败的指数退避重试，超过次数上限后放弃"""
+        now = time.time()
+        with self._read_sync_lock:
+            for pageid, ok in results.items():
+                entry = self._pending_read_sync.get(pageid)
+                if entry is None:
+                    continue
+                if ok:
+                    del self._pending_read_sync[pageid]
+                    continue
+                entry["attempts"] += 1
+                if entry["attempts"] >= self.read_sync_max_attempts:
+                    del self._pending_read_sync[pageid]
+                    debug_utils.log_and_print(
+                        f"[NotionService] 已读状态同步多次失败，放弃: {pageid}", log_level="ERROR"
+                    )
+                else:
+                    entry["next_try"] = now + 5 * 2 ** (entry["attempts"] - 1)
 
     def is_video_read(self, pageid: str) -> bool:
         """
@@ -430,33 +679,6 @@ class NotionService:
 
         return video
 
-    def _update_notion_property_async(self, page_id: str, page_properties: Dict) -> None:
-        """
-        异步更新Notion页面属性 (在后台线程中执行)
-
-        Args:
-            page_id: Notion页面ID
-            page_properties: 要更新的属性
-        """
-        import threading
-
-        # 创建后台任务函数
-        def run_async_update():
-            try:
-                # 使用安全的同步执行方式
-                self._sync_run_coroutine(self._update_page_properties_async(page_id, page_properties))
-
-            except Exception as e:
-                debug_utils.log_and_print(f"[NotionService] 更新页面属性失败: {e}", log_level="ERROR")
-                import traceback
-                traceback.print_exc()
-
-        # 启动一个新线程执行异步操作
-        thread = threading.Thread(target=run_async_update)
-        thread.daemon = True  # 设为守护线程，避免阻塞主程序退出
-        thread.start()
-        # 不等待线程完成，继续执行主线程
-
     async def _update_page_properties_async(self, page_id: str, page_properties: Dict) -> None:
         """
         更新Notion页面属性的异步实现
@@ -467,6 +689,28 @@ class NotionService:
         """
         await self.notion_manager.update_page_properties(page_id, page_properties)
 
+    def get_status(self) -> Dict[str, Any]:
+        """获取服务状态（含缓存新鲜度与后台刷新情况）"""
+        cache_time = self.cache_data.get(self.bili_cache_time_key, 0)
+        cache_age = time.time() - cache_time if cache_time else None
+        return {
+            "service_name": "notion",
+            "cached_videos": len(self.cache_data.get(self.bili_cache_key, [])),
+            "cache_age_seconds": round(cache_age, 1) if cache_age is not None else None,
+            "cache_expiry_seconds": self.cache_expiry,
+            "is_stale": cache_age is None or cache_age >= self.cache_expiry,
+            "refreshing": not self._refresh_done.is_set(),
+            "refresh_count": self._refresh_count,
+            "last_refresh_started": self._last_refresh_started or None,
+            "last_refresh_duration_ms": (
+                round(self._last_refresh_duration * 1000, 1)
+                if self._last_refresh_duration is not None
+                else None
+            ),
+            "last_refresh_ok": self._last_refresh_ok,
+            "pending_read_sync": len(self._pending_read_sync),
+        }
+
     def get_bili_videos_multiple(self) -> Dict:
         """
         获取多个B站视频推荐（1个主推荐 + 最多3个额外推荐）
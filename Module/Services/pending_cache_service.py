@@ -6,13 +6,17 @@
 
 import time
 import json
+import heapq
 import asyncio
+import itertools
 import threading
-from typing import Dict, Any, Optional, Callable, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Callable, List, Tuple
 from dataclasses import dataclass, asdict
 from enum import Enum
 
 from Module.Common.scripts.common import debug_utils
+from libs.utils import json_codec
 from .service_decorators import cache_operation_safe
 from Module.Services.constants import UITypes, DefaultActions
 
@@ -132,6 +136,14 @@ class PendingOperation:
 class PendingCacheService:
     """缓存业务服务"""
 
+    # 调度事件类型
+    EVENT_EXPIRE = "expire"
+    EVENT_UI_UPDATE = "ui_update"
+    EVENT_CLEANUP = "cleanup"
+
+    # 执行到期事件的工作线程数 - 避免慢回调阻塞调度线程
+    EVENT_WORKERS = 4
+
     def __init__(self, cache_dir: str = "cache", max_operations_per_user: int = 2):
         """
         初始化缓存业务服务
@@ -144,35 +156,42 @@ class PendingCacheService:
         self.max_operations_per_user = max_operations_per_user
         self.pending_operations: Dict[str, PendingOperation] = {}
         self.user_operations: Dict[str, List[str]] = {}  # user_id -> operation_ids
-
-        # 定时器管理
-        self.timers: Dict[str, threading.Timer] = {}
         self.executor_callbacks: Dict[str, Callable] = {}  # operation_type -> callback
 
         # UI更新推送相关 - 支持多种前端
         self.ui_update_callbacks: Dict[str, Callable] = {}  # ui_type -> callback
         self.auto_update_enabled: bool = True
-        self.update_interval: int = 1
+        self.update_interval: int = 1       # UI更新失败后的重试间隔（秒）
+        self.countdown_interval: int = 5    # 倒计时刷新间隔（秒）
         self.max_updates: int = 60
-        self._update_thread: Optional[threading.Thread] = None
+
+        # 截止时间调度 - 单线程 + 最小堆，替代每个操作一个Timer
+        # 堆元素: (deadline, seq, event_kind, operation_id)，通过token做惰性失效
+        self._schedule_heap: List[Tuple[float, int, str, str]] = []
+        self._event_tokens: Dict[Tuple[str, str], int] = {}  # (event_kind, operation_id) -> seq
+        self._schedule_seq = itertools.count()
+        self._schedule_cond = threading.Condition()
+        self._scheduler_thread: Optional[threading.Thread] = None
         self._stop_update_flag: bool = False
+        self._event_workers = ThreadPoolExecutor(
+            max_workers=self.EVENT_WORKERS, thread_name_prefix="pending_cache_event"
+        )
 
         # 加载已保存的操作
         self._load_operations()
 
-        # 启动清理定时器
-        self._start_cleanup_timer()
+        # 初始清理 - 1分钟后开始
+        self._schedule_event(self.EVENT_CLEANUP, "", time.time() + 60)
 
-        # 启动自动更新线程
-        self._start_auto_update_thread()
+        # 启动调度线程
+        self._start_scheduler_thread()
 
     @cache_operation_safe("加载缓存操作失败", return_value={})
     def _load_operations(self) -> None:
         """加载已保存的操作"""
         cache_file = f"{self.cache_dir}/pending_operations.json"
         try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = json_codec.load_file(cache_file)
 
             for op_id, op_data in data.items():
                 operation = PendingOperation.from_dict(op_data)
@@ -192,6 +211,7 @@ class PendingCacheService:
                 # 重新设置定时器
                 if operation.status == OperationStatus.PENDING:
                     self._set_expiry_timer(operation)
+                    self._schedule_ui_update(operation)
 
         except (FileNotFoundError, json.JSONDecodeError, KeyError):
             # 文件不存在或格式错误，从空开始
@@ -205,9 +225,7 @@ class PendingCacheService:
         os.makedirs(self.cache_dir, exist_ok=True)
 
         data = {op_id: op.to_dict() for op_id, op in self.pending_operations.items()}
-
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        json_codec.dump_file(cache_file, data)
 
     def register_executor(self, operation_type: str, callback: Callable[[PendingOperation], bool]) -> None:
         """
@@ -440,26 +458,148 @@ class PendingCacheService:
 
     def _set_expiry_timer(self, operation: PendingOperation) -> None:
         """设置过期定时器"""
-        remaining_time = operation.get_remaining_time()
-        if remaining_time <= 0:
+        if operation.status != OperationStatus.PENDING:
             return
+        self._schedule_event(self.EVENT_EXPIRE, operation.operation_id, operation.expire_time)
 
-        def on_expire():
-            if operation.operation_id in self.pending_operations:
-                if operation.default_action == "confirm":
-                    self.confirm_operation(operation.operation_id, force_execute=True)
-                else:
-                    self.cancel_operation(operation.operation_id, force_execute=True)
+    def _cancel_timer(self, operation_id: str) -> None:
+        """取消定时器（过期和UI刷新）"""
+        with self._schedule_cond:
+            self._event_tokens.pop((self.EVENT_EXPIRE, operation_id), None)
+            self._event_tokens.pop((self.EVENT_UI_UPDATE, operation_id), None)
 
-        timer = threading.Timer(remaining_time, on_expire)
-        timer.start()
-        self.timers[operation.operation_id] = timer
+    # ================ 截止时间调度 ================
 
-    def _cancel_timer(self, operation_id: str) -> None:
-        """取消定时器"""
-        timer = self.timers.pop(operation_id, None)
-        if timer:
-            timer.cancel()
+    def _schedule_event(self, event_kind: str, operation_id: str, deadline: float) -> None:
+        """
+        登记一个截止时间事件，同类型同操作的旧事件自动失效
+
+        Args:
+            event_kind: 事件类型
+            operation_id: 操作ID（清理事件为空字符串）
+            deadline: 触发时间戳
+        """
+        with self._schedule_cond:
+            seq = next(self._schedule_seq)
+            self._event_tokens[(event_kind, operation_id)] = seq
+            heapq.heappush(self._schedule_heap, (deadline, seq, event_kind, operation_id))
+            # 新事件成为堆顶时唤醒调度线程重新计算等待时间
+            if self._schedule_heap[0][1] == seq:
+                self._schedule_cond.notify()
+
+    def _pop_due_events(self) -> List[Tuple[str, str]]:
+        """等待并取出所有已到期的有效事件"""
+        with self._schedule_cond:
+            while not self._stop_update_flag:
+                now = time.time()
+                if self._schedule_heap and self._schedule_heap[0][0] <= now:
+                    break
+                timeout = self._schedule_heap[0][0] - now if self._schedule_heap else None
+                self._schedule_cond.wait(timeout)
+
+            due_events = []
+            now = time.time()
+            while self._schedule_heap and self._schedule_heap[0][0] <= now:
+                _, seq, event_kind, operation_id = heapq.heappop(self._schedule_heap)
+                key = (event_kind, operation_id)
+                if self._event_tokens.get(key) != seq:
+                    continue  # 已取消或被重新调度
+                del self._event_tokens[key]
+                due_events.append(key)
+            return due_events
+
+    def _start_scheduler_thread(self) -> None:
+        """启动调度线程"""
+        def scheduler_loop():
+            debug_utils.log_and_print("🔄 启动缓存操作调度线程", log_level="INFO")
+            while not self._stop_update_flag:
+                for event_kind, operation_id in self._pop_due_events():
+                    if self._stop_update_flag:
+                        break
+                    self._event_workers.submit(self._dispatch_event, event_kind, operation_id)
+            debug_utils.log_and_print("⏹️ 缓存操作调度线程已停止", log_level="INFO")
+
+        self._scheduler_thread = threading.Thread(target=scheduler_loop, daemon=True)
+        self._scheduler_thread.start()
+
+    def _dispatch_event(self, event_kind: str, operation_id: str) -> None:
+        """在工作线程中执行到期事件"""
+        try:
+            if event_kind == self.EVENT_EXPIRE:
+                self._on_operation_expire(operation_id)
+            elif event_kind == self.EVENT_UI_UPDATE:
+                self._on_ui_update_due(operation_id)
+            elif event_kind == self.EVENT_CLEANUP:
+                next_cleanup = self._run_cleanup()
+                self._schedule_event(self.EVENT_CLEANUP, "", time.time() + next_cleanup)
+        except Exception as e:
+            debug_utils.log_and_print(f"❌ 调度事件执行异常: {event_kind} {e}", log_level="ERROR")
+
+    def _on_operation_expire(self, operation_id: str) -> None:
+        """倒计时结束，执行默认操作"""
+        operation = self.pending_operations.get(operation_id)
+        if not operation or operation.status != OperationStatus.PENDING:
+            return
+
+        debug_utils.log_and_print(f"⏰ 倒计时结束，执行默认操作: {operation.default_action} [{operation_id[:20]}...]", log_level="INFO")
+        if operation.default_action == DefaultActions.CONFIRM:
+            self.confirm_operation(operation_id, force_execute=True)
+        else:
+            self.cancel_operation(operation_id, force_execute=True)
+
+    def _schedule_ui_update(self, operation: PendingOperation, delay: Optional[float] = None) -> None:
+        """
+        安排下一次倒计时UI刷新
+
+        Args:
+            operation: 操作对象
+            delay: 指定延迟（秒），为空时对齐到下一个倒计时刷新点
+        """
+        if not self.auto_update_enabled or not operation.ui_message_id:
+            return
+        if operation.status != OperationStatus.PENDING or operation.update_count >= self.max_updates:
+            return
+
+        current_time = time.time()
+        if delay is not None:
+            deadline = current_time + delay
+        else:
+            # 以创建时间为基准对齐刷新点，错过的刷新点直接跳过，不做补发
+            elapsed_ticks = int((current_time - operation.created_time) / self.countdown_interval)
+            deadline = operation.created_time + (elapsed_ticks + 1) * self.countdown_interval
+
+        # 过期之后的刷新没有意义，由过期事件负责最终状态
+        if deadline >= operation.expire_time:
+            return
+        self._schedule_event(self.EVENT_UI_UPDATE, operation.operation_id, deadline)
+
+    def _on_ui_update_due(self, operation_id: str) -> None:
+        """刷新倒计时UI，并安排下一次刷新"""
+        operation = self.pending_operations.get(operation_id)
+        if not operation or operation.status != OperationStatus.PENDING:
+            return
+
+        ui_callback = self.ui_update_callbacks.get(operation.ui_type)
+        if not ui_callback:
+            # 回调可能尚未注册（启动阶段），等待下一个刷新点
+            self._schedule_ui_update(operation)
+            return
+
+        # 更新操作数据中的倒计时文本
+        operation.operation_data['hold_time'] = operation.get_remaining_time_text()
+
+        if ui_callback(operation):
+            operation.last_update_time = time.time()
+            operation.update_count += 1
+            operation.update_retry_count = 0  # 重置重试计数
+            self._schedule_ui_update(operation)
+        elif operation.can_retry_update():
+            # 更新失败，短间隔重试
+            operation.update_retry_count += 1
+            self._schedule_ui_update(operation, delay=self.update_interval)
+        else:
+            operation.update_retry_count = 0
+            self._schedule_ui_update(operation)
 
     def _format_hold_time(self, seconds: int) -> str:
         """格式化倒计时文本"""
@@ -474,78 +614,72 @@ class PendingCacheService:
             minutes = (seconds % 3600) // 60
             return f"({hours}时{minutes}分)" if minutes > 0 else f"({hours}时)"
 
-    def _start_cleanup_timer(self) -> None:
-        """启动清理定时器"""
-        def cleanup():
-            try:
-                expired_ops = []
-                completed_ops = []
-                current_time = time.time()
-
-                for op_id, operation in list(self.pending_operations.items()):
-                    # 清理1：过期但未处理的操作 - 使用较大的宽容度
-                    if operation.status == OperationStatus.PENDING and operation.is_expired(tolerance_seconds=30):
-                        expired_ops.append(op_id)
-                        debug_utils.log_and_print(f"⏰ 操作 {op_id} 已过期", log_level="INFO")
-
-                    # 清理2：已完成操作（超过1小时）
-                    elif operation.status in [OperationStatus.EXECUTED, OperationStatus.CANCELLED, OperationStatus.EXPIRED]:
-                        if current_time - operation.created_time > 3600:  # 1小时
-                            completed_ops.append(op_id)
-
-                    # 清理3：异常状态的操作（超过24小时）
-                    elif current_time - operation.created_time > 86400:  # 24小时
-                        expired_ops.append(op_id)
-                        debug_utils.log_and_print(f"🧹 清理异常状态操作 {op_id} (状态: {operation.status.value})", log_level="WARNING")
-
-                # 执行清理
-                total_cleaned = 0
-
-                # 清理过期操作
-                for op_id in expired_ops:
-                    operation = self.pending_operations.pop(op_id, None)
-                    if operation:
-                        self._remove_from_user_index(operation.user_id, op_id)
-                        self._cancel_timer(op_id)
-                        total_cleaned += 1
-
-                # 清理已完成操作
-                for op_id in completed_ops:
-                    operation = self.pending_operations.pop(op_id, None)
-                    if operation:
-                        self._remove_from_user_index(operation.user_id, op_id)
-                        self._cancel_timer(op_id)
-                        total_cleaned += 1
-
-                if total_cleaned > 0:
-                    self._save_operations()
-                    debug_utils.log_and_print(f"🧹 清理了 {total_cleaned} 个过期/完成操作", log_level="INFO")
-
-                # 内存状态检查
-                pending_count = len([op for op in self.pending_operations.values() if op.status == OperationStatus.PENDING])
-                if pending_count > 100:  # 警告阈值
-                    debug_utils.log_and_print(f"⚠️ pending操作数量较多: {pending_count}", log_level="WARNING")
-
-            except Exception as e:
-                debug_utils.log_and_print(f"❌ 定期清理异常: {e}", log_level="ERROR")
-
-            # 设置下次清理 - 根据操作数量调整清理频率
-            operation_count = len(self.pending_operations)
-            if operation_count > 50:
-                next_cleanup = 300  # 5分钟
-            elif operation_count > 10:
-                next_cleanup = 900  # 15分钟
-            else:
-                next_cleanup = 1800  # 30分钟
+    def _run_cleanup(self) -> int:
+        """
+        定期清理过期和已完成的操作
 
-            timer = threading.Timer(next_cleanup, cleanup)
-            timer.daemon = True
-            timer.start()
+        Returns:
+            int: 下次清理的间隔（秒）
+        """
+        try:
+            expired_ops = []
+            completed_ops = []
+            current_time = time.time()
+
+            for op_id, operation in list(self.pending_operations.items()):
+                # 清理1：过期但未处理的操作 - 使用较大的宽容度
+                if operation.status == OperationStatus.PENDING and operation.is_expired(tolerance_seconds=30):
+                    expired_ops.append(op_id)
+                    debug_utils.log_and_print(f"⏰ 操作 {op_id} 已过期", log_level="INFO")
+
+                # 清理2：已完成操作（超过1小时）
+                elif operation.status in [OperationStatus.EXECUTED, OperationStatus.CANCELLED, OperationStatus.EXPIRED]:
+                    if current_time - operation.created_time > 3600:  # 1小时
+                        completed_ops.append(op_id)
+
+                # 清理3：异常状态的操作（超过24小时）
+                elif current_time - operation.created_time > 86400:  # 24小时
+                    expired_ops.append(op_id)
+                    debug_utils.log_and_print(f"🧹 清理异常状态操作 {op_id} (状态: {operation.status.value})", log_level="WARNING")
+
+            # 执行清理
+            total_cleaned = 0
+
+            # 清理过期操作
+            for op_id in expired_ops:
+                operation = self.pending_operations.pop(op_id, None)
+                if operation:
+                    self._remove_from_user_index(operation.user_id, op_id)
+                    self._cancel_timer(op_id)
+                    total_cleaned += 1
+
+            # 清理已完成操作
+            for op_id in completed_ops:
+                operation = self.pending_operations.pop(op_id, None)
+                if operation:
+                    self._remove_from_user_index(operation.user_id, op_id)
+                    self._cancel_timer(op_id)
+                    total_cleaned += 1
+
+            if total_cleaned > 0:
+                self._save_operations()
+                debug_utils.log_and_print(f"🧹 清理了 {total_cleaned} 个过期/完成操作", log_level="INFO")
+
+            # 内存状态检查
+            pending_count = len([op for op in self.pending_operations.values() if op.status == OperationStatus.PENDING])
+            if pending_count > 100:  # 警告阈值
+                debug_utils.log_and_print(f"⚠️ pending操作数量较多: {pending_count}", log_level="WARNING")
 
-        # 初始清理 - 1分钟后开始
-        timer = threading.Timer(60, cleanup)
-        timer.daemon = True
-        timer.start()
+        except Exception as e:
+            debug_utils.log_and_print(f"❌ 定期清理异常: {e}", log_level="ERROR")
+
+        # 设置下次清理 - 根据操作数量调整清理频率
+        operation_count = len(self.pending_operations)
+        if operation_count > 50:
+            return 300  # 5分钟
+        if operation_count > 10:
+            return 900  # 15分钟
+        return 1800  # 30分钟
 
     def _remove_from_user_index(self, user_id: str, operation_id: str) -> None:
         """从用户操作索引中移除操作"""
@@ -612,7 +746,7 @@ class PendingCacheService:
                 "5m_to_1h": 0,
                 "over_1h": 0
             },
-            "active_timers": len(self.timers),
+            "active_timers": len(self._event_tokens),
             "oldest_operation": None,
             "newest_operation": None
         }
@@ -669,89 +803,18 @@ class PendingCacheService:
             "total_operations": len(self.pending_operations),
             "pending_operations": pending_count,
             "registered_executors": list(self.executor_callbacks.keys()),
-            "active_timers": len(self.timers),
+            "active_timers": len(self._event_tokens),
+            "scheduler_alive": bool(self._scheduler_thread and self._scheduler_thread.is_alive()),
             "max_operations_per_user": self.max_operations_per_user
         }
 
-    def _start_auto_update_thread(self) -> None:
-        """启动自动更新线程"""
-        if not self.auto_update_enabled:
-            return
-
-        def auto_update():
-            debug_utils.log_and_print("🔄 启动UI自动更新线程", log_level="INFO")
-            while not self._stop_update_flag:
-                try:
-                    updated_count = 0
-                    retry_count = 0
-
-                    # 第一步：独立的过期检测 - 优先处理所有过期操作，使用标准宽容度
-                    expired_operations = []
-                    for op_id, operation in list(self.pending_operations.items()):
-                        if operation.status == OperationStatus.PENDING and operation.is_expired(tolerance_seconds=5):
-                            expired_operations.append((op_id, operation))
-
-                    # 处理所有过期操作
-                    for op_id, operation in expired_operations:
-                        debug_utils.log_and_print(f"⏰ 倒计时结束，执行默认操作: {operation.default_action} [{op_id[:20]}...]", log_level="INFO")
-                        if operation.default_action == "confirm":
-                            self.confirm_operation(op_id, force_execute=True)
-                        else:
-                            self.cancel_operation(op_id, force_execute=True)
-
-                    # 第二步：收集需要UI更新的操作（排除已过期的）
-                    operations_to_update = []
-                    max_batch_size = 10
-
-                    for op_id, operation in list(self.pending_operations.items()):
-                        if operation.needs_ui_update(self.update_interval):
-                            if len(operations_to_update) < max_batch_size:
-                                operations_to_update.append((op_id, operation))
-                            else:
-                                break
-
-                    # 移除之前的专项检测（已经在第一步处理了）
-
-                    # 第三步：处理UI更新
-                    for op_id, operation in operations_to_update:
-                        ui_callback = self.ui_update_callbacks.get(operation.ui_type)
-
-                        if ui_callback and operation.update_count < self.max_updates:
-                            # 更新操作数据中的倒计时文本
-                            old_time_text = operation.operation_data.get('hold_time', '')
-                            operation.operation_data['hold_time'] = operation.get_remaining_time_text()
-                            new_time_text = operation.operation_data['hold_time']
-
-                            # 调用UI更新回调
-                            success = ui_callback(operation)
-
-                            if success:
-                                operation.last_update_time = time.time()
-                                operation.update_count += 1
-                                operation.update_retry_count = 0  # 重置重试计数
-                                updated_count += 1
-                            else:
-                                # 更新失败，进行重试逻辑
-                                operation.update_retry_count += 1
-                                retry_count += 1
-
-                except Exception as e:
-                    debug_utils.log_and_print(f"❌ UI自动更新异常: {e}", log_level="ERROR")
-
-                time.sleep(self.update_interval)
-
-            debug_utils.log_and_print("⏹️ UI自动更新线程已停止", log_level="INFO")
-
-        self._update_thread = threading.Thread(target=auto_update, daemon=True)
-        self._update_thread.start()
-
     def configure_auto_update(self, enabled: bool = True, interval: int = 1, max_updates: int = 60) -> None:
         """
         配置自动更新参数
 
         Args:
             enabled: 是否启用自动更新
-            interval: 更新间隔（秒）
+            interval: 更新失败后的重试间隔（秒）
             max_updates: 最大更新次数
         """
         self.auto_update_enabled = enabled
@@ -759,16 +822,19 @@ class PendingCacheService:
         self.max_updates = max_updates
 
     def stop_auto_update(self) -> None:
-        """停止自动更新线程"""
-        if self._update_thread and self._update_thread.is_alive():
-            debug_utils.log_and_print("⏹️ 正在停止UI自动更新线程...", log_level="INFO")
-            self._stop_update_flag = True
-            self._update_thread.join(timeout=5)  # 5秒超时
-
-            if self._update_thread.is_alive():
-                debug_utils.log_and_print("⚠️ 自动更新线程未能正常停止", log_level="WARNING")
+        """停止调度线程"""
+        if self._scheduler_thread and self._scheduler_thread.is_alive():
+            debug_utils.log_and_print("⏹️ 正在停止缓存操作调度线程...", log_level="INFO")
+            with self._schedule_cond:
+                self._stop_update_flag = True
+                self._schedule_cond.notify_all()
+            self._scheduler_thread.join(timeout=5)  # 5秒超时
+            self._event_workers.shutdown(wait=False)
+
+            if self._scheduler_thread.is_alive():
+                debug_utils.log_and_print("⚠️ 调度线程未能正常停止", log_level="WARNING")
             else:
-                debug_utils.log_and_print("✅ 自动更新线程已停止", log_level="INFO")
+                debug_utils.log_and_print("✅ 调度线程已停止", log_level="INFO")
 
     def register_ui_update_callback(self, ui_type: str, callback: Callable[[PendingOperation], bool]) -> None:
         """
@@ -803,6 +869,9 @@ class PendingCacheService:
         operation.last_update_time = time.time()
         self._save_operations()
 
+        # 绑定后才开始倒计时刷新
+        self._schedule_ui_update(operation)
+
         return True
 
     def _update_ui_for_completed_operation(self, operation, result_text: str, result_type: str):
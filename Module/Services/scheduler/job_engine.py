@@ -0,0 +1,388 @@
+"""
+定时任务引擎
+
+事件驱动的任务调度：
+1. 调度线程按最近的触发时间休眠，不再每秒轮询
+2. 任务在有界线程池中运行，慢任务不阻塞其他任务
+3. 每个任务可配置重叠策略和错过触发（misfire）策略
+4. 任务触发记录持久化，重启后可判断停机期间错过的任务
+"""
+
+import os
+import json
+import time
+import heapq
+import bisect
+import datetime
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+from Module.Common.scripts.common import debug_utils
+from libs.utils import json_codec
+from Module.Services.constants import SchedulerOverlapPolicies, SchedulerMisfirePolicies
+
+
+WEEKDAY_NAMES = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+
+class JobTrigger:
+    """
+    触发规则：若干个(星期, 时刻)组合
+
+    星期为None表示每天
+    """
+
+    def __init__(self, fire_times: List[Tuple[Optional[int], datetime.time]]):
+        self.fire_times = sorted(fire_times, key=lambda item: (item[0] is not None, item[0] or 0, item[1]))
+
+    @classmethod
+    def daily(cls, *time_strs: str) -> 'JobTrigger':
+        """每天在指定时刻触发，时间格式为HH:MM或HH:MM:SS"""
+        return cls([(None, cls.parse_time(time_str)) for time_str in time_strs])
+
+    @classmethod
+    def weekly(cls, day_of_week: str, time_str: str) -> 'JobTrigger':
+        """每周指定星期的指定时刻触发"""
+        weekday = WEEKDAY_NAMES.index(day_of_week.lower())
+        return cls([(weekday, cls.parse_time(time_str))])
+
+    @staticmethod
+    def parse_time(time_str: str) -> datetime.time:
+        """解析HH:MM或HH:MM:SS"""
+        time_format = "%H:%M:%S" if time_str.count(":") == 2 else "%H:%M"
+        return datetime.datetime.strptime(time_str, time_format).time()
+
+    def next_fire_after(self, after: datetime.datetime) -> datetime.datetime:
+        """返回严格晚于after的下一个触发时间"""
+        candidates = []
+        for weekday, fire_time in self.fire_times:
+            candidate = datetime.datetime.combine(after.date(), fire_time)
+            if weekday is None:
+                if candidate <= after:
+                    candidate += datetime.timedelta(days=1)
+            else:
+                candidate += datetime.timedelta(days=(weekday - after.weekday()) % 7)
+                if candidate <= after:
+                    candidate += datetime.timedelta(days=7)
+            candidates.append(candidate)
+        return min(candidates)
+
+    def describe(self) -> str:
+        """触发规则的稳定文本表示，用于识别配置变化"""
+        return ",".join(
+            f"{WEEKDAY_NAMES[weekday] if weekday is not None else 'daily'}@{fire_time.strftime('%H:%M:%S')}"
+            for weekday, fire_time in self.fire_times
+        )
+
+
+class LatencyHistogram:
+    """固定分桶的耗时直方图（秒）"""
+
+    BUCKETS = (0.1, 0.5, 1, 5, 30, 60, 300)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = 0
+
+    def observe(self, value: float) -> None:
+        """记录一次耗时"""
+        self.counts[bisect.bisect_left(self.BUCKETS, value)] += 1
+        self.samples += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """导出为状态字典"""
+        labels = [f"<={bound}s" for bound in self.BUCKETS] + [f">{self.BUCKETS[-1]}s"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "samples": self.samples,
+            "avg": round(self.total / self.samples, 3) if self.samples else 0,
+            "max": round(self.max, 3),
+        }
+
+
+class ScheduledJob:
+    """已注册的任务及其运行状态"""
+
+    def __init__(self, name: str, trigger: JobTrigger, func: Callable,
+                 overlap_policy: str, misfire_policy: str):
+        self.name = name
+        self.trigger = trigger
+        self.func = func
+        self.overlap_policy = overlap_policy
+        self.misfire_policy = misfire_policy
+
+        self.next_run: Optional[float] = None
+        self.last_run: Optional[float] = None
+        self.running = 0
+        self.queued = False
+
+        self.run_count = 0
+        self.failure_count = 0
+        self.skipped_overlaps = 0
+        self.misfires = 0
+        self.last_error: Optional[str] = None
+        self.lateness = LatencyHistogram()
+        self.runtime = LatencyHistogram()
+
+    def to_status(self) -> Dict[str, Any]:
+        """导出任务状态"""
+        return {
+            "name": self.name,
+            "trigger": self.trigger.describe(),
+            "next_run": datetime.datetime.fromtimestamp(self.next_run) if self.next_run else None,
+            "last_run": datetime.datetime.fromtimestamp(self.last_run) if self.last_run else None,
+            "running": self.running,
+            "overlap_policy": self.overlap_policy,
+            "misfire_policy": self.misfire_policy,
+            "run_count": self.run_count,
+            "failure_count": self.failure_count,
+            "skipped_overlaps": self.skipped_overlaps,
+            "misfires": self.misfires,
+            "last_error": self.last_error,
+            "lateness": self.lateness.to_dict(),
+            "runtime": self.runtime.to_dict(),
+        }
+
+
+class JobEngine:
+    """事件驱动的任务引擎"""
+
+    def __init__(self,
+                 max_workers: int = 4,
+                 store_file: Optional[str] = None,
+                 misfire_grace_seconds: int = 60,
+                 default_overlap_policy: str = SchedulerOverlapPolicies.SKIP,
+                 default_misfire_policy: str = SchedulerMisfirePolicies.CATCH_UP):
+        """
+        初始化任务引擎
+
+        Args:
+            max_workers: 任务线程池大小
+            store_file: 任务触发记录文件，为空则不持久化
+            misfire_grace_seconds: 超过该延迟视为错过触发
+            default_overlap_policy: 默认重叠策略
+            default_misfire_policy: 默认错过触发策略
+        """
+        self.max_workers = max_workers
+        self.store_file = store_file
+        self.misfire_grace_seconds = misfire_grace_seconds
+        self.default_overlap_policy = default_overlap_policy
+        self.default_misfire_policy = default_misfire_policy
+
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stop_flag = False
+        self._loop_running = False
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scheduler_job")
+        self._store = self._load_store()
+
+    # ================ 任务管理 ================
+
+    def add_job(self, name: str, trigger: JobTrigger, func: Callable,
+                overlap_policy: Optional[str] = None,
+                misfire_policy: Optional[str] = None) -> ScheduledJob:
+        """
+        注册任务，同名任务会被替换
+
+        停机期间错过的触发按misfire策略处理：catch_up立即补跑一次，skip等待下一个触发点
+        """
+        job = ScheduledJob(
+            name, trigger, func,
+            overlap_policy or self.default_overlap_policy,
+            misfire_policy or self.default_misfire_policy,
+        )
+
+        now = time.time()
+        stored = self._store.get(name, {})
+        job.last_run = stored.get("last_run")
+        next_run = trigger.next_fire_after(datetime.datetime.fromtimestamp(now)).timestamp()
+
+        # 只有触发规则未变化时，存储的next_run才有意义
+        stored_next_run = stored.get("next_run") if stored.get("trigger") == trigger.describe() else None
+        if stored_next_run and stored_next_run < now:
+            job.misfires += 1
+            if job.misfire_policy == SchedulerMisfirePolicies.CATCH_UP:
+                debug_utils.log_and_print(f"⏰ 任务 {name} 在停机期间错过触发，立即补跑", log_level="INFO")
+                next_run = now
+            else:
+                debug_utils.log_and_print(f"⏰ 任务 {name} 在停机期间错过触发，已跳过", log_level="INFO")
+
+        with self._cond:
+            self.jobs[name] = job
+            self._push(job, next_run)
+        self._save_store()
+        return job
+
+    def remove_job(self, name: str) -> bool:
+        """移除任务，堆中的旧条目惰性失效"""
+        with self._cond:
+            job = self.jobs.pop(name, None)
+            self._store.pop(name, None)
+        if job:
+            self._save_store()
+        return job is not None
+
+    def clear(self) -> None:
+        """移除全部任务"""
+        with self._cond:
+            self.jobs.clear()
+            self._heap.clear()
+            self._store.clear()
+        self._save_store()
+
+    def _push(self, job: ScheduledJob, run_at: float) -> None:
+        """登记下一次触发，调用方需持有锁"""
+        job.next_run = run_at
+        heapq.heappush(self._heap, (run_at, next(self._seq), job.name))
+        if self._heap[0][2] == job.name and self._heap[0][0] == run_at:
+            self._cond.notify()
+
+    # ================ 调度循环 ================
+
+    def run_forever(self) -> None:
+        """在当前线程运行调度循环，直到stop()"""
+        self._loop_running = True
+        debug_utils.log_and_print("🔄 定时任务引擎已启动", log_level="INFO")
+        try:
+            while True:
+                with self._cond:
+                    while not self._stop_flag:
+                        now = time.time()
+                        if self._heap and self._heap[0][0] <= now:
+                            break
+                        timeout = self._heap[0][0] - now if self._heap else None
+                        self._cond.wait(timeout)
+                    if self._stop_flag:
+                        break
+                self.run_due()
+        finally:
+            self._loop_running = False
+            debug_utils.log_and_print("⏹️ 定时任务引擎已停止", log_level="INFO")
+
+    def stop(self, wait: bool = False) -> None:
+        """停止调度循环和任务线程池"""
+        with self._cond:
+            self._stop_flag = True
+            self._cond.notify_all()
+        self._executor.shutdown(wait=wait)
+
+    def run_due(self) -> int:
+        """
+        派发所有已到期的任务
+
+        Returns:
+            int: 派发的任务数
+        """
+        dispatched = 0
+        now = time.time()
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                scheduled_at, _, name = heapq.heappop(self._heap)
+                job = self.jobs.get(name)
+                if not job or job.next_run != scheduled_at:
+                    continue  # 已移除或被替换
+
+                self._push(job, job.trigger.next_fire_after(datetime.datetime.fromtimestamp(now)).timestamp())
+
+                lateness = now - scheduled_at
+                if lateness > self.misfire_grace_seconds and job.misfire_policy == SchedulerMisfirePolicies.SKIP:
+                    job.misfires += 1
+                    debug_utils.log_and_print(f"⏰ 任务 {name} 延迟 {lateness:.0f}s，按策略跳过", log_level="WARNING")
+                    continue
+
+                if self._submit(job, scheduled_at):
+                    dispatched += 1
+
+        if dispatched:
+            self._save_store()
+        return dispatched
+
+    def _submit(self, job: ScheduledJob, scheduled_at: float) -> bool:
+        """按重叠策略提交任务，调用方需持有锁"""
+        if job.running and job.overlap_policy != SchedulerOverlapPolicies.ALLOW:
+            if job.overlap_policy == SchedulerOverlapPolicies.QUEUE:
+                job.queued = True
+            else:
+                job.skipped_overlaps += 1
+                debug_utils.log_and_print(f"⏭️ 任务 {job.name} 仍在运行，跳过本次触发", log_level="WARNING")
+            return False
+
+        job.running += 1
+        job.last_run = time.time()
+        job.lateness.observe(max(0.0, job.last_run - scheduled_at))
+        self._executor.submit(self._run_job, job)
+        return True
+
+    def _run_job(self, job: ScheduledJob) -> None:
+        """在线程池中执行任务"""
+        start_time = time.time()
+        try:
+            job.func()
+            job.last_error = None
+        except Exception as e:
+            job.failure_count += 1
+            job.last_error = str(e)
+            debug_utils.log_and_print(f"❌ 定时任务 {job.name} 执行失败: {e}", log_level="ERROR")
+        finally:
+            job.runtime.observe(time.time() - start_time)
+            with self._cond:
+                job.run_count += 1
+                job.running -= 1
+                if job.queued and not job.running and self.jobs.get(job.name) is job and not self._stop_flag:
+                    job.queued = False
+                    self._submit(job, time.time())
+
+    # ================ 持久化 ================
+
+    def _load_store(self) -> Dict[str, Dict[str, Any]]:
+        """加载任务触发记录"""
+        if not self.store_file or not os.path.exists(self.store_file):
+            return {}
+        try:
+            return json_codec.load_file(self.store_file)
+        except (OSError, json.JSONDecodeError) as e:
+            debug_utils.log_and_print(f"⚠️ 任务记录加载失败，将重新开始: {e}", log_level="WARNING")
+            return {}
+
+    def _save_store(self) -> None:
+        """原子写入任务触发记录"""
+        if not self.store_file:
+            return
+        with self._cond:
+            for name, job in self.jobs.items():
+                self._store[name] = {
+                    "trigger": job.trigger.describe(),
+                    "next_run": job.next_run,
+                    "last_run": job.last_run,
+                }
+            data = dict(self._store)
+
+        try:
+            os.makedirs(os.path.dirname(self.store_file) or ".", exist_ok=True)
+            json_codec.dump_file(self.store_file, data)
+        except OSError as e:
+            debug_utils.log_and_print(f"⚠️ 任务记录保存失败: {e}", log_level="WARNING")
+
+    # ================ 状态 ================
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取引擎状态"""
+        with self._cond:
+            jobs = [job.to_status() for job in self.jobs.values()]
+            next_runs = [job.next_run for job in self.jobs.values() if job.next_run]
+        return {
+            "loop_running": self._loop_running,
+            "max_workers": self.max_workers,
+            "running_jobs": sum(job["running"] for job in jobs),
+            "next_run": datetime.datetime.fromtimestamp(min(next_runs)) if next_runs else None,
+            "misfire_grace_seconds": self.misfire_grace_seconds,
+            "jobs": jobs,
+        }
@@ -14,7 +14,6 @@
 
 import time
 import datetime
-import schedule
 import requests
 import json
 import os
@@ -23,8 +22,15 @@ from pathlib import Path
 
 from Module.Common.scripts.common import debug_utils
 from ..service_decorators import service_operation_safe, scheduler_operation_safe, external_api_safe, config_operation_safe
-from Module.Services.constants import ServiceNames, SchedulerTaskTypes, SchedulerConstKeys
+from Module.Services.constants import (
+    ServiceNames,
+    SchedulerTaskTypes,
+    SchedulerConstKeys,
+    SchedulerOverlapPolicies,
+    SchedulerMisfirePolicies,
+)
 from Module.Services.message_aggregation_service import MessagePriority
+from .job_engine import JobEngine, JobTrigger, WEEKDAY_NAMES
 
 class TaskUtils:
     """任务相关工具函数"""
@@ -70,12 +76,32 @@ class SchedulerService:
             app_controller: 应用控制器实例
         """
         self.app_controller = app_controller
-        self.scheduler = schedule
         self.tasks = {}  # 任务字典 {任务名: 任务对象}
         self.scheduled_functions = {}  # 已注册的定时任务函数
         self.event_listeners: Set[Callable] = set()  # 事件监听器
 
+        # 事件驱动的任务引擎，按配置中的任务名读取重叠/错过触发策略
+        scheduler_config = self._get_scheduler_config()
+        self.task_policies = {
+            task.get("name"): task for task in scheduler_config.get("tasks", []) if task.get("name")
+        }
+        store_file = None
+        if scheduler_config.get("persist_jobs", True) and app_controller:
+            store_file = os.path.join(app_controller.project_root_path, "cache", "scheduler_jobs.json")
+        self.engine = JobEngine(
+            max_workers=scheduler_config.get("max_workers", 4),
+            store_file=store_file,
+            misfire_grace_seconds=scheduler_config.get("misfire_grace_seconds", 60),
+            default_overlap_policy=scheduler_config.get("overlap_policy", SchedulerOverlapPolicies.SKIP),
+            default_misfire_policy=scheduler_config.get("misfire_policy", SchedulerMisfirePolicies.CATCH_UP),
+        )
 
+    def _get_scheduler_config(self) -> Dict[str, Any]:
+        """获取调度器配置"""
+        if not self.app_controller:
+            return {}
+        config_service = self.app_controller.get_service(ServiceNames.CONFIG)
+        return config_service.get("scheduler", {}) if config_service else {}
 
     def add_event_listener(self, listener: Callable):
         """添加事件监听器"""
@@ -91,6 +117,15 @@ class SchedulerService:
         for listener in self.event_listeners:
             listener(event)
 
+    def _register_job(self, task_name: str, trigger: JobTrigger, task_wrapper: Callable):
+        """把任务注册到引擎，策略取自同名任务配置"""
+        task_config = self.task_policies.get(task_name, {})
+        return self.engine.add_job(
+            task_name, trigger, task_wrapper,
+            overlap_policy=task_config.get("overlap_policy"),
+            misfire_policy=task_config.get("misfire_policy"),
+        )
+
     @scheduler_operation_safe("添加每日任务失败", return_value=False)
     def add_daily_task(self, task_name: str, time_str: str, task_func: Callable, *args, **kwargs) -> bool:
         """
@@ -111,7 +146,7 @@ class SchedulerService:
             return task_func(*args, **kwargs)
 
         # 添加任务
-        job = self.scheduler.every().day.at(time_str).do(task_wrapper)
+        job = self._register_job(task_name, JobTrigger.daily(time_str), task_wrapper)
         self.tasks[task_name] = job
         self.scheduled_functions[task_name] = {
             'function': task_func,
@@ -141,13 +176,11 @@ class SchedulerService:
         def task_wrapper():
             return task_func(*args, **kwargs)
 
-        # map day string to schedule method
-        schedule_day = getattr(self.scheduler.every(), day_of_week, None)
-        if not schedule_day:
+        if day_of_week.lower() not in WEEKDAY_NAMES:
             debug_utils.log_and_print(f"❌ 无效的星期: {day_of_week}", log_level="ERROR")
             return False
 
-        job = schedule_day.at(time_str).do(task_wrapper)
+        job = self._register_job(task_name, JobTrigger.weekly(day_of_week, time_str), task_wrapper)
         self.tasks[task_name] = job
         self.scheduled_functions[task_name] = {
             'function': task_func,
@@ -187,21 +220,16 @@ class SchedulerService:
             time_str = f"{hour:02d}:{start_offset_minutes:02d}"
             trigger_times.append(time_str)
 
-        # 为每个时间点创建每日任务
-        jobs = []
-        for time_str in trigger_times:
-            job = self.scheduler.every().day.at(time_str).do(task_wrapper).tag(task_name)
-            jobs.append(job)
-
-        # 存储第一个job作为代表（用于管理）
-        self.tasks[task_name] = jobs[0] if jobs else None
+        # 所有时间点合并为一个任务，便于统一管理重叠和错过触发
+        job = self._register_job(task_name, JobTrigger.daily(*trigger_times), task_wrapper)
+        self.tasks[task_name] = job
 
         self.scheduled_functions[task_name] = {
             'function': task_func,
             'interval_hours': interval_hours,
             'start_offset_minutes': start_offset_minutes,
             'trigger_times': trigger_times,
-            'jobs_count': len(jobs),
+            'jobs_count': len(trigger_times),
             'args': args,
             'kwargs': kwargs
         }
@@ -220,8 +248,7 @@ class SchedulerService:
             bool: 是否移除成功
         """
         if task_name in self.tasks:
-            # 使用tag删除所有相关任务（适用于interval任务的多个job）
-            self.scheduler.clear(tag=task_name)
+            self.engine.remove_job(task_name)
             del self.tasks[task_name]
             if task_name in self.scheduled_functions:
                 del self.scheduled_functions[task_name]
@@ -238,18 +265,14 @@ class SchedulerService:
         """
         task_list = []
         for name, job in self.tasks.items():
-            task_info = {
-                "name": name,
-                "next_run": job.next_run,
-                "last_run": getattr(job, 'last_run', None)
-            }
+            task_info = job.to_status()
 
             # 添加任务配置信息
             if name in self.scheduled_functions:
                 func_info = self.scheduled_functions[name]
                 task_info.update({
                     "time": func_info.get('time'),
-                    "interval": func_info.get('interval'),
+                    "interval": func_info.get('interval_hours'),
                     "function_name": func_info['function'].__name__
                 })
 
@@ -258,13 +281,21 @@ class SchedulerService:
         return task_list
 
     def run_pending(self) -> None:
-        """执行待处理的任务"""
-        self.scheduler.run_pending()
+        """派发已到期的任务（兼容轮询调用方式）"""
+        self.engine.run_due()
+
+    def run_forever(self) -> None:
+        """阻塞运行事件驱动的调度循环，按最近触发时间休眠"""
+        self.engine.run_forever()
+
+    def stop(self) -> None:
+        """停止调度循环"""
+        self.engine.stop()
 
     def clear_all_tasks(self) -> None:
         """清除所有任务"""
 
-        self.scheduler.clear()
+        self.engine.clear()
         self.tasks = {}
         self.scheduled_functions = {}
 
@@ -273,19 +304,22 @@ class SchedulerService:
         获取调度器服务状态
 
         Returns:
-            Dict[str, Any]: 服务状态信息
+            Dict[str, Any]: 服务状态信息，tasks中包含每个任务的延迟(lateness)和运行耗时(runtime)直方图
         """
+        engine_status = self.engine.get_status()
         return {
             "service_name": "scheduler",
             "status": "healthy",
             "task_count": len(self.tasks),
-            "pending_jobs": len([job for job in self.scheduler.jobs if job.should_run]),
-            "next_run": min([job.next_run for job in self.scheduler.jobs]) if self.scheduler.jobs else None,
+            "pending_jobs": engine_status["running_jobs"],
+            "next_run": engine_status["next_run"],
             "tasks": self.list_tasks(),
             "event_listeners": len(self.event_listeners),
             "details": {
-                "scheduler_active": True,
+                "scheduler_active": engine_status["loop_running"],
                 "total_tasks": len(self.tasks),
+                "max_workers": engine_status["max_workers"],
+                "misfire_grace_seconds": engine_status["misfire_grace_seconds"],
                 "scheduled_functions": list(self.scheduled_functions.keys())
             }
         }
@@ -11,6 +11,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from apps.settings import load_settings
+from apps.deps import get_clerk_auth_instance
 from apps.diet.api import build_diet_router
 from apps.keep.api import build_keep_router
 from apps.common.storage_api import build_storage_router
@@ -55,11 +56,13 @@ def create_app() -> FastAPI:
 
     @fastapi_app.get("/health")
     async def health():
+        clerk_auth = get_clerk_auth_instance(settings)
         return {
             "status": "ok",
             "service": "backend",
             "gemini_model": settings.gemini_model_name,
             "internal_auth_enabled": bool(settings.internal_token),
+            "clerk_auth": clerk_auth.get_metrics() if clerk_auth and clerk_auth.is_enabled() else None,
         }
 
     fastapi_app.include_router(build_diet_router(settings))
@@ -14,7 +14,7 @@ def build_dialogue_router(settings: BackendSettings) -> APIRouter:
     auth_dep = require_auth(settings)
 
     def get_service(user_id: str = Depends(get_current_user_id)) -> DialogueService:
-        return DialogueService(user_id)
+        return DialogueService.for_user(user_id)
 
     # ========== Dialogue APIs ==========
 
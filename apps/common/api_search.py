@@ -10,6 +10,7 @@ from fastapi import APIRouter, Depends
 from apps.deps import get_current_user_id, require_auth
 from apps.settings import BackendSettings
 from apps.common.dialogue_service import DialogueService
+from apps.common.responses import CodecJSONResponse
 from apps.common.search_services import (
     ProductSearchService,
     DishSearchService,
@@ -24,7 +25,7 @@ def build_search_router(settings: BackendSettings) -> APIRouter:
     
     # Define dependency specifically for this router's scope
     def get_dialogue_service(user_id: str = Depends(get_current_user_id)) -> DialogueService:
-        return DialogueService(user_id)
+        return DialogueService.for_user(user_id)
 
     router = APIRouter()
 
@@ -59,7 +60,7 @@ def build_search_router(settings: BackendSettings) -> APIRouter:
             except Exception:
                 dish_items = []
 
-            return product_items + dish_items
+            return CodecJSONResponse(product_items + dish_items)
         else:
             # Scenario: Search
             try:
@@ -75,7 +76,7 @@ def build_search_router(settings: BackendSettings) -> APIRouter:
                 dish_items = []
 
             # Combine
-            return product_items + dish_items
+            return CodecJSONResponse(product_items + dish_items)
 
     @router.get("/api/search/global", dependencies=[Depends(auth_dep)])
     async def search_global(
@@ -109,11 +110,11 @@ def build_search_router(settings: BackendSettings) -> APIRouter:
             except Exception:
                 cards = []
 
-            return {
+            return CodecJSONResponse({
                 "products": products,
                 "cards": cards,
                 "dialogues": [] # Usually no dialogues for empty state
-            }
+            })
 
         # Scenario: Typed Search
         try:
@@ -131,11 +132,11 @@ def build_search_router(settings: BackendSettings) -> APIRouter:
         except Exception:
             dialogues = []
 
-        return {
+        return CodecJSONResponse({
             "products": products,
             "cards": cards,
             "dialogues": dialogues
-        }
+        })
 
     @router.get("/api/search/recent_saved_card", dependencies=[Depends(auth_dep)])
     async def get_recent_saved_card(
@@ -148,6 +149,8 @@ def build_search_router(settings: BackendSettings) -> APIRouter:
         """
         card_service = CardSearchService(service)
         # Use empty query with saved_only=True to get recent saved
-        return card_service.search_history(query="", limit=limit, saved_only=True)
+        return CodecJSONResponse(
+            card_service.search_history(query="", limit=limit, saved_only=True)
+        )
 
     return router
@@ -1,27 +1,202 @@
 """对话服务，处理对话的增删改查"""
 
+import atexit
 import json
+import threading
 import uuid
 import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional
 from pathlib import Path
 
+from apps.common import search_index
 from apps.common.models.dialogue import Dialogue, ResultCard, DialogueMessage
+from libs.utils import json_codec
 
 # 配置
 USER_DATA_DIR = Path("user_data")
+# 索引文件延迟落盘的时间窗口（秒），窗口内的多次修改合并为一次写入
+INDEX_FLUSH_DELAY = 1.0
+# 每个用户在内存中保留的最近对话数
+DIALOGUE_CACHE_SIZE = 32
+# 消息日志中 replace 记录超过消息数这么多条时压缩
+MESSAGE_LOG_COMPACT_SLACK = 50
+# 超过这么多张卡片时并行读取卡片文件
+CARD_LOAD_PARALLEL_THRESHOLD = 8
+_card_loader = ThreadPoolExecutor(max_workers=8, thread_name_prefix="card_loader")
 logger = logging.getLogger("dialogue_service")
 
 
+class _IndexFile:
+    """
+    One index.json kept in memory as {id: entry} (least recently updated first).
+    Writes are debounced by the owning DialogueService; the search index is
+    notified with the coalesced changes once the file is actually written.
+
+    group_by names an entry field to keep a secondary {value: {id: None}}
+    map on; an index file whose entries lack that field is rebuilt.
+    """
+
+    def __init__(
+        self,
+        user_id: str,
+        path: Path,
+        source: str,
+        rebuild: Callable[[], List[Dict[str, Any]]],
+        group_by: Optional[str] = None,
+    ):
+        self.user_id = user_id
+        self.path = path
+        self.source = source
+        self._rebuild = rebuild
+        self.group_by = group_by
+
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.groups: Dict[Any, Dict[str, None]] = {}
+        self.signature = None
+        self.dirty = False
+        self._pending_rows: Dict[str, Dict[str, Any]] = {}
+        self._pending_removed = set()
+
+    def _current_signature(self):
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def load(self):
+        entries = None
+        if self.path.exists():
+            try:
+                entries = json_codec.loads(self.path.read_text(encoding="utf-8"))
+            except Exception as e:
+                logger.error("Failed to load index %s: %s", self.path, e)
+
+        if entries is not None and self.group_by and any(
+            self.group_by not in e for e in entries
+        ):
+            logger.info("Index %s lacks %s, rebuilding", self.path, self.group_by)
+            entries = None
+
+        if entries is None:
+            self._set_entries(self._rebuild())
+            self.dirty = True
+            self.flush(notify=False)
+        else:
+            self._set_entries(entries)
+            self.signature = self._current_signature()
+
+    def _set_entries(self, entries: List[Dict[str, Any]]):
+        self.entries = {}
+        self.groups = {}
+        for entry in entries:
+            self.entries[entry["id"]] = entry
+            self._group_add(entry)
+
+    def _group_add(self, entry: Dict[str, Any]):
+        if self.group_by:
+            self.groups.setdefault(entry.get(self.group_by), {})[entry["id"]] = None
+
+    def _group_discard(self, entry: Dict[str, Any]):
+        if self.group_by:
+            members = self.groups.get(entry.get(self.group_by))
+            if members is not None:
+                members.pop(entry["id"], None)
+                if not members:
+                    del self.groups[entry.get(self.group_by)]
+
+    def group(self, value: Any) -> List[str]:
+        """Ids of the entries whose group_by field equals value."""
+        return list(self.groups.get(value, ()))
+
+    def ensure_fresh(self):
+        """Reload if index.json was changed by someone else (and we have nothing unsaved)."""
+        if not self.dirty and self.signature != self._current_signature():
+            logger.info("Index %s changed on disk, reloading", self.path)
+            self.load()
+
+    def put(self, entry: Dict[str, Any]):
+        entry_id = entry["id"]
+        previous = self.entries.pop(entry_id, None)
+        if previous is not None:
+            self._group_discard(previous)
+        self.entries[entry_id] = entry
+        self._group_add(entry)
+        self._pending_removed.discard(entry_id)
+        self._pending_rows.pop(entry_id, None)
+        self._pending_rows[entry_id] = entry
+        self.dirty = True
+
+    def remove(self, entry_id: str):
+        previous = self.entries.pop(entry_id, None)
+        if previous is None:
+            return
+        self._group_discard(previous)
+        self._pending_rows.pop(entry_id, None)
+        self._pending_removed.add(entry_id)
+        self.dirty = True
+
+    def flush(self, notify: bool = True):
+        if not self.dirty:
+            return
+        try:
+            self.path.write_text(
+                json_codec.dumps(list(self.entries.values())),
+                encoding="utf-8",
+            )
+        except Exception as e:
+            logger.error("Failed to save index %s: %s", self.path, e)
+            return
+        self.signature = self._current_signature()
+        self.dirty = False
+
+        rows = list(self._pending_rows.values())
+        removed = list(self._pending_removed)
+        self._pending_rows = {}
+        self._pending_removed = set()
+        if notify and (rows or removed):
+            search_index.on_source_written(
+                self.user_id, self.source, rows=rows, removed_ids=removed
+            )
+
+
 class DialogueService:
     """
     Handle persistence for Dialogues and ResultCards.
-    Stored as individual JSON files in:
-    - user_data/{user_id}/dialogues/{dialogue_id}.json
+    Stored as individual files in:
+    - user_data/{user_id}/dialogues/{dialogue_id}.json (header)
+    - user_data/{user_id}/dialogues/{dialogue_id}.messages.jsonl (message log)
     - user_data/{user_id}/cards/{card_id}.json
+
+    One long-lived instance per user (see DialogueService.for_user); the
+    dialogue/card indexes stay in memory and are persisted with a short delay.
     """
 
+    _instances: Dict[str, "DialogueService"] = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def for_user(cls, user_id: str) -> "DialogueService":
+        """Get the shared service of a user (created on first use)."""
+        with cls._instances_lock:
+            service = cls._instances.get(user_id)
+            if service is None:
+                service = cls(user_id)
+                cls._instances[user_id] = service
+        service.refresh_indexes()
+        return service
+
+    @classmethod
+    def flush_all(cls):
+        """Persist pending index changes of every shared service (e.g. on shutdown)."""
+        with cls._instances_lock:
+            services = list(cls._instances.values())
+        for service in services:
+            service.flush_indexes()
+
     def __init__(self, user_id: str):
         self.user_id = user_id
         self.dialogue_dir = USER_DATA_DIR / user_id / "dialogues"
@@ -29,38 +204,70 @@ class DialogueService:
         self.dialogue_index_path = self.dialogue_dir / "index.json"
         self.card_index_path = self.card_dir / "index.json"
 
-        self.dialogue_index = []
-        self.card_index = []
+        self._lock = threading.RLock()
+        self._flush_timer: Optional[threading.Timer] = None
+        # dialogue_id -> {"dialogue", "log_records", "sig"}, least recently used first
+        self._dialogue_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._dialogue_index = _IndexFile(
+            user_id, self.dialogue_index_path, search_index.DIALOGUES, self._rebuild_index
+        )
+        self._card_index = _IndexFile(
+            user_id,
+            self.card_index_path,
+            search_index.CARDS,
+            self._rebuild_card_index,
+            group_by="dialogue_id",
+        )
 
         self._ensure_dirs()
-        self._load_index()
-        self._load_card_index()
+        self._dialogue_index.load()
+        self._card_index.load()
+
+    @property
+    def dialogue_index(self) -> Dict[str, Dict[str, Any]]:
+        return self._dialogue_index.entries
+
+    @property
+    def card_index(self) -> Dict[str, Dict[str, Any]]:
+        return self._card_index.entries
 
     def _ensure_dirs(self):
         self.dialogue_dir.mkdir(parents=True, exist_ok=True)
         self.card_dir.mkdir(parents=True, exist_ok=True)
 
-    def _load_index(self):
-        if self.dialogue_index_path.exists():
-            try:
-                self.dialogue_index = json.loads(
-                    self.dialogue_index_path.read_text(encoding="utf-8")
-                )
-            except Exception as e:
-                logger.error("Failed to load dialogue index: %s", e)
-                self._rebuild_index()
-        else:
-            self._rebuild_index()
-
-    def _rebuild_index(self):
-        self.dialogue_index = []
+    # ========== Index Persistence ==========
+
+    def refresh_indexes(self):
+        """mtime guard: pick up index files edited outside this process."""
+        with self._lock:
+            self._dialogue_index.ensure_fresh()
+            self._card_index.ensure_fresh()
+
+    def flush_indexes(self):
+        """Write pending index changes now."""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            self._dialogue_index.flush()
+            self._card_index.flush()
+
+    def _schedule_flush(self):
+        with self._lock:
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(INDEX_FLUSH_DELAY, self.flush_indexes)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def _rebuild_index(self) -> List[Dict[str, Any]]:
+        entries = []
         files = list(self.dialogue_dir.glob("*.json"))
         for f in files:
             if f.name == "index.json":
                 continue
             try:
-                data = json.loads(f.read_text(encoding="utf-8"))
-                self.dialogue_index.append(
+                data = json_codec.loads(f.read_text(encoding="utf-8"))
+                entries.append(
                     {
                         "id": data["id"],
                         "updated_at": data.get("updated_at", data["created_at"]),
@@ -69,32 +276,22 @@ class DialogueService:
                 )
             except Exception:
                 pass
-        self._save_index()
-
-    def _save_index(self):
-        try:
-            self.dialogue_index_path.write_text(
-                json.dumps(self.dialogue_index, ensure_ascii=False), encoding="utf-8"
-            )
-        except Exception as e:
-            logger.error("Failed to save index: %s", e)
+        return entries
 
     def _update_index(self, dialogue: Dialogue):
-        # Remove existing if any
-        self.dialogue_index = [d for d in self.dialogue_index if d["id"] != dialogue.id]
-        # Add new
-        self.dialogue_index.append(
-            {
-                "id": dialogue.id,
-                "updated_at": dialogue.updated_at.isoformat(),
-                "title": dialogue.title,
-            }
-        )
-        self._save_index()
+        entry = {
+            "id": dialogue.id,
+            "updated_at": dialogue.updated_at.isoformat(),
+            "title": dialogue.title,
+        }
+        with self._lock:
+            self._dialogue_index.put(entry)
+            self._schedule_flush()
 
     def _remove_from_index(self, dialogue_id: str):
-        self.dialogue_index = [d for d in self.dialogue_index if d["id"] != dialogue_id]
-        self._save_index()
+        with self._lock:
+            self._dialogue_index.remove(dialogue_id)
+            self._schedule_flush()
 
     def _generate_id(self, prefix: str) -> str:
         date_str = datetime.now().strftime("%Y%m%d")
@@ -103,18 +300,6 @@ class DialogueService:
 
     # ========== Card Indexing ==========
 
-    def _load_card_index(self):
-        if self.card_index_path.exists():
-            try:
-                self.card_index = json.loads(
-                    self.card_index_path.read_text(encoding="utf-8")
-                )
-            except Exception as e:
-                logger.error("Failed to load card index: %s", e)
-                self._rebuild_card_index()
-        else:
-            self._rebuild_card_index()
-
     def _extract_card_search_info(self, data: dict) -> dict:
         def _normalize_dt(val):
             if isinstance(val, datetime):
@@ -166,55 +351,59 @@ class DialogueService:
 
         return info
 
-    def _rebuild_card_index(self):
-        self.card_index = []
+    def _rebuild_card_index(self) -> List[Dict[str, Any]]:
+        entries = []
         files = list(self.card_dir.glob("*.json"))
         for f in files:
             if f.name == "index.json":
                 continue
             try:
-                data = json.loads(f.read_text(encoding="utf-8"))
+                data = json_codec.loads(f.read_text(encoding="utf-8"))
                 search_info = self._extract_card_search_info(data)
 
+                status = data.get("status", "draft")
+                updated_at = data.get("updated_at", data.get("created_at"))
                 entry = {
                     "id": data["id"],
-                    "updated_at": data.get("updated_at", data.get("created_at")),
-                    "status": data.get("status", "draft"),
+                    "dialogue_id": data.get("dialogue_id"),
+                    "updated_at": updated_at,
+                    "status": status,
+                    # Best effort for existing cards: last update of a saved card
+                    "saved_at": updated_at if status == "saved" else None,
                     **search_info,
                 }
-                self.card_index.append(entry)
+                entries.append(entry)
             except Exception:
                 pass
-        self._save_card_index()
-
-    def _save_card_index(self):
-        try:
-            self.card_index_path.write_text(
-                json.dumps(self.card_index, ensure_ascii=False), encoding="utf-8"
-            )
-        except Exception as e:
-            logger.error("Failed to save card index: %s", e)
+        return entries
 
     def _update_card_index(self, card: ResultCard):
-        self.card_index = [c for c in self.card_index if c["id"] != card.id]
-
         # Convert model to dict to reuse extraction logic
         card_data = card.model_dump()
         search_info = self._extract_card_search_info(card_data)
 
-        self.card_index.append(
-            {
+        with self._lock:
+            previous = self._card_index.entries.get(card.id) or {}
+            saved_at = None
+            if card.status == "saved":
+                # Keep the first save time across later edits of a saved card
+                saved_at = previous.get("saved_at") or card.updated_at.isoformat()
+
+            entry = {
                 "id": card.id,
+                "dialogue_id": card.dialogue_id,
                 "updated_at": card.updated_at.isoformat(),
                 "status": card.status,
+                "saved_at": saved_at,
                 **search_info,
             }
-        )
-        self._save_card_index()
+            self._card_index.put(entry)
+            self._schedule_flush()
 
     def _remove_from_card_index(self, card_id: str):
-        self.card_index = [c for c in self.card_index if c["id"] != card_id]
-        self._save_card_index()
+        with self._lock:
+            self._card_index.remove(card_id)
+            self._schedule_flush()
 
     # region 对话
     # ========== Dialogue Operations ==========
@@ -224,10 +413,12 @@ class DialogueService:
         List user dialogues, sorted by updated_at desc using index.
         """
         try:
+            # Copy under the lock: the instance is shared by concurrent requests
+            with self._lock:
+                entries = list(self._dialogue_index.entries.values())
+
             # Sort by updated_at desc
-            sorted_index = sorted(
-                self.dialogue_index, key=lambda x: x["updated_at"], reverse=True
-            )
+            sorted_index = sorted(entries, key=lambda x: x["updated_at"], reverse=True)
             target_entries = sorted_index[offset : offset + limit]
 
             dialogues = []
@@ -236,7 +427,11 @@ class DialogueService:
                 if d:
                     # Update title if index is stale (optional, but good for consistency)
                     if d.title != entry.get("title"):
-                        entry["title"] = d.title
+                        with self._lock:
+                            current = self._dialogue_index.entries.get(entry["id"])
+                            if current is not None:
+                                self._dialogue_index.put({**current, "title": d.title})
+                                self._schedule_flush()
                     dialogues.append(d)
 
             return dialogues
@@ -246,15 +441,10 @@ class DialogueService:
 
     def get_dialogue(self, dialogue_id: str) -> Optional[Dialogue]:
         """根据ID获取对话详情"""
-        path = self.dialogue_dir / f"{dialogue_id}.json"
-        if not path.exists():
-            return None
-        try:
-            data = json.loads(path.read_text(encoding="utf-8"))
-            return Dialogue(**data)
-        except Exception as e:
-            logger.error("Failed to read dialogue %s: %s", dialogue_id, e)
-            return None
+        with self._lock:
+            dialogue = self._load_dialogue(dialogue_id)
+            # 返回副本，调用方修改后需经 update_dialogue 等方法落盘
+            return self._detached(dialogue) if dialogue else None
 
     def create_dialogue(self, title: str) -> Dialogue:
         """创建一个新的对话"""
@@ -280,9 +470,12 @@ class DialogueService:
 
     def delete_dialogue(self, dialogue_id: str) -> bool:
         """删除指定的对话"""
-        path = self.dialogue_dir / f"{dialogue_id}.json"
+        path = self._header_path(dialogue_id)
         if path.exists():
-            path.unlink()
+            with self._lock:
+                self._dialogue_cache.pop(dialogue_id, None)
+                path.unlink()
+                self._log_path(dialogue_id).unlink(missing_ok=True)
             self._remove_from_index(dialogue_id)
             return True
         return False
@@ -290,44 +483,193 @@ class DialogueService:
     def append_message(
         self, dialogue_id: str, message: DialogueMessage
     ) -> Optional[Dialogue]:
-        """向指定对话追加一条消息"""
-        dialogue = self.get_dialogue(dialogue_id)
-        if not dialogue:
-            return None
-
-        # pylint: disable=no-member
-        dialogue.messages.append(message)
-        dialogue.updated_at = datetime.now()
-        self._save_dialogue(dialogue)
-        return dialogue
+        """向指定对话追加一条消息（只追加一行消息日志）"""
+        with self._lock:
+            dialogue = self._load_dialogue(dialogue_id)
+            if not dialogue:
+                return None
+
+            # pylint: disable=no-member
+            dialogue.messages.append(message)
+            dialogue.updated_at = datetime.now()
+            self._append_message_records(dialogue, [{"op": "add", "message": message}])
+            return self._detached(dialogue)
 
     def update_message(
         self, dialogue_id: str, message: DialogueMessage
     ) -> Optional[Dialogue]:
-        """更新指定对话中的某条消息"""
-        dialogue = self.get_dialogue(dialogue_id)
-        if not dialogue:
+        """更新指定对话中的某条消息（追加一条 replace 记录）"""
+        with self._lock:
+            dialogue = self._load_dialogue(dialogue_id)
+            if not dialogue:
+                return None
+
+            # Find and replace
+            found = False
+            for i, m in enumerate(dialogue.messages):
+                if m.id == message.id:
+                    # pylint: disable=unsupported-assignment-operation
+                    dialogue.messages[i] = message
+                    found = True
+                    break
+
+            if not found:
+                return None  # Or raise error
+
+            dialogue.updated_at = datetime.now()
+            self._append_message_records(
+                dialogue, [{"op": "replace", "message": message}]
+            )
+            return self._detached(dialogue)
+
+    # ========== Dialogue Storage ==========
+    # {id}.json           头文件：除 messages 外的全部字段 + message_count
+    # {id}.messages.jsonl 消息日志：{"op": "add"|"replace", "message": {...}}
+    # 旧格式（messages 内联在 {id}.json 中）在首次读取时透明迁移。
+
+    @staticmethod
+    def _detached(dialogue: Dialogue) -> Dialogue:
+        """
+        Copy whose lists can be changed without touching the cached dialogue.
+        Messages themselves are shared: they are only ever replaced, never mutated.
+        """
+        return dialogue.model_copy(
+            update={"messages": list(dialogue.messages), "card_ids": list(dialogue.card_ids)}
+        )
+
+    def _header_path(self, dialogue_id: str) -> Path:
+        return self.dialogue_dir / f"{dialogue_id}.json"
+
+    def _log_path(self, dialogue_id: str) -> Path:
+        return self.dialogue_dir / f"{dialogue_id}.messages.jsonl"
+
+    @staticmethod
+    def _file_signature(path: Path):
+        try:
+            st = path.stat()
+        except FileNotFoundError:
             return None
+        return (st.st_size, st.st_mtime_ns)
 
-        # Find and replace
-        found = False
-        for i, m in enumerate(dialogue.messages):
-            if m.id == message.id:
-                # pylint: disable=unsupported-assignment-operation
-                dialogue.messages[i] = message
-                found = True
-                break
+    def _dialogue_signature(self, dialogue_id: str):
+        return (
+            self._file_signature(self._header_path(dialogue_id)),
+            self._file_signature(self._log_path(dialogue_id)),
+        )
 
-        if not found:
-            return None  # Or raise error
+    def _load_dialogue(self, dialogue_id: str) -> Optional[Dialogue]:
+        """读取对话（优先内存缓存，文件被外部修改时重新加载）"""
+        cached = self._dialogue_cache.get(dialogue_id)
+        signature = self._dialogue_signature(dialogue_id)
+        if cached and cached["sig"] == signature:
+            self._dialogue_cache.move_to_end(dialogue_id)
+            return cached["dialogue"]
 
-        dialogue.updated_at = datetime.now()
-        self._save_dialogue(dialogue)
+        if signature[0] is None:
+            self._dialogue_cache.pop(dialogue_id, None)
+            return None
+
+        try:
+            data = json_codec.loads(self._header_path(dialogue_id).read_text(encoding="utf-8"))
+            if "messages" in data:
+                # 旧格式：迁移为 头文件 + 消息日志
+                dialogue = Dialogue(**data)
+                self._cache_dialogue(dialogue, log_records=0)
+                self._compact_messages(dialogue)
+                return dialogue
+
+            messages, log_records = self._read_message_log(dialogue_id)
+            dialogue = Dialogue(**data, messages=messages)
+        except Exception as e:
+            logger.error("Failed to read dialogue %s: %s", dialogue_id, e)
+            return None
+
+        self._cache_dialogue(dialogue, log_records)
         return dialogue
 
+    def _read_message_log(self, dialogue_id: str):
+        messages: Dict[str, DialogueMessage] = {}
+        log_records = 0
+        path = self._log_path(dialogue_id)
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json_codec.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn tail write
+                    message = DialogueMessage(**record["message"])
+                    if record.get("op") == "replace" and message.id not in messages:
+                        continue
+                    messages[message.id] = message  # replace keeps position
+                    log_records += 1
+        return list(messages.values()), log_records
+
+    def _cache_dialogue(self, dialogue: Dialogue, log_records: int):
+        self._dialogue_cache[dialogue.id] = {
+            "dialogue": dialogue,
+            "log_records": log_records,
+            "sig": self._dialogue_signature(dialogue.id),
+        }
+        self._dialogue_cache.move_to_end(dialogue.id)
+        while len(self._dialogue_cache) > DIALOGUE_CACHE_SIZE:
+            self._dialogue_cache.popitem(last=False)
+
+    def _write_header(self, dialogue: Dialogue):
+        header = dialogue.model_dump(mode="json", exclude={"messages"})
+        header["message_count"] = len(dialogue.messages)
+        path = self._header_path(dialogue.id)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(json_codec.dumps(header), encoding="utf-8")
+        tmp_path.replace(path)
+
+    def _compact_messages(self, dialogue: Dialogue):
+        """按当前消息列表重写消息日志（每条消息一条 add 记录）"""
+        path = self._log_path(dialogue.id)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for message in dialogue.messages:
+                f.write(self._log_line({"op": "add", "message": message}))
+        tmp_path.replace(path)
+        self._write_header(dialogue)
+        self._cache_dialogue(dialogue, log_records=len(dialogue.messages))
+
+    @staticmethod
+    def _log_line(record: Dict[str, Any]) -> str:
+        record = {"op": record["op"], "message": record["message"].model_dump(mode="json")}
+        return json_codec.dumps(record) + "\n"
+
+    def _append_message_records(self, dialogue: Dialogue, records: List[Dict[str, Any]]):
+        """追加消息日志并更新头文件；replace 记录过多时压缩"""
+        cached = self._dialogue_cache[dialogue.id]
+        with open(self._log_path(dialogue.id), "a", encoding="utf-8") as f:
+            f.write("".join(self._log_line(r) for r in records))
+        self._write_header(dialogue)
+        self._cache_dialogue(dialogue, cached["log_records"] + len(records))
+
+        if self._dialogue_cache[dialogue.id]["log_records"] > (
+            len(dialogue.messages) + MESSAGE_LOG_COMPACT_SLACK
+        ):
+            self._compact_messages(dialogue)
+        self._update_index(dialogue)
+
     def _save_dialogue(self, dialogue: Dialogue):
-        path = self.dialogue_dir / f"{dialogue.id}.json"
-        path.write_text(dialogue.model_dump_json(indent=2), encoding="utf-8")
+        """保存对话：写头文件；消息列表与已存储的不一致时重写消息日志"""
+        # 缓存保存副本，调用方之后对 dialogue 的修改不会绕过落盘
+        dialogue = self._detached(dialogue)
+        with self._lock:
+            stored = self._load_dialogue(dialogue.id)
+            if stored is None or stored.messages != dialogue.messages:
+                self._compact_messages(dialogue)
+            else:
+                # 头文件变更（标题、card_ids 等），消息日志保持不变
+                self._write_header(dialogue)
+                self._cache_dialogue(
+                    dialogue, self._dialogue_cache[dialogue.id]["log_records"]
+                )
         self._update_index(dialogue)
 
     # endregion
@@ -336,22 +678,22 @@ class DialogueService:
     # ========== ResultCard Operations ==========
 
     def list_cards(self, dialogue_id: str = None) -> List[ResultCard]:
-        """列出分析结果卡片，支持按对话ID筛选"""
-        cards = []
+        """列出分析结果卡片，支持按对话ID筛选（经由卡片索引，只读取匹配的卡片文件）"""
         try:
-            files = list(self.card_dir.glob("*.json"))
-            for f in files:
-                if f.name == "index.json":
-                    continue
-                try:
-                    data = json.loads(f.read_text(encoding="utf-8"))
-                    card = ResultCard(**data)
-                    if dialogue_id and card.dialogue_id != dialogue_id:
-                        continue
-                    cards.append(card)
-                except Exception as e:
-                    logger.warning("Failed to load card %s: %s", f, e)
-
+            with self._lock:
+                if dialogue_id:
+                    card_ids = self._card_index.group(dialogue_id)
+                else:
+                    card_ids = list(self._card_index.entries)
+
+            if len(card_ids) > CARD_LOAD_PARALLEL_THRESHOLD:
+                loaded = list(_card_loader.map(self.get_card, card_ids))
+            else:
+                loaded = [self.get_card(card_id) for card_id in card_ids]
+
+            cards = [c for c in loaded if c is not None]
+            if dialogue_id:
+                cards = [c for c in cards if c.dialogue_id == dialogue_id]
             cards.sort(key=lambda x: x.updated_at or x.created_at, reverse=True)
             return cards
         except Exception as e:
@@ -363,7 +705,7 @@ class DialogueService:
         if not path.exists():
             return None
         try:
-            data = json.loads(path.read_text(encoding="utf-8"))
+            data = json_codec.loads(path.read_text(encoding="utf-8"))
             return ResultCard(**data)
         except Exception as e:
             logger.error("Failed to read card %s: %s", card_id, e)
@@ -380,7 +722,7 @@ class DialogueService:
 
         card.updated_at = datetime.now()
         path = self.card_dir / f"{card.id}.json"
-        path.write_text(card.model_dump_json(indent=2), encoding="utf-8")
+        path.write_text(card.model_dump_json(), encoding="utf-8")
         self._update_card_index(card)
         return card
 
@@ -394,3 +736,7 @@ class DialogueService:
 
 
     # endregion
+
+
+# 进程退出前写入尚未落盘的索引修改
+atexit.register(DialogueService.flush_all)
@@ -1,12 +1,24 @@
 """记录服务，处理 Keep 和饮食记录的增删改查"""
+import base64
 import hashlib
+import json
+import os
+import re
 from datetime import datetime, timedelta, date
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
+from apps.common import search_index
+from apps.diet import daily_rollup, dish_aggregates, product_store
 from libs.storage_lib import global_storage
 from libs.utils.text_utils.pinyin_util import extract_phonetics
 
 
+_LEDGER_FILE_RE = re.compile(r"^ledger_(\d{4}-\d{2}-\d{2})\.jsonl$")
+_KEEP_FILE_RE = re.compile(r"^(scale|sleep|dimensions)_(\d{4})_(\d{2})\.jsonl$")
+
+HistoryKey = Tuple[datetime, str]
+
+
 class RecordService:
     """记录服务，处理 Keep 和饮食记录的增删改查"""
     @staticmethod
@@ -163,81 +175,19 @@ class RecordService:
         else:
             # 追加模式
             global_storage.append(user_id, "diet", filename, new_record)
+            existing.append(new_record)
             status_msg = "appended"
 
+        # 同步当日营养汇总 (existing 此时即为该日完整流水，正序)
+        daily_rollup.on_ledger_written(user_id, date_str, existing)
+
         # 4. 保存标签库 (Knowledge Base) - Upsert (按 Brand+Name+Variant 去重)
+        # 追加到变更日志，由 ProductStore 维护规范视图并定期压缩
         if captured_labels:
-            lib_file = "product_library.jsonl"
-            # 读取现有库 (limit=2000, 假设长期积累需考虑性能优化，目前全读覆盖)
-            # read_dataset returns [Newest, ..., Oldest]
-            existing_lib = global_storage.read_dataset(
-                user_id, "diet", lib_file, limit=2000
+            product_store.get_store(user_id).upsert(captured_labels, now)
+            search_index.on_source_written(
+                user_id, search_index.PRODUCTS, rows=captured_labels
             )
-            existing_lib = list(reversed(existing_lib))  # -> [Oldest, ..., Newest]
-
-            new_keys = set()
-            for l in captured_labels:
-                # Key: (Brand, Product Name, Variant)
-                k = (
-                    str(l.get("brand", "")).strip(),
-                    str(l.get("product_name", "")).strip(),
-                    str(l.get("variant", "")).strip(),
-                )
-                if k != ("", "", ""):  # Ignore empty keys
-                    new_keys.add(k)
-
-            final_lib = []
-
-            # 4.1 Index existing items by Key for attribute preservation
-            existing_map = {}
-            for old in existing_lib:
-                k_old = (
-                    str(old.get("brand", "")).strip(),
-                    str(old.get("product_name", "")).strip(),
-                    str(old.get("variant", "")).strip(),
-                )
-                if k_old not in existing_map:
-                    existing_map[k_old] = old
-
-            final_lib = []
-
-            # 4.2 Filter out old items that are being updated (Upsert Logic)
-            for old in existing_lib:
-                k_old = (
-                    str(old.get("brand", "")).strip(),
-                    str(old.get("product_name", "")).strip(),
-                    str(old.get("variant", "")).strip(),
-                )
-                if k_old not in new_keys:
-                    final_lib.append(old)
-
-            # 4.3 Add new items, preserving created_at
-            for label in captured_labels:
-                k = (
-                    str(label.get("brand", "")).strip(),
-                    str(label.get("product_name", "")).strip(),
-                    str(label.get("variant", "")).strip(),
-                )
-                
-                # Pinyin
-                p_name = label.get("product_name", "")
-                if p_name:
-                     phonetics = extract_phonetics(p_name)
-                     label["pinyin_initials"] = phonetics.get("pinyin_initials", [])
-                
-                # Time Handling
-                label["updated_at"] = now.isoformat()
-                
-                # Preserve created_at from existing record if available
-                if k in existing_map and existing_map[k].get("created_at"):
-                    label["created_at"] = existing_map[k]["created_at"]
-                elif "created_at" not in label:
-                    label["created_at"] = now.isoformat()
-            
-            final_lib.extend(captured_labels)
-
-            # 覆写文件
-            global_storage.write_dataset(user_id, "diet", lib_file, final_lib)
 
         # 5. 保存菜式库 (Personal Dish Library) - For UI Quick Add, not for LLM Context
         # Automatically calculate per-100g normalization
@@ -321,6 +271,8 @@ class RecordService:
             }
 
             global_storage.append(user_id, "diet", filename, entry)
+            search_index.on_source_written(user_id, search_index.DISHES, rows=[entry])
+            dish_aggregates.on_dish_archived(user_id)
 
     @staticmethod
     def get_todays_unified_records(user_id: str) -> List[Dict[str, Any]]:
@@ -393,22 +345,120 @@ class RecordService:
         user_id: str, limit: int = 20
     ) -> List[Dict[str, Any]]:
         """
-        获取最近的记录流水（饮食+Keep），逻辑基于 get_unified_records_range
+        获取最近的记录流水（饮食+Keep），即分页历史的第一页 (Oldest->Newest)
         """
-        now = datetime.now()
-        start_date = (now - timedelta(days=7)).strftime("%Y-%m-%d")
-        end_date = now.strftime("%Y-%m-%d")
+        records, _ = RecordService.get_unified_records_page(user_id, limit=limit)
+        return records
 
-        # Get unified history
-        full_history = RecordService.get_unified_records_range(
-            user_id, start_date, end_date
-        )
+    # region 历史分页 (Keyset Pagination)
 
-        # Returns Oldest->Newest, so we slice the tail to get most recent
-        if not full_history:
-            return []
+    @staticmethod
+    def _history_key(rec: Dict[str, Any]) -> Optional[HistoryKey]:
+        """分页排序键: (occurred_at 去时区, record_id)"""
+        t_str = rec.get("occurred_at")
+        if not t_str:
+            return None
+        dt = datetime.fromisoformat(t_str)
+        if dt.tzinfo is not None:
+            dt = dt.replace(tzinfo=None)
+        return dt, str(rec.get("record_id") or "")
+
+    @staticmethod
+    def encode_history_cursor(key: HistoryKey) -> str:
+        """把分页键编码为不透明游标"""
+        raw = json.dumps([key[0].isoformat(), key[1]], ensure_ascii=False)
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def decode_history_cursor(cursor: str) -> HistoryKey:
+        """解析游标，格式非法时抛出 ValueError"""
+        try:
+            occurred, record_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            return datetime.fromisoformat(occurred), str(record_id)
+        except (TypeError, ValueError, UnicodeError) as e:
+            raise ValueError(f"invalid history cursor: {cursor}") from e
+
+    @staticmethod
+    def get_unified_records_page(
+        user_id: str, limit: int = 20, cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        按 (occurred_at, record_id) 键集分页获取综合流水（饮食 + Keep）。
+        从游标位置（默认今日结束）按日倒序遍历 ledger 文件与 Keep 月文件，
+        凑满 limit 条所在的那一天即停止，不再读取更早的文件。
+
+        :return: (本页记录 [Oldest->Newest], 更早一页的游标；没有更多时为 None)
+        """
+        if cursor:
+            upper = RecordService.decode_history_cursor(cursor)
+        else:
+            today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            upper = (today + timedelta(days=1), "")
+        upper_day = upper[0].strftime("%Y-%m-%d")
+        upper_month = upper_day[:7]
+
+        # 1. 列出现有文件（仅文件名，不读内容）
+        diet_dir = global_storage.base_dir / user_id / "diet"
+        keep_dir = global_storage.base_dir / user_id / "keep"
+
+        ledger_days: Dict[str, List[str]] = {}  # month -> days
+        for name in os.listdir(diet_dir) if diet_dir.is_dir() else []:
+            m = _LEDGER_FILE_RE.match(name)
+            if m and m.group(1) <= upper_day:
+                ledger_days.setdefault(m.group(1)[:7], []).append(m.group(1))
+
+        keep_files: Dict[str, List[str]] = {}  # month -> filenames
+        for name in os.listdir(keep_dir) if keep_dir.is_dir() else []:
+            m = _KEEP_FILE_RE.match(name)
+            if m and f"{m.group(2)}-{m.group(3)}" <= upper_month:
+                keep_files.setdefault(f"{m.group(2)}-{m.group(3)}", []).append(name)
+
+        months = sorted(set(ledger_days) | set(keep_files), reverse=True)
+
+        # 2. 按月、按日倒序收集，直到凑满 limit（ledger 走到该日才读取）
+        collected: List[Tuple[HistoryKey, Dict[str, Any]]] = []
+        exhausted = True
+        for mi, month in enumerate(months):
+            # Keep 月文件整月一份，先读一次按日分桶
+            keep_by_day: Dict[str, List[Tuple[HistoryKey, Dict[str, Any]]]] = {}
+            for fname in keep_files.get(month, []):
+                for r in global_storage.read_dataset(user_id, "keep", fname, limit=500):
+                    key = RecordService._history_key(r)
+                    if key and key < upper:
+                        keep_by_day.setdefault(key[0].strftime("%Y-%m-%d"), []).append((key, r))
+
+            month_ledger_days = set(ledger_days.get(month, []))
+            days = sorted(month_ledger_days | set(keep_by_day), reverse=True)
+            for di, day_str in enumerate(days):
+                day_entries = keep_by_day.get(day_str, [])
+                if day_str in month_ledger_days:
+                    day_recs = global_storage.read_dataset(
+                        user_id, "diet", f"ledger_{day_str}.jsonl", limit=9999
+                    )
+                    for r in day_recs:
+                        r["_source_date"] = day_str
+                        key = RecordService._history_key(r)
+                        if key and key < upper:
+                            day_entries.append((key, r))
+
+                collected.extend(sorted(day_entries, key=lambda x: x[0], reverse=True))
+                if len(collected) >= limit:
+                    exhausted = len(collected) == limit and di == len(days) - 1 and (
+                        mi == len(months) - 1
+                    )
+                    break
+            if len(collected) >= limit:
+                break
+
+        # 3. 截断并生成下一页游标
+        page = collected[:limit]
+        next_cursor = None
+        if page and not exhausted:
+            next_cursor = RecordService.encode_history_cursor(page[-1][0])
+
+        return [r for _, r in reversed(page)], next_cursor
 
-        return full_history[-limit:]
+    # endregion
 
     @staticmethod
     def get_diet_records_range(
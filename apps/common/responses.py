@@ -0,0 +1,21 @@
+"""
+JSON response class backed by libs.utils.json_codec (orjson when installed).
+
+For endpoints without a response_model that return plain JSON-native data
+(search results read from JSONL/indexes): returning CodecJSONResponse(content)
+skips FastAPI's jsonable_encoder walk over every nested value.
+
+Not installed as the app's default_response_class: endpoints with a
+response_model are already serialized straight to bytes by pydantic-core,
+and a custom default class would push them back through jsonable_encoder.
+"""
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from libs.utils import json_codec
+
+
+class CodecJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return json_codec.dumpb(content)
@@ -0,0 +1,482 @@
+"""
+Search Index.
+
+Per-user inverted index over character unigrams/bigrams and pinyin initials,
+used by search_services so that typed search does not rescan the raw JSONL
+libraries on every keystroke.
+
+Sources:
+- products:  diet/product_library.jsonl  (one doc per Brand+Name+Variant)
+- dishes:    diet/dish_library.jsonl     (one doc per dish name)
+- cards:     cards/index.json            (one doc per card)
+- dialogues: dialogues/index.json        (one doc per dialogue)
+
+Each index is persisted next to its source as an append-only
+``*.search_index.jsonl`` log and is updated incrementally by the writers
+(RecordService / DialogueService). Every log record carries the source file
+signature (size, mtime); if the source changed behind our back, the index is
+rebuilt from the source instead of trusting the log.
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import count
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from libs.storage_lib import global_storage
+from libs.utils.text_utils.pinyin_util import extract_phonetics
+from libs.utils import json_codec
+
+logger = logging.getLogger("search_index")
+
+# Compact the log once it holds this many records more than live docs
+COMPACT_SLACK = 200
+
+
+def _grams(text: str) -> Set[str]:
+    """Unigrams + bigrams of an already lowercased string."""
+    grams = set(text)
+    grams.update(text[i : i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+def _query_grams(part: str) -> Set[str]:
+    """Grams a query part needs: its bigrams, or the char itself for 1-char parts."""
+    if len(part) == 1:
+        return {part}
+    return {part[i : i + 2] for i in range(len(part) - 1)}
+
+
+@dataclass
+class IndexedDoc:
+    """One searchable document."""
+
+    doc_id: str
+    text: str  # lowercased main text
+    pinyin: Tuple[str, ...]  # lowercased pinyin initials
+    payload: Any
+    seq: int  # recency order, larger is newer
+
+    def matches(self, parts: List[str]) -> bool:
+        """Matcher semantics: all parts in text, or all parts in one pinyin initial string."""
+        if all(part in self.text for part in parts):
+            return True
+        return any(all(part in pi for part in parts) for pi in self.pinyin)
+
+
+class NgramIndex:
+    """In-memory inverted index with recency ordering."""
+
+    def __init__(self):
+        self.docs: "OrderedDict[str, IndexedDoc]" = OrderedDict()
+        self.postings: Dict[str, Set[str]] = {}
+        self._seq = count()
+
+    def get(self, doc_id: str) -> Optional[IndexedDoc]:
+        return self.docs.get(doc_id)
+
+    def put(self, doc_id: str, text: str, pinyin: Iterable[str], payload: Any) -> None:
+        """Insert or replace a doc and mark it as the most recent."""
+        self.remove(doc_id)
+        doc = IndexedDoc(
+            doc_id=doc_id,
+            text=(text or "").lower(),
+            pinyin=tuple(str(pi).lower() for pi in (pinyin or []) if pi),
+            payload=payload,
+            seq=next(self._seq),
+        )
+        self.docs[doc_id] = doc
+        for gram in self._doc_grams(doc):
+            self.postings.setdefault(gram, set()).add(doc_id)
+
+    def remove(self, doc_id: str) -> bool:
+        doc = self.docs.pop(doc_id, None)
+        if not doc:
+            return False
+        for gram in self._doc_grams(doc):
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting.discard(doc_id)
+                if not posting:
+                    del self.postings[gram]
+        return True
+
+    @staticmethod
+    def _doc_grams(doc: IndexedDoc) -> Set[str]:
+        grams = _grams(doc.text)
+        for pi in doc.pinyin:
+            grams |= _grams(pi)
+        return grams
+
+    def search(
+        self,
+        query: str,
+        limit: int,
+        predicate: Optional[Callable[[Any], bool]] = None,
+    ) -> List[Any]:
+        """
+        Return payloads of matching docs, newest first.
+        Empty query returns the newest docs (subject to predicate).
+        """
+        parts = (query or "").lower().split()
+
+        candidates: Optional[Set[str]] = None
+        if parts:
+            postings = []
+            for part in parts:
+                for gram in _query_grams(part):
+                    posting = self.postings.get(gram)
+                    if not posting:
+                        return []
+                    postings.append(posting)
+            postings.sort(key=len)
+            # Read-only use below, so a single posting needs no copy
+            candidates = (
+                postings[0].intersection(*postings[1:]) if len(postings) > 1 else postings[0]
+            )
+            if not candidates:
+                return []
+
+        if candidates is None or len(candidates) * 4 > len(self.docs):
+            # Broad result: walk recency order and stop at limit
+            ordered = reversed(self.docs.values())
+        else:
+            ordered = sorted(
+                (self.docs[doc_id] for doc_id in candidates), key=lambda d: d.seq, reverse=True
+            )
+
+        results = []
+        for doc in ordered:
+            if candidates is not None and doc.doc_id not in candidates:
+                continue
+            if parts and not doc.matches(parts):
+                continue
+            if predicate and not predicate(doc.payload):
+                continue
+            results.append(doc.payload)
+            if len(results) >= limit:
+                break
+        return results
+
+
+@dataclass
+class SourceSpec:
+    """How one data source maps into index docs."""
+
+    name: str
+    source_path: Callable[[str], Path]
+    index_path: Callable[[str], Path]
+    load_rows: Callable[[Path], List[Dict[str, Any]]]  # oldest first
+    doc_id: Callable[[Dict[str, Any]], Optional[str]]
+    text: Callable[[Dict[str, Any]], str]
+    pinyin: Callable[[Dict[str, Any]], List[str]]
+    # (previous payload or None, row) -> new payload
+    payload: Callable[[Any, Dict[str, Any]], Any] = lambda _prev, row: row
+
+
+class PersistentSearchIndex:
+    """NgramIndex bound to a source file, with an append-only log on disk."""
+
+    def __init__(self, user_id: str, spec: SourceSpec):
+        self.user_id = user_id
+        self.spec = spec
+        self.source_path = spec.source_path(user_id)
+        self.index_path = spec.index_path(user_id)
+        self.index = NgramIndex()
+        self.signature: Optional[List[int]] = None
+        self.log_records = 0
+        self.lock = threading.RLock()
+        self._load()
+
+    # ---------- signature ----------
+
+    def _current_signature(self) -> Optional[List[int]]:
+        try:
+            st = os.stat(self.source_path)
+        except FileNotFoundError:
+            return None
+        return [st.st_size, st.st_mtime_ns]
+
+    def ensure_fresh(self) -> None:
+        """Rebuild if the source file was changed by someone who did not update us."""
+        with self.lock:
+            if self.signature != self._current_signature():
+                logger.info("Search index %s/%s stale, rebuilding", self.user_id, self.spec.name)
+                self.rebuild()
+
+    # ---------- load / rebuild ----------
+
+    def _load(self) -> None:
+        records = []
+        if self.index_path.exists():
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            records.append(json_codec.loads(line))
+                        except json.JSONDecodeError:
+                            continue  # torn tail write
+            except OSError as e:
+                logger.warning("Failed to read search index %s: %s", self.index_path, e)
+                records = []
+
+        if not records or records[-1].get("sig") != self._current_signature():
+            self.rebuild()
+            return
+
+        for record in records:
+            self._apply_record(record)
+        self.signature = records[-1].get("sig")
+        self.log_records = len(records)
+        if self.log_records > len(self.index.docs) + COMPACT_SLACK:
+            self._compact()
+
+    def rebuild(self) -> None:
+        """Rebuild the whole index from the source and rewrite the log."""
+        with self.lock:
+            self.index = NgramIndex()
+            signature = self._current_signature()
+            if signature is not None:
+                for row in self.spec.load_rows(self.source_path):
+                    self._put_row(row)
+            self.signature = signature
+            self._compact()
+
+    def _compact(self) -> None:
+        """Rewrite the log as one put record per live doc."""
+        lines = [
+            json_codec.dumps(self._put_record(doc))
+            for doc in self.index.docs.values()
+        ]
+        if not lines:
+            lines = [json_codec.dumps({"op": "noop", "sig": self.signature})]
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp_path, self.index_path)
+            self.log_records = len(lines)
+        except OSError as e:
+            logger.warning("Failed to write search index %s: %s", self.index_path, e)
+
+    # ---------- records ----------
+
+    def _put_record(self, doc: IndexedDoc) -> Dict[str, Any]:
+        return {
+            "op": "put",
+            "id": doc.doc_id,
+            "text": doc.text,
+            "pinyin": list(doc.pinyin),
+            "payload": doc.payload,
+            "sig": self.signature,
+        }
+
+    def _apply_record(self, record: Dict[str, Any]) -> None:
+        if record.get("op") == "put":
+            self.index.put(record["id"], record["text"], record["pinyin"], record["payload"])
+        elif record.get("op") == "del":
+            self.index.remove(record["id"])
+
+    def _put_row(self, row: Dict[str, Any]) -> Optional[IndexedDoc]:
+        doc_id = self.spec.doc_id(row)
+        if not doc_id:
+            return None
+        previous = self.index.get(doc_id)
+        payload = self.spec.payload(previous.payload if previous else None, row)
+        self.index.put(doc_id, self.spec.text(row), self.spec.pinyin(row), payload)
+        return self.index.get(doc_id)
+
+    def _append_log(self, records: List[Dict[str, Any]]) -> None:
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json_codec.dumps(record) + "\n")
+            self.log_records += len(records)
+        except OSError as e:
+            logger.warning("Failed to append search index %s: %s", self.index_path, e)
+        if self.log_records > len(self.index.docs) + COMPACT_SLACK:
+            self._compact()
+
+    # ---------- incremental updates ----------
+
+    def apply(self, rows: Iterable[Dict[str, Any]] = (), removed_ids: Iterable[str] = ()) -> None:
+        """
+        Mirror a write that was just made to the source file.
+        Rows are folded even when the signature already matches: with two
+        interleaved writers the first apply records the combined signature,
+        and puts/removes are keyed upserts, so folding again is harmless.
+        """
+        with self.lock:
+            signature = self._current_signature()
+            self.signature = signature
+
+            records = []
+            for doc_id in removed_ids:
+                if self.index.remove(doc_id):
+                    records.append({"op": "del", "id": doc_id, "sig": signature})
+            for row in rows:
+                doc = self._put_row(row)
+                if doc:
+                    records.append(self._put_record(doc))
+            if not records:
+                records.append({"op": "noop", "sig": signature})
+            self._append_log(records)
+
+    def search(
+        self, query: str, limit: int, predicate: Optional[Callable[[Any], bool]] = None
+    ) -> List[Any]:
+        with self.lock:
+            return self.index.search(query, limit, predicate)
+
+
+# region 数据源定义
+
+
+def _user_dir(user_id: str) -> Path:
+    return global_storage.base_dir / user_id
+
+
+def _read_jsonl(path: Path) -> List[Dict[str, Any]]:
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json_codec.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return rows
+
+
+def _read_json_list(path: Path) -> List[Dict[str, Any]]:
+    try:
+        data = json_codec.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return []
+    return data if isinstance(data, list) else []
+
+
+def product_key(p: Dict[str, Any]) -> Tuple[str, str, str]:
+    """Deduplication key of a product: (brand, name, variant)."""
+    p_name = p.get("product_name", "") or p.get("name", "")
+    return (
+        str(p.get("brand", "") or "").strip(),
+        str(p_name or "").strip(),
+        str(p.get("variant", "") or "").strip(),
+    )
+
+
+def _product_text(p: Dict[str, Any]) -> str:
+    p_name = p.get("product_name", "") or p.get("name", "")
+    return f"{p.get('brand', '')} {p_name} {p.get('variant', '')}"
+
+
+def card_search_text(card: Dict[str, Any]) -> str:
+    """Searchable text of a card index entry: User Title, Meal Name, Dish Names."""
+    title = card.get("user_title") or ""
+    meal_name = card.get("meal_name") or ""
+    dish_names = " ".join(card.get("dish_names", []) or [])
+    return f"{title} {meal_name} {dish_names}"
+
+
+PRODUCTS = "products"
+DISHES = "dishes"
+CARDS = "cards"
+DIALOGUES = "dialogues"
+
+SOURCES: Dict[str, SourceSpec] = {
+    PRODUCTS: SourceSpec(
+        name=PRODUCTS,
+        source_path=lambda uid: _user_dir(uid) / "diet" / "product_library.jsonl",
+        index_path=lambda uid: _user_dir(uid) / "diet" / "product_library.search_index.jsonl",
+        load_rows=_read_jsonl,
+        doc_id=lambda p: "|".join(product_key(p)),
+        text=_product_text,
+        pinyin=lambda p: p.get("pinyin_initials", []) or [],
+    ),
+    DISHES: SourceSpec(
+        name=DISHES,
+        source_path=lambda uid: _user_dir(uid) / "diet" / "dish_library.jsonl",
+        index_path=lambda uid: _user_dir(uid) / "diet" / "dish_library.search_index.jsonl",
+        load_rows=_read_jsonl,
+        doc_id=lambda d: d.get("dish_name") or None,
+        text=lambda d: d.get("dish_name", ""),
+        pinyin=lambda d: d.get("pinyin_initials", []) or [],
+        # Per-dish statistics live in apps.diet.dish_aggregates
+        payload=lambda _prev, d: {"dish_name": d.get("dish_name", "")},
+    ),
+    CARDS: SourceSpec(
+        name=CARDS,
+        source_path=lambda uid: _user_dir(uid) / "cards" / "index.json",
+        index_path=lambda uid: _user_dir(uid) / "cards" / "search_index.jsonl",
+        load_rows=_read_json_list,
+        doc_id=lambda c: c.get("id"),
+        text=card_search_text,
+        pinyin=lambda c: extract_phonetics(card_search_text(c)).get("pinyin_initials", []),
+    ),
+    DIALOGUES: SourceSpec(
+        name=DIALOGUES,
+        source_path=lambda uid: _user_dir(uid) / "dialogues" / "index.json",
+        index_path=lambda uid: _user_dir(uid) / "dialogues" / "search_index.jsonl",
+        load_rows=_read_json_list,
+        doc_id=lambda d: d.get("id"),
+        text=lambda d: d.get("title", "") or "",
+        pinyin=lambda d: [],
+    ),
+}
+
+# endregion
+
+
+# region 进程级注册表
+
+_indexes: Dict[Tuple[str, str], PersistentSearchIndex] = {}
+_registry_lock = threading.Lock()
+
+
+def get_index(user_id: str, source: str) -> PersistentSearchIndex:
+    """Get (loading or building on first use) the index of one user's source."""
+    key = (user_id, source)
+    with _registry_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = PersistentSearchIndex(user_id, SOURCES[source])
+            _indexes[key] = index
+    index.ensure_fresh()
+    return index
+
+
+def on_source_written(
+    user_id: str,
+    source: str,
+    rows: Iterable[Dict[str, Any]] = (),
+    removed_ids: Iterable[str] = (),
+) -> None:
+    """
+    Writers call this right after updating a source file.
+    Failures are logged, never raised: the index self-heals on next read.
+    """
+    try:
+        with _registry_lock:
+            index = _indexes.get((user_id, source))
+        if index is None:
+            # Not loaded in this process yet; first read will load or rebuild
+            return
+        index.apply(rows, removed_ids)
+    except Exception as e:  # pylint: disable=broad-except
+        logger.warning("Search index update failed for %s/%s: %s", user_id, source, e)
+
+
+# endregion
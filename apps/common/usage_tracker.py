@@ -1,51 +1,140 @@
-import json
+import atexit
+import logging
+import os
+import threading
 from pathlib import Path
 from datetime import date
+from typing import Dict, Optional, Tuple
+
+from libs.utils import json_codec
 
 BASE_DIR = Path("user_data")
+# Write-behind delay: increments within this window are flushed together
+FLUSH_INTERVAL_SECONDS = 5.0
+
+logger = logging.getLogger("usage_tracker")
+
 
 class UsageTracker:
+    """
+    Per-user daily feature usage.
+
+    Counters live in an in-process ledger ({user_id: {"date", "counts"}}),
+    loaded from usage_stats.json on first use and written back behind the
+    requests (FLUSH_INTERVAL_SECONDS, and at interpreter exit). All reads
+    and increments go through one lock, so concurrent requests cannot lose
+    increments. Assumes a single server process owns user_data.
+    """
+
+    _ledgers: Dict[str, dict] = {}
+    _dirty: set = set()
+    _lock = threading.RLock()
+    _flush_lock = threading.Lock()  # serializes file writes of concurrent flushes
+    _flush_timer: Optional[threading.Timer] = None
+
     @staticmethod
     def _get_usage_path(user_id: str) -> Path:
         return BASE_DIR / user_id / "usage_stats.json"
 
-    @staticmethod
-    def get_today_usage(user_id: str) -> dict:
-        path = UsageTracker._get_usage_path(user_id)
-        if not path.exists():
-            return {}
-            
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            
-            today_str = date.today().isoformat()
-            if data.get("date") != today_str:
-                return {} # Reset if new day
-                
-            return data.get("counts", {})
-        except Exception:
-            return {}
-
-    @staticmethod
-    def increment_usage(user_id: str, feature: str, amount: int = 1):
-        path = UsageTracker._get_usage_path(user_id)
+    @classmethod
+    def _ledger(cls, user_id: str) -> dict:
+        """Today's ledger of a user (caller holds _lock). Rolls over on a new day."""
         today_str = date.today().isoformat()
-        
-        data = {"date": today_str, "counts": {}}
-        
-        if path.exists():
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    existing = json.load(f)
+        ledger = cls._ledgers.get(user_id)
+
+        if ledger is None:
+            ledger = {"date": today_str, "counts": {}}
+            path = cls._get_usage_path(user_id)
+            if path.exists():
+                try:
+                    existing = json_codec.load_file(path)
                     if existing.get("date") == today_str:
-                        data = existing
-            except Exception:
-                pass
-        
-        current_count = data["counts"].get(feature, 0)
-        data["counts"][feature] = current_count + amount
-        
-        path.parent.mkdir(parents=True, exist_ok=True)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
+                        ledger = existing
+                except Exception:
+                    pass
+            cls._ledgers[user_id] = ledger
+
+        if ledger.get("date") != today_str:
+            # Reset if new day
+            ledger = {"date": today_str, "counts": {}}
+            cls._ledgers[user_id] = ledger
+
+        return ledger
+
+    @classmethod
+    def get_today_usage(cls, user_id: str) -> dict:
+        with cls._lock:
+            return dict(cls._ledger(user_id)["counts"])
+
+    @classmethod
+    def increment_usage(cls, user_id: str, feature: str, amount: int = 1):
+        with cls._lock:
+            counts = cls._ledger(user_id)["counts"]
+            counts[feature] = counts.get(feature, 0) + amount
+            cls._mark_dirty(user_id)
+
+    @classmethod
+    def check_and_increment(
+        cls, user_id: str, feature: str, amount: int, limit: int
+    ) -> Tuple[bool, int]:
+        """
+        Atomically consume `amount` if it fits under `limit` (-1 = unlimited).
+        Returns (allowed, usage before this call).
+        """
+        with cls._lock:
+            counts = cls._ledger(user_id)["counts"]
+            current = counts.get(feature, 0)
+            if limit != -1 and current + amount > limit:
+                return False, current
+            counts[feature] = current + amount
+            cls._mark_dirty(user_id)
+            return True, current
+
+    @classmethod
+    def refund_usage(cls, user_id: str, feature: str, amount: int = 1):
+        """Give back usage charged up front by check_and_increment (never below 0)."""
+        with cls._lock:
+            counts = cls._ledger(user_id)["counts"]
+            counts[feature] = max(0, counts.get(feature, 0) - amount)
+            cls._mark_dirty(user_id)
+
+    # ---------- write-behind ----------
+
+    @classmethod
+    def _mark_dirty(cls, user_id: str):
+        cls._dirty.add(user_id)
+        if cls._flush_timer is None:
+            cls._flush_timer = threading.Timer(FLUSH_INTERVAL_SECONDS, cls.flush)
+            cls._flush_timer.daemon = True
+            cls._flush_timer.start()
+
+    @classmethod
+    def flush(cls):
+        """Write every changed ledger to its usage_stats.json."""
+        with cls._flush_lock:
+            cls._flush()
+
+    @classmethod
+    def _flush(cls):
+        with cls._lock:
+            if cls._flush_timer is not None:
+                cls._flush_timer.cancel()
+                cls._flush_timer = None
+            pending = {uid: json_codec.dumps(cls._ledgers[uid]) for uid in cls._dirty}
+            cls._dirty = set()
+
+        for user_id, payload in pending.items():
+            path = cls._get_usage_path(user_id)
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_name(path.name + ".tmp")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(payload)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                logger.error("Failed to save usage for %s: %s", user_id, e)
+                with cls._lock:
+                    cls._mark_dirty(user_id)
+
+
+atexit.register(UsageTracker.flush)
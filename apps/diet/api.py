@@ -10,8 +10,6 @@ import logging
 import json
 from typing import Any, Dict, List, Optional
 
-from collections import defaultdict
-
 from fastapi import APIRouter, Depends, File, Form, UploadFile, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
@@ -24,6 +22,7 @@ from apps.common.utils import (
     read_upload_files,
 )
 from apps.deps import get_current_user_id, require_auth
+from apps.diet import dish_aggregates, product_store
 from apps.diet.context_provider import get_context_bundle, _calculate_today_so_far
 from apps.diet.template_service import DietTemplateService, DietTemplate
 
@@ -34,8 +33,6 @@ from apps.llm_runtime import get_global_semaphore, get_model_limiter
 from apps.settings import BackendSettings
 from libs.utils.rate_limiter import AsyncRateLimiter
 from libs.llm_gemini.gemini_client import StreamError
-from libs.storage_lib import global_storage
-from libs.utils.energy_units import macro_energy_kj
 
 logger = logging.getLogger(__name__)
 
@@ -86,6 +83,8 @@ class DietHistoryResponse(BaseModel):
 
     success: bool
     records: List[Dict[str, Any]] = []
+    # Opaque cursor for the next (older) page; None when there is no more history
+    next_cursor: Optional[str] = None
     error: Optional[str] = None
 
 
@@ -108,6 +107,13 @@ class DietTemplateReorder(BaseModel):
     ordered_ids: List[str]
 
 
+def _refund_usage(user_id: str, feature: str, image_count: int) -> None:
+    """Refund the up-front charges of a request whose model call failed."""
+    Gatekeeper.refund_usage(user_id, feature)
+    if image_count:
+        Gatekeeper.refund_usage(user_id, "image_analyze", amount=image_count)
+
+
 def build_diet_router(settings: BackendSettings) -> APIRouter:
     """Build and return the diet API router."""
     router = APIRouter()
@@ -145,9 +151,8 @@ def build_diet_router(settings: BackendSettings) -> APIRouter:
                 success=False, error="单次请求最多支持 10 张图片，请分批上传"
             )
 
-        # [Access Check]
-        # [Access Check] - Text/Basic Analyze Limit
-        access = Gatekeeper.check_access(user_id, "analyze")
+        # [Access Check] - Text/Basic Analyze Limit (charged up front, refunded on failure)
+        access = Gatekeeper.consume_access(user_id, "analyze")
         if not access["allowed"]:
             raise HTTPException(
                 status_code=403,
@@ -164,10 +169,11 @@ def build_diet_router(settings: BackendSettings) -> APIRouter:
 
         # [Access Check] - Image Analyze Limit
         if images_bytes:
-            img_access = Gatekeeper.check_access(
+            img_access = Gatekeeper.consume_access(
                 user_id, "image_analyze", amount=len(images_bytes)
             )
             if not img_access["allowed"]:
+                Gatekeeper.refund_usage(user_id, "analyze")
                 raise HTTPException(
                     status_code=403,
                     detail={
@@ -189,20 +195,17 @@ def build_diet_router(settings: BackendSettings) -> APIRouter:
         logger.info(access_log)
 
         async with semaphore:
-            await limiter.check_and_wait()
-            result = await analyze_uc.execute_with_image_bytes_async(
-                user_note=user_note, images_bytes=images_bytes, user_id=user_id
-            )
-
-            # Record Usage on Success
-            if isinstance(result, dict) and not result.get("error"):
-                Gatekeeper.record_usage(user_id, "analyze")
-                if images_bytes:
-                    Gatekeeper.record_usage(
-                        user_id, "image_analyze", amount=len(images_bytes)
-                    )
+            try:
+                await limiter.check_and_wait()
+                result = await analyze_uc.execute_with_image_bytes_async(
+                    user_note=user_note, images_bytes=images_bytes, user_id=user_id
+                )
+            except BaseException:
+                _refund_usage(user_id, "analyze", len(images_bytes))
+                raise
 
             if isinstance(result, dict) and result.get("error"):
+                _refund_usage(user_id, "analyze", len(images_bytes))
                 return DietAnalyzeResponse(
                     success=False, error=str(result.get("error"))
                 )
@@ -322,8 +325,8 @@ def build_diet_router(settings: BackendSettings) -> APIRouter:
         limiter: AsyncRateLimiter = Depends(_get_model_limiter),
     ):
         """获取饮食建议"""
-        # [Access Check]
-        access = Gatekeeper.check_access(user_id, "advice")
+        # [Access Check] (charged up front, refunded on failure)
+        access = Gatekeeper.consume_access(user_id, "advice")
         if not access["allowed"]:
             raise HTTPException(
                 status_code=403,
@@ -343,10 +346,11 @@ def build_diet_router(settings: BackendSettings) -> APIRouter:
         warning_message = None
 
         if len(images_bytes) > 10:
+            Gatekeeper.refund_usage(user_id, "advice")
             return DietAdviceResponse(success=False, error="单次请求最多支持 10 张图片")
 
         if images_bytes:
-            img_access = Gatekeeper.check_access(
+            img_access = Gatekeeper.consume_access(
                 user_id, "image_analyze", amount=len(images_bytes)
             )
             if not img_access["allowed"]:
@@ -355,25 +359,23 @@ def build_diet_router(settings: BackendSettings) -> APIRouter:
                 warning_message = f"图片分析数量已用完，仅进行文字建议 (当前限制: {img_access.get('limit', 'Unknown')})"
 
         async with semaphore:
-            await limiter.check_and_wait()
-            advice = await advice_uc.execute_async(
-                user_id=user_id,
-                facts=req.facts,
-                user_note=req.user_note,
-                dialogue_id=req.dialogue_id,
-                images=images_bytes,
-            )
+            try:
+                await limiter.check_and_wait()
+                advice = await advice_uc.execute_async(
+                    user_id=user_id,
+                    facts=req.facts,
+                    user_note=req.user_note,
+                    dialogue_id=req.dialogue_id,
+                    images=images_bytes,
+                )
+            except BaseException:
+                _refund_usage(user_id, "advice", len(images_bytes))
+                raise
             print("test-advice", advice)
             if isinstance(advice, dict) and advice.get("error"):
+                _refund_usage(user_id, "advice", len(images_bytes))
                 return DietAdviceResponse(success=False, error=str(advice.get("error")))
 
-            Gatekeeper.record_usage(user_id, "advice")
-            # Record image usage only if images were actually processed
-            if images_bytes:
-                Gatekeeper.record_usage(
-                    user_id, "image_analyze", amount=len(images_bytes)
-                )
-
             return DietAdviceResponse(
                 success=True, result=advice, warning=warning_message
             )
@@ -388,8 +390,13 @@ def build_diet_router(settings: BackendSettings) -> APIRouter:
         limit: int = 20,
         start_date: Optional[str] = None,
         end_date: Optional[str] = None,
+        cursor: Optional[str] = None,
     ):
-        """获取饮食历史"""
+        """
+        获取饮食历史
+        - 指定日期范围: 返回范围内全部记录
+        - 否则按游标分页: 每页 limit 条（旧->新），next_cursor 指向更早一页
+        """
         if start_date or end_date:
             if start_date and not end_date:
                 end_date = start_date
@@ -399,12 +406,21 @@ def build_diet_router(settings: BackendSettings) -> APIRouter:
             records = RecordService.get_unified_records_range(
                 user_id, start_date, end_date
             )
-        else:
-            records = RecordService.get_recent_unified_records(
-                user_id=user_id, limit=limit
-            )
+            return DietHistoryResponse(success=True, records=records)
+
+        if cursor:
+            try:
+                RecordService.decode_history_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e)) from e
+
+        records, next_cursor = RecordService.get_unified_records_page(
+            user_id=user_id, limit=max(1, min(limit, 200)), cursor=cursor
+        )
 
-        return DietHistoryResponse(success=True, records=records)
+        return DietHistoryResponse(
+            success=True, records=records, next_cursor=next_cursor
+        )
 
     @router.get(
         "/api/diet/summary/today",
@@ -435,8 +451,8 @@ def build_diet_router(settings: BackendSettings) -> APIRouter:
         limiter: AsyncRateLimiter = Depends(_get_model_limiter),
     ):
         """流式获取饮食建议"""
-        # [Access Check]
-        access = Gatekeeper.check_access(user_id, "advice")
+        # [Access Check] (charged up front, refunded if the stream fails before any text)
+        access = Gatekeeper.consume_access(user_id, "advice")
         if not access["allowed"]:
             raise HTTPException(
                 status_code=403,
@@ -455,10 +471,11 @@ def build_diet_router(settings: BackendSettings) -> APIRouter:
         images_bytes = decode_images_b64(req.images_b64)
 
         if len(images_bytes) > 10:
+            Gatekeeper.refund_usage(user_id, "advice")
             raise HTTPException(status_code=400, detail="单次请求最多支持 10 张图片")
 
         if images_bytes:
-            img_access = Gatekeeper.check_access(
+            img_access = Gatekeeper.consume_access(
                 user_id, "image_analyze", amount=len(images_bytes)
             )
             if not img_access["allowed"]:
@@ -469,17 +486,10 @@ def build_diet_router(settings: BackendSettings) -> APIRouter:
                 # Ideally we could send a first chunk as meta, but let's keep it simple text stream for now.
 
         async def _stream_generator():
+            streamed = False
             async with semaphore:
-                await limiter.check_and_wait()
-
-                # Usage Record (start)
-                Gatekeeper.record_usage(user_id, "advice")
-                if images_bytes:
-                    Gatekeeper.record_usage(
-                        user_id, "image_analyze", amount=len(images_bytes)
-                    )
-
                 try:
+                    await limiter.check_and_wait()
                     async for chunk in advice_uc.execute_stream_async(
                         user_id=user_id,
                         facts=req.facts,
@@ -488,8 +498,11 @@ def build_diet_router(settings: BackendSettings) -> APIRouter:
                     ):
                         # Wrap chunk in JSON for SSE protocol
                         payload = json.dumps({"text": chunk}, ensure_ascii=False)
+                        streamed = True
                         yield f"data: {payload}\n\n"
                 except Exception as e:
+                    if not streamed:
+                        _refund_usage(user_id, "advice", len(images_bytes))
                     code = "ERR_STREAM_UNKNOWN"
                     if isinstance(e, StreamError):
                         code = e.code
@@ -577,86 +590,23 @@ def build_diet_router(settings: BackendSettings) -> APIRouter:
         Aggregates historical data to provide average energy and weight.
         """
 
-        dishes = global_storage.read_dataset(
-            user_id, "diet", "dish_library.jsonl", limit=limit
-        )
+        # Per-dish averages are maintained incrementally on each archive
+        return dish_aggregates.get_store(user_id).library(limit)
 
-        # Aggregation: Name -> Stats
-        aggregated = defaultdict(
-            lambda: {
-                "count": 0,
-                "total_weight": 0.0,
-                "sum_p": 0.0,
-                "sum_f": 0.0,
-                "sum_c": 0.0,
-                "sum_na": 0.0,
-                "sum_fib": 0.0,
-                "latest_record": None,
-            }
-        )
-
-        for dish in dishes:
-            name = dish.get("dish_name", "")
-            if not name:
-                continue
-
-            # Exclude zero weights as requested
-            w = float(dish.get("recorded_weight_g") or 0)
-            if w <= 0:
-                continue
-
-            agg = aggregated[name]
-            agg["count"] += 1
-            agg["total_weight"] += w
-
-            macros = dish.get("macros_per_100g") or {}
-            agg["sum_p"] += float(macros.get("protein_g") or 0)
-            agg["sum_f"] += float(macros.get("fat_g") or 0)
-            agg["sum_c"] += float(macros.get("carbs_g") or 0)
-            agg["sum_na"] += float(macros.get("sodium_mg") or 0)
-            agg["sum_fib"] += float(macros.get("fiber_g") or 0)
-
-            if agg["latest_record"] is None:
-                agg["latest_record"] = dish
-
-        result = []
-        for name, data in aggregated.items():
-            count = data["count"]
-            if count == 0:
-                continue
-
-            avg_weight = round(data["total_weight"] / count, 1)
-
-            # Avg Densities (per 100g)
-            d_p = data["sum_p"] / count
-            d_f = data["sum_f"] / count
-            d_c = data["sum_c"] / count
-            d_na = data["sum_na"] / count
-            d_fib = data["sum_fib"] / count
-
-            # Recalculate Energy Density (kJ/100g)
-            d_e = macro_energy_kj(d_p, d_f, d_c)
-
-            latest = data["latest_record"]
-
-            result.append(
-                {
-                    "dish_name": name,
-                    "recorded_weight_g": avg_weight,  # Average Weight
-                    "macros_per_100g": {
-                        "energy_kj": round(d_e, 2),
-                        "protein_g": round(d_p, 2),
-                        "fat_g": round(d_f, 2),
-                        "carbs_g": round(d_c, 2),
-                        "sodium_mg": round(d_na, 2),
-                        "fiber_g": round(d_fib, 2),
-                    },
-                    "ingredients_snapshot": latest.get("ingredients_snapshot", []),
-                    "count": count,
-                }
-            )
-
-        return result
+    # --- Product Library Endpoint ---
+    @router.get(
+        "/api/diet/product-library",
+        response_model=List[Dict[str, Any]],
+        dependencies=[Depends(auth_dep)],
+    )
+    async def get_product_library(
+        limit: int = 200, user_id: str = Depends(get_current_user_id)
+    ):
+        """
+        Get the user's product library.
+        One entry per Brand+Name+Variant, most recently captured first.
+        """
+        return product_store.get_store(user_id).latest(limit)
 
 
 
@@ -18,6 +18,7 @@ from typing import Any, Dict, Optional
 from libs.core.config_loader import load_json
 from libs.core.project_paths import get_project_root
 from apps.common.record_service import RecordService
+from apps.diet import daily_rollup
 from apps.profile.service import ProfileService
 from apps.common.user_bio_service import UserBioService
 from apps.common.utils import parse_occurred_at, format_diet_records_to_table
@@ -35,56 +36,25 @@ def _calculate_today_so_far(
     ignore_record_id: Optional[str] = None
 ) -> Dict[str, Any]:
     """
-    从 RecordService 计算今天(或指定日期)已确认的记录汇总。
+    从每日汇总 (daily_rollup) 读取今天(或指定日期)已确认的记录汇总。
     exclude_record_id: 如果提供，在计算时排除该 ID (通常是因为正在编辑该记录的最新版 draft)
     """
-    consumed_energy_kj = 0.0
-    consumed_protein_g = 0.0
-    consumed_fat_g = 0.0
-    consumed_carbs_g = 0.0
-    consumed_sodium_mg = 0.0
-    consumed_fiber_g = 0.0
-    activity_burn_kj = 0.0
-
-    # 获取流水
-    if target_date:
-        records = RecordService.get_unified_records_by_date(user_id, target_date)
-    else:
-        records = RecordService.get_todays_unified_records(user_id)
+    date_str = target_date or datetime.now().strftime("%Y-%m-%d")
 
-    for rec in records:
-        # [Filter] 排重逻辑
-        if ignore_record_id and rec.get("record_id") == ignore_record_id:
-            continue
+    # 读取物化的当日汇总（写入流水时已同步），排除指定记录
+    day = daily_rollup.get_day(user_id, date_str)
+    totals = daily_rollup.day_summary(day, ignore_record_id=ignore_record_id)
 
-        # 汇总 meal_summary
-        meal = rec.get("meal_summary") or {}
-        if isinstance(meal, dict):
-            consumed_energy_kj += float(meal.get("total_energy_kj") or 0.0)
-
-        # 汇总 dishes 的宏量
-        for dish in rec.get("dishes") or []:
-            if not isinstance(dish, dict):
-                continue
-            for ing in dish.get("ingredients") or []:
-                if not isinstance(ing, dict):
-                    continue
-                macros = ing.get("macros") or {}
-                consumed_protein_g += float(macros.get("protein_g") or 0.0)
-                consumed_fat_g += float(macros.get("fat_g") or 0.0)
-                consumed_carbs_g += float(macros.get("carbs_g") or 0.0)
-                consumed_sodium_mg += float(macros.get("sodium_mg") or 0.0)
-                consumed_fiber_g += float(macros.get("fiber_g") or 0.0)
-
-        # TODO: activity_burn_kj 需要从 Keep 或其他运动数据源汇总
+    # TODO: activity_burn_kj 需要从 Keep 或其他运动数据源汇总
+    activity_burn_kj = 0.0
 
     return {
-        "consumed_energy_kj": round(consumed_energy_kj, 4),
-        "consumed_protein_g": round(consumed_protein_g, 4),
-        "consumed_fat_g": round(consumed_fat_g, 4),
-        "consumed_carbs_g": round(consumed_carbs_g, 4),
-        "consumed_sodium_mg": round(consumed_sodium_mg, 4),
-        "consumed_fiber_g": round(consumed_fiber_g, 4),
+        "consumed_energy_kj": round(totals["energy_kj"], 4),
+        "consumed_protein_g": round(totals["protein_g"], 4),
+        "consumed_fat_g": round(totals["fat_g"], 4),
+        "consumed_carbs_g": round(totals["carbs_g"], 4),
+        "consumed_sodium_mg": round(totals["sodium_mg"], 4),
+        "consumed_fiber_g": round(totals["fiber_g"], 4),
         "activity_burn_kj": round(activity_burn_kj, 4),
     }
 
@@ -0,0 +1,268 @@
+"""
+Daily Rollup.
+
+Materialized per-day nutrition totals over the diet ledgers
+(diet/ledger_YYYY-MM-DD.jsonl): energy, macros, sodium, fiber, meal and dish
+counts, plus each record's own contribution so a single record can be
+excluded (e.g. the one being edited) without rereading the day.
+
+RecordService recomputes a day from the records it has just written, so the
+rollup changes together with the ledger. Days that are missing, or whose
+ledger file signature (size, mtime_ns) no longer matches, are rebuilt lazily
+from the ledger on read.
+
+Persisted per user as diet/daily_rollups/YYYY-MM.json, one shard per month,
+so a ledger write only rewrites its own month rather than the whole history.
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from libs.storage_lib import global_storage
+from libs.utils import json_codec
+
+logger = logging.getLogger("daily_rollup")
+
+ROLLUP_DIRNAME = "daily_rollups"
+# Single-file layout used before month sharding; split into shards on first load
+LEGACY_ROLLUP_FILENAME = "daily_rollups.json"
+
+NUTRIENT_FIELDS = ("energy_kj", "protein_g", "fat_g", "carbs_g", "sodium_mg", "fiber_g")
+
+
+def _ledger_filename(date_str: str) -> str:
+    return f"ledger_{date_str}.jsonl"
+
+
+def record_contribution(rec: Dict[str, Any]) -> Dict[str, Any]:
+    """Nutrition contributed by one diet record (same rules as the old per-request sum)."""
+    totals = {k: 0.0 for k in NUTRIENT_FIELDS}
+
+    meal = rec.get("meal_summary") or {}
+    diet_time = None
+    if isinstance(meal, dict):
+        totals["energy_kj"] += float(meal.get("total_energy_kj") or 0.0)
+        diet_time = meal.get("diet_time")
+
+    dish_count = 0
+    for dish in rec.get("dishes") or []:
+        if not isinstance(dish, dict):
+            continue
+        dish_count += 1
+        for ing in dish.get("ingredients") or []:
+            if not isinstance(ing, dict):
+                continue
+            macros = ing.get("macros") or {}
+            totals["protein_g"] += float(macros.get("protein_g") or 0.0)
+            totals["fat_g"] += float(macros.get("fat_g") or 0.0)
+            totals["carbs_g"] += float(macros.get("carbs_g") or 0.0)
+            totals["sodium_mg"] += float(macros.get("sodium_mg") or 0.0)
+            totals["fiber_g"] += float(macros.get("fiber_g") or 0.0)
+
+    return {"totals": totals, "diet_time": diet_time, "dish_count": dish_count}
+
+
+def _occurs_on(rec: Dict[str, Any], date_str: str) -> bool:
+    """Same filter as RecordService.get_unified_records_range for a single day."""
+    t_str = rec.get("occurred_at")
+    if not t_str:
+        return False
+    try:
+        return datetime.fromisoformat(t_str).strftime("%Y-%m-%d") == date_str
+    except ValueError:
+        return False
+
+
+def _build_day(date_str: str, records: Iterable[Dict[str, Any]], signature) -> Dict[str, Any]:
+    contributions = {}
+    for i, rec in enumerate(records):
+        if not _occurs_on(rec, date_str):
+            continue
+        rid = rec.get("record_id") or f"_{i}"
+        contributions[rid] = record_contribution(rec)
+
+    totals = {k: 0.0 for k in NUTRIENT_FIELDS}
+    meal_counts: Dict[str, int] = {}
+    dish_count = 0
+    for contrib in contributions.values():
+        for k in NUTRIENT_FIELDS:
+            totals[k] += contrib["totals"][k]
+        if contrib["diet_time"]:
+            meal_counts[contrib["diet_time"]] = meal_counts.get(contrib["diet_time"], 0) + 1
+        dish_count += contrib["dish_count"]
+
+    return {
+        "date": date_str,
+        "sig": signature,
+        "record_count": len(contributions),
+        "dish_count": dish_count,
+        "meal_counts": meal_counts,
+        "totals": totals,
+        "records": contributions,
+    }
+
+
+class DailyRollupStore:
+    """Per-day rollups of one user's diet ledgers, sharded by month."""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.diet_dir = global_storage.base_dir / user_id / "diet"
+        self.rollup_dir = self.diet_dir / ROLLUP_DIRNAME
+        # {"YYYY-MM": {"YYYY-MM-DD": day}}, shards loaded on first access
+        self.months: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.lock = threading.RLock()
+        self._migrate_legacy()
+
+    def _month_path(self, month: str):
+        return self.rollup_dir / f"{month}.json"
+
+    def _month(self, month: str) -> Dict[str, Dict[str, Any]]:
+        days = self.months.get(month)
+        if days is None:
+            try:
+                days = json_codec.loads(self._month_path(month).read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError):
+                days = {}
+            self.months[month] = days
+        return days
+
+    def _save_month(self, month: str) -> None:
+        path = self._month_path(month)
+        try:
+            self.rollup_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(path.name + ".tmp")
+            tmp_path.write_text(
+                json_codec.dumps(self.months.get(month, {})), encoding="utf-8"
+            )
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Failed to save daily rollups %s: %s", path, e)
+
+    def _migrate_legacy(self) -> None:
+        legacy_path = self.diet_dir / LEGACY_ROLLUP_FILENAME
+        if not legacy_path.exists():
+            return
+        try:
+            days = json_codec.loads(legacy_path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            days = {}
+        for date_str, day in days.items():
+            self._month(date_str[:7])[date_str] = day
+        for month in list(self.months):
+            self._save_month(month)
+        try:
+            legacy_path.unlink()
+        except OSError as e:
+            logger.warning("Failed to remove legacy daily rollups %s: %s", legacy_path, e)
+
+    def _ledger_signature(self, date_str: str) -> Optional[List[int]]:
+        try:
+            st = os.stat(self.diet_dir / _ledger_filename(date_str))
+        except FileNotFoundError:
+            return None
+        return [st.st_size, st.st_mtime_ns]
+
+    def _rebuild_day(self, date_str: str, signature) -> Dict[str, Any]:
+        records = []
+        if signature is not None:
+            records = list(
+                reversed(
+                    global_storage.read_dataset(
+                        self.user_id, "diet", _ledger_filename(date_str), limit=9999
+                    )
+                )
+            )
+        return _build_day(date_str, records, signature)
+
+    def get_days(self, date_strs: List[str]) -> List[Dict[str, Any]]:
+        """Rollups for the given dates, rebuilding any that are missing or stale."""
+        with self.lock:
+            result = []
+            dirty_months = set()
+            for date_str in date_strs:
+                signature = self._ledger_signature(date_str)
+                month_days = self._month(date_str[:7])
+                day = month_days.get(date_str)
+                if day is None or day.get("sig") != signature:
+                    day = self._rebuild_day(date_str, signature)
+                    if signature is None:
+                        if month_days.pop(date_str, None) is None:
+                            result.append(day)
+                            continue
+                    else:
+                        month_days[date_str] = day
+                    dirty_months.add(date_str[:7])
+                result.append(day)
+            for month in dirty_months:
+                self._save_month(month)
+            return result
+
+    def on_ledger_written(self, date_str: str, records: List[Dict[str, Any]]) -> None:
+        """Recompute a day from the full record list that was just written to its ledger."""
+        with self.lock:
+            self._month(date_str[:7])[date_str] = _build_day(
+                date_str, records, self._ledger_signature(date_str)
+            )
+            self._save_month(date_str[:7])
+
+
+# region 进程级注册表
+
+_stores: Dict[str, DailyRollupStore] = {}
+_registry_lock = threading.Lock()
+
+
+def get_store(user_id: str) -> DailyRollupStore:
+    with _registry_lock:
+        store = _stores.get(user_id)
+        if store is None:
+            store = DailyRollupStore(user_id)
+            _stores[user_id] = store
+        return store
+
+
+def get_day(user_id: str, date_str: str) -> Dict[str, Any]:
+    """Rollup of one day (YYYY-MM-DD). Malformed dates yield an empty rollup."""
+    try:
+        datetime.strptime(date_str, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return _build_day(str(date_str), [], None)
+    return get_store(user_id).get_days([date_str])[0]
+
+
+def get_range(user_id: str, start: date, end: date) -> List[Dict[str, Any]]:
+    """Rollups of every day in [start, end], oldest first."""
+    date_strs = [
+        (start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((end - start).days + 1)
+    ]
+    return get_store(user_id).get_days(date_strs)
+
+
+def on_ledger_written(user_id: str, date_str: str, records: List[Dict[str, Any]]) -> None:
+    """Called by RecordService after a ledger write, with the day's records oldest first."""
+    try:
+        get_store(user_id).on_ledger_written(date_str, records)
+    except Exception as e:  # pylint: disable=broad-except
+        # The stale signature makes the next read rebuild the day
+        logger.warning("Daily rollup update failed for %s/%s: %s", user_id, date_str, e)
+
+
+def day_summary(day: Dict[str, Any], ignore_record_id: Optional[str] = None) -> Dict[str, float]:
+    """Totals of a day rollup, optionally excluding one record."""
+    if not ignore_record_id or ignore_record_id not in day["records"]:
+        return dict(day["totals"])
+    totals = {k: 0.0 for k in NUTRIENT_FIELDS}
+    for rid, contrib in day["records"].items():
+        if rid == ignore_record_id:
+            continue
+        for k in NUTRIENT_FIELDS:
+            totals[k] += contrib["totals"][k]
+    return totals
+
+
+# endregion
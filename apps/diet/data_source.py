@@ -2,21 +2,17 @@
 Data Source for Diet.
 """
 from typing import List, Dict, Any
+from apps.diet import product_store
 from libs.storage_lib import global_storage
 
 
 class ProductSource:
-    """raw data access for product_library.jsonl"""
+    """data access for product_library.jsonl (canonical view of the change log)"""
 
     @staticmethod
     def fetch_recent(user_id: str, limit: int = 2000) -> List[Dict[str, Any]]:
-        """Fetch raw products, latest first."""
-        return global_storage.read_dataset(
-            user_id=user_id,
-            category="diet",
-            filename="product_library.jsonl",
-            limit=limit,
-        )
+        """Fetch unique products, latest first."""
+        return product_store.get_store(user_id).latest(limit)
 
 
 class DishSource:
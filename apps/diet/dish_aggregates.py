@@ -0,0 +1,332 @@
+"""
+Dish Aggregates.
+
+Per-user running aggregates over dish_library.jsonl, keyed by dish name:
+occurrence counts, macro/weight sums, last_eaten and the latest entry.
+Updated whenever RecordService archives a dish, persisted as a compact
+sidecar (dish_library.aggregates.json), and rebuilt from the JSONL when the
+sidecar is missing or out of date.
+
+Readers (dish autocomplete, dish library endpoint) get precomputed views and
+do no per-request arithmetic.
+
+Rebuild command:
+    python -m apps.diet.dish_aggregates rebuild [user_id ...]
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from libs.storage_lib import global_storage
+from libs.utils.energy_units import macro_energy_kj
+from libs.utils import json_codec
+
+logger = logging.getLogger("dish_aggregates")
+
+SOURCE_FILENAME = "dish_library.jsonl"
+SIDECAR_FILENAME = "dish_library.aggregates.json"
+
+MACRO_FIELDS = ("protein_g", "fat_g", "carbs_g", "fiber_g", "sodium_mg")
+
+
+def _new_aggregate(name: str) -> Dict[str, Any]:
+    return {
+        "dish_name": name,
+        "count": 0,
+        "last_eaten": None,
+        "latest": None,  # newest entry
+        # Autocomplete averages: weights over all rows, divided by macro rows
+        "total_weight_sum": 0.0,
+        "macro_rows": 0,
+        "macro_sums": {k: 0.0 for k in MACRO_FIELDS},
+        # Rows with positive weight (dish library averages)
+        "weighted_rows": 0,
+        "weight_sum": 0.0,
+        "weighted_sums": {k: 0.0 for k in MACRO_FIELDS},
+        "latest_weighted": None,  # newest entry with positive weight
+    }
+
+
+def _add_entry(agg: Dict[str, Any], entry: Dict[str, Any]) -> None:
+    """Fold one dish_library row (newer than everything folded so far) into agg."""
+    agg["count"] += 1
+    agg["latest"] = entry
+    agg["last_eaten"] = entry.get("created_at")
+
+    weight = entry.get("recorded_weight_g", 0)
+    macros = entry.get("macros_per_100g") or {}
+
+    agg["total_weight_sum"] += weight or 0
+    if macros:
+        agg["macro_rows"] += 1
+        for k in MACRO_FIELDS:
+            agg["macro_sums"][k] += float(macros.get(k, 0) or 0)
+
+    if float(weight or 0) > 0:
+        agg["weighted_rows"] += 1
+        agg["weight_sum"] += float(weight)
+        for k in MACRO_FIELDS:
+            agg["weighted_sums"][k] += float(macros.get(k) or 0)
+        agg["latest_weighted"] = entry
+
+
+def _search_view(agg: Dict[str, Any]) -> Dict[str, Any]:
+    """View used by DishSearchService (autocomplete)."""
+    latest = agg["latest"] or {}
+    n = agg["macro_rows"]
+    if n > 0:
+        avg = {k: agg["macro_sums"][k] / n for k in MACRO_FIELDS}
+        # Recalculate Energy Density (kJ/100g) from macros for consistency
+        energy = macro_energy_kj(avg["protein_g"], avg["fat_g"], avg["carbs_g"])
+        macros = {
+            "energy_kj": round(energy, 2),
+            "protein_g": round(avg["protein_g"], 1),
+            "fat_g": round(avg["fat_g"], 1),
+            "carbs_g": round(avg["carbs_g"], 1),
+            "fiber_g": round(avg["fiber_g"], 1),
+            "sodium_mg": round(avg["sodium_mg"], 0),
+        }
+        weight = round(agg["total_weight_sum"] / n, 1)
+    else:
+        macros = latest.get("macros_per_100g", {})
+        weight = latest.get("recorded_weight_g", 100)
+
+    return {
+        "dish_name": agg["dish_name"],
+        "recorded_weight_g": weight,
+        "macros_per_100g": macros,
+        "count": agg["count"],  # Meta info: how many times eaten
+        "last_eaten": agg["last_eaten"],
+    }
+
+
+def _library_view(agg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """View used by the dish library endpoint; zero-weight rows are excluded."""
+    n = agg["weighted_rows"]
+    if n == 0:
+        return None
+    avg = {k: agg["weighted_sums"][k] / n for k in MACRO_FIELDS}
+    energy = macro_energy_kj(avg["protein_g"], avg["fat_g"], avg["carbs_g"])
+    latest = agg["latest_weighted"] or {}
+    return {
+        "dish_name": agg["dish_name"],
+        "recorded_weight_g": round(agg["weight_sum"] / n, 1),  # Average Weight
+        "macros_per_100g": {
+            "energy_kj": round(energy, 2),
+            "protein_g": round(avg["protein_g"], 2),
+            "fat_g": round(avg["fat_g"], 2),
+            "carbs_g": round(avg["carbs_g"], 2),
+            "sodium_mg": round(avg["sodium_mg"], 2),
+            "fiber_g": round(avg["fiber_g"], 2),
+        },
+        "ingredients_snapshot": latest.get("ingredients_snapshot", []),
+        "count": n,
+    }
+
+
+class DishAggregateStore:
+    """Running aggregates of one user's dish library."""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        diet_dir = global_storage.base_dir / user_id / "diet"
+        self.source_path = diet_dir / SOURCE_FILENAME
+        self.sidecar_path = diet_dir / SIDECAR_FILENAME
+
+        # dish_name -> aggregate, least recently eaten first
+        self.aggregates: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # dish names ordered by their latest positive-weight entry (library order)
+        self.weighted_order: "OrderedDict[str, None]" = OrderedDict()
+        # dish_name -> (search view, library view)
+        self.views: Dict[str, Tuple[Dict[str, Any], Optional[Dict[str, Any]]]] = {}
+        self.signature: Optional[List[int]] = None
+        self.lock = threading.RLock()
+        self._load()
+
+    def _current_signature(self) -> Optional[List[int]]:
+        try:
+            st = os.stat(self.source_path)
+        except FileNotFoundError:
+            return None
+        return [st.st_size, st.st_mtime_ns]
+
+    def _refresh_views(self, name: str) -> None:
+        agg = self.aggregates[name]
+        self.views[name] = (_search_view(agg), _library_view(agg))
+
+    def _load(self) -> None:
+        try:
+            data = json_codec.loads(self.sidecar_path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            data = None
+
+        if not data or data.get("signature") != self._current_signature():
+            self.rebuild()
+            return
+
+        self.signature = data["signature"]
+        for agg in data.get("dishes", []):
+            self.aggregates[agg["dish_name"]] = agg
+            self._refresh_views(agg["dish_name"])
+        self.weighted_order = OrderedDict.fromkeys(data.get("weighted_order", []))
+
+    def _save(self) -> None:
+        data = {
+            "signature": self.signature,
+            "dishes": list(self.aggregates.values()),
+            "weighted_order": list(self.weighted_order),
+        }
+        try:
+            self.sidecar_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.sidecar_path.with_name(self.sidecar_path.name + ".tmp")
+            tmp_path.write_text(
+                json_codec.dumps(data), encoding="utf-8"
+            )
+            os.replace(tmp_path, self.sidecar_path)
+        except OSError as e:
+            logger.warning("Failed to save dish aggregates %s: %s", self.sidecar_path, e)
+
+    def _fold(self, entry: Dict[str, Any]) -> None:
+        name = entry.get("dish_name", "")
+        if not name:
+            return
+        agg = self.aggregates.pop(name, None) or _new_aggregate(name)
+        _add_entry(agg, entry)
+        self.aggregates[name] = agg  # move to most recent
+        if agg["latest_weighted"] is entry:
+            self.weighted_order.pop(name, None)
+            self.weighted_order[name] = None
+        self._refresh_views(name)
+
+    def rebuild(self) -> int:
+        """Recompute all aggregates from dish_library.jsonl. Returns distinct dish count."""
+        with self.lock:
+            self.aggregates = OrderedDict()
+            self.weighted_order = OrderedDict()
+            self.views = {}
+            self.signature = self._current_signature()
+            if self.signature is not None:
+                with open(self.source_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            self._fold(json_codec.loads(line))
+                        except json.JSONDecodeError:
+                            continue
+            self._save()
+            return len(self.aggregates)
+
+    def ensure_fresh(self) -> None:
+        """Rebuild if dish_library.jsonl was changed without going through apply()."""
+        with self.lock:
+            if self.signature != self._current_signature():
+                logger.info("Dish aggregates for %s stale, rebuilding", self.user_id)
+                self.rebuild()
+
+    def apply(self) -> None:
+        """
+        Fold whatever was appended to dish_library.jsonl since the last fold.
+
+        _fold accumulates counts, so the appended rows are read back from the
+        file past the folded size (signature[0]) rather than taken from the
+        caller: with interleaved writers, the first apply folds both lines
+        and the second finds nothing new. Only a file that shrank or has no
+        folded state yet triggers a full rebuild.
+        """
+        with self.lock:
+            current = self._current_signature()
+            if current is None or self.signature is None or current[0] < self.signature[0]:
+                self.rebuild()
+                return
+            if current == self.signature:
+                return
+
+            offset = self.signature[0]
+            with open(self.source_path, "rb") as f:
+                f.seek(offset)
+                tail = f.read()
+            # Only complete lines; a concurrent append may still be mid-write
+            consumed = tail.rfind(b"\n") + 1
+            for line in tail[:consumed].splitlines():
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    self._fold(json_codec.loads(line))
+                except json.JSONDecodeError:
+                    continue
+            self.signature = [offset + consumed, current[1]]
+            self._save()
+
+    def search_view(self, name: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            views = self.views.get(name)
+            return views[0] if views else None
+
+    def library(self, limit: int) -> List[Dict[str, Any]]:
+        """Dish library views, most recently eaten (with positive weight) first."""
+        with self.lock:
+            result = []
+            for name in reversed(self.weighted_order):
+                result.append(self.views[name][1])
+                if len(result) >= limit:
+                    break
+            return result
+
+
+# region 进程级注册表
+
+_stores: Dict[str, DishAggregateStore] = {}
+_registry_lock = threading.Lock()
+
+
+def get_store(user_id: str) -> DishAggregateStore:
+    """Get (loading or building on first use) a user's dish aggregates."""
+    with _registry_lock:
+        store = _stores.get(user_id)
+        if store is None:
+            store = DishAggregateStore(user_id)
+            _stores[user_id] = store
+    store.ensure_fresh()
+    return store
+
+
+def on_dish_archived(user_id: str) -> None:
+    """Called by RecordService right after appending to dish_library.jsonl."""
+    try:
+        with _registry_lock:
+            store = _stores.get(user_id)
+        if store is not None:
+            store.apply()
+        # Not loaded yet: the stale signature triggers a rebuild on first read
+    except Exception as e:  # pylint: disable=broad-except
+        logger.warning("Dish aggregate update failed for %s: %s", user_id, e)
+
+
+def rebuild_all(user_ids: Optional[List[str]] = None) -> Dict[str, int]:
+    """Rebuild sidecars for the given users (default: every user with a dish library)."""
+    if not user_ids:
+        base = Path(global_storage.base_dir)
+        user_ids = sorted(
+            p.parent.parent.name for p in base.glob(f"*/diet/{SOURCE_FILENAME}")
+        )
+    return {user_id: DishAggregateStore(user_id).rebuild() for user_id in user_ids}
+
+
+# endregion
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("usage: python -m apps.diet.dish_aggregates rebuild [user_id ...]")
+        sys.exit(1)
+    for uid, dish_count in rebuild_all(sys.argv[2:]).items():
+        print(f"{uid}: {dish_count} dishes")
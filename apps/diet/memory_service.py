@@ -6,23 +6,21 @@ habitual food items.
 """
 
 from typing import List
-from apps.common.record_service import global_storage
+from apps.diet import product_store
 
 
 def get_product_memories(user_id: str, limit: int = 50) -> List[str]:
     """
-    Get user's recent product label memories (from product_library.jsonl).
+    Get user's recent product label memories (from the canonical product store).
     Used to help LLM recognize similar products.
 
     Logic:
-    - Read reversed (Newest first).
-    - Deduplicate by 'product_name'.
+    - Take the latest products (already unique per Brand+Name+Variant, newest first).
+    - Deduplicate by 'product_name' (variants of the same product).
     - Return formatted strings.
     """
     # pylint: disable=too-many-locals
-    records = global_storage.read_dataset(
-        user_id, "diet", "product_library.jsonl", limit=limit
-    )
+    records = product_store.get_store(user_id).latest(limit)
 
     seen_names = set()
     memories = []
@@ -0,0 +1,203 @@
+"""
+Product Store.
+
+Canonical product table over product_library.jsonl: one row per
+(brand, product_name, variant), ordered by recency.
+
+product_library.jsonl is used as an append-only change log: every label
+capture appends its upserted row, and when the log is loaded later rows win
+over earlier ones for the same key. Once the log holds COMPACT_SLACK more
+lines than live products it is compacted (atomically rewritten with one row
+per product, oldest first), so the file on disk always reads as a valid
+product library.
+
+Readers (LLM product memories, food search, product library endpoint) get the
+deduplicated view directly.
+
+Compaction command:
+    python -m apps.diet.product_store compact [user_id ...]
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from apps.common.search_index import product_key
+from libs.storage_lib import global_storage
+from libs.utils.text_utils.pinyin_util import extract_phonetics
+from libs.utils import json_codec
+
+logger = logging.getLogger("product_store")
+
+LIBRARY_FILENAME = "product_library.jsonl"
+
+# Compact the log once it holds this many lines more than live products
+COMPACT_SLACK = 200
+
+ProductKey = Tuple[str, str, str]
+
+
+class ProductStore:
+    """Canonical products of one user, backed by product_library.jsonl."""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.path = global_storage.base_dir / user_id / "diet" / LIBRARY_FILENAME
+
+        # product_key -> latest row, least recently upserted first
+        self.products: "OrderedDict[ProductKey, Dict[str, Any]]" = OrderedDict()
+        self.log_lines = 0
+        self.signature: Optional[List[int]] = None
+        self.lock = threading.RLock()
+        self._load()
+
+    def _current_signature(self) -> Optional[List[int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return [st.st_size, st.st_mtime_ns]
+
+    def _put(self, row: Dict[str, Any]) -> None:
+        key = product_key(row)
+        self.products.pop(key, None)
+        self.products[key] = row
+
+    def _load(self) -> None:
+        with self.lock:
+            self.products = OrderedDict()
+            self.log_lines = 0
+            self.signature = self._current_signature()
+            if self.signature is None:
+                return
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        self._put(json_codec.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+                    self.log_lines += 1
+
+    def ensure_fresh(self) -> None:
+        """Reload if product_library.jsonl was changed by someone else."""
+        with self.lock:
+            if self.signature != self._current_signature():
+                logger.info("Product store for %s stale, reloading", self.user_id)
+                self._load()
+
+    def compact(self) -> None:
+        """Rewrite the log with one row per product."""
+        with self.lock:
+            lines = [json_codec.dumps(row) for row in self.products.values()]
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.path.with_name(self.path.name + ".tmp")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write("".join(line + "\n" for line in lines))
+                os.replace(tmp_path, self.path)
+                self.log_lines = len(lines)
+                self.signature = self._current_signature()
+            except OSError as e:
+                logger.warning("Failed to compact product library %s: %s", self.path, e)
+
+    def upsert(self, labels: List[Dict[str, Any]], now: Optional[datetime] = None) -> None:
+        """
+        Upsert captured labels by (brand, product_name, variant).
+        Labels are completed in place (pinyin_initials, updated_at, created_at
+        preserved from the existing product) and appended to the log.
+        """
+        now = now or datetime.now()
+        with self.lock:
+            self.ensure_fresh()
+            lines = []
+            for label in labels:
+                p_name = label.get("product_name", "")
+                if p_name:
+                    phonetics = extract_phonetics(p_name)
+                    label["pinyin_initials"] = phonetics.get("pinyin_initials", [])
+
+                label["updated_at"] = now.isoformat()
+
+                existing = self.products.get(product_key(label))
+                if existing and existing.get("created_at"):
+                    label["created_at"] = existing["created_at"]
+                elif "created_at" not in label:
+                    label["created_at"] = now.isoformat()
+
+                self._put(label)
+                lines.append(json_codec.dumps(label))
+
+            if not lines:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(line + "\n" for line in lines))
+            self.log_lines += len(lines)
+            self.signature = self._current_signature()
+
+            if self.log_lines > len(self.products) + COMPACT_SLACK:
+                self.compact()
+
+    def latest(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Canonical products, most recently upserted first."""
+        with self.lock:
+            result = []
+            for key in reversed(self.products):
+                if len(result) >= limit:
+                    break
+                result.append(self.products[key])
+            return result
+
+    def get(self, key: ProductKey) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            return self.products.get(key)
+
+
+# region 进程级注册表
+
+_stores: Dict[str, ProductStore] = {}
+_registry_lock = threading.Lock()
+
+
+def get_store(user_id: str) -> ProductStore:
+    """Get (loading on first use) a user's product store."""
+    with _registry_lock:
+        store = _stores.get(user_id)
+        if store is None:
+            store = ProductStore(user_id)
+            _stores[user_id] = store
+    store.ensure_fresh()
+    return store
+
+
+def compact_all(user_ids: Optional[List[str]] = None) -> Dict[str, int]:
+    """Compact product libraries (default: every user that has one)."""
+    if not user_ids:
+        base = Path(global_storage.base_dir)
+        user_ids = sorted(p.parent.parent.name for p in base.glob(f"*/diet/{LIBRARY_FILENAME}"))
+    result = {}
+    for user_id in user_ids:
+        store = get_store(user_id)
+        store.compact()
+        result[user_id] = len(store.products)
+    return result
+
+
+# endregion
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "compact":
+        print("usage: python -m apps.diet.product_store compact [user_id ...]")
+        sys.exit(1)
+    for uid, product_count in compact_all(sys.argv[2:]).items():
+        print(f"{uid}: {product_count} products")
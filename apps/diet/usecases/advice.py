@@ -74,7 +74,7 @@ class DietAdviceUsecase:
         recent_messages = []
         if dialogue_id:
             try:
-                svc = DialogueService(user_id) # Direct instantiation for internal use
+                svc = DialogueService.for_user(user_id)
                 dialogue = svc.get_dialogue(dialogue_id)
                 if dialogue and dialogue.messages:
                     recent_messages = dialogue.messages[-10:] # Last 10 messages
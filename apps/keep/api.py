@@ -170,8 +170,8 @@ def build_keep_router(settings: BackendSettings) -> APIRouter:
         """Generic processing logic for all Keep parsing endpoints."""
         # pylint: disable=too-many-arguments, too-many-locals
         
-        # [Access Check]
-        access = Gatekeeper.check_access(user_id, "analyze")
+        # [Access Check] (charged up front, refunded if parsing fails)
+        access = Gatekeeper.consume_access(user_id, "analyze")
         if not access["allowed"]:
             raise HTTPException(
                 status_code=403,
@@ -191,7 +191,6 @@ def build_keep_router(settings: BackendSettings) -> APIRouter:
         logger.info(access_log)
 
         async with semaphore:
-            await limiter.check_and_wait()
             use_limited = False
             if event_type_for_save in ("dimensions", "unified"):
                 # Check if user has detail_dimension feature unlocked
@@ -199,23 +198,29 @@ def build_keep_router(settings: BackendSettings) -> APIRouter:
                 use_limited = not access.get("allowed", False)
 
             scene = f"keep_{event_type_for_save}"
-            if event_type_for_save in ("dimensions", "unified"):
-                result = await usecase.execute_with_image_bytes_async(
-                    user_note=user_note,
-                    images_bytes=images_bytes,
-                    use_limited=use_limited,
-                    scene=scene,
-                    user_id=user_id,
-                )
-            else:
-                result = await usecase.execute_with_image_bytes_async(
-                    user_note=user_note, 
-                    images_bytes=images_bytes,
-                    scene=scene,
-                    user_id=user_id,
-                )
+            try:
+                await limiter.check_and_wait()
+                if event_type_for_save in ("dimensions", "unified"):
+                    result = await usecase.execute_with_image_bytes_async(
+                        user_note=user_note,
+                        images_bytes=images_bytes,
+                        use_limited=use_limited,
+                        scene=scene,
+                        user_id=user_id,
+                    )
+                else:
+                    result = await usecase.execute_with_image_bytes_async(
+                        user_note=user_note, 
+                        images_bytes=images_bytes,
+                        scene=scene,
+                        user_id=user_id,
+                    )
+            except BaseException:
+                Gatekeeper.refund_usage(user_id, "analyze")
+                raise
 
             if isinstance(result, dict) and result.get("error"):
+                Gatekeeper.refund_usage(user_id, "analyze")
                 return response_model(success=False, error=str(result.get("error")))
 
             if use_limited:
@@ -248,9 +253,6 @@ def build_keep_router(settings: BackendSettings) -> APIRouter:
                         user_id, event_type_for_save, result, image_hashes, occurred_dt
                     )
 
-            # Record usage for analyze feature
-            Gatekeeper.record_usage(user_id, "analyze")
-
             return response_model(
                 success=True, result=result, saved_status=saved_status
             )
@@ -66,8 +66,8 @@ def build_profile_router(settings: BackendSettings) -> APIRouter:
         AI 分析用户请求并给出 Profile 修改建议。
         如果 auto_save=True，则自动应用建议。
         """
-        # 1. Access Control
-        access = Gatekeeper.check_access(user_id, "profile")
+        # 1. Access Control (charged up front, refunded if the analysis fails)
+        access = Gatekeeper.consume_access(user_id, "profile")
         if not access["allowed"]:
             raise HTTPException(
                 status_code=403, 
@@ -83,7 +83,7 @@ def build_profile_router(settings: BackendSettings) -> APIRouter:
         warning_message = None
         
         if images_bytes:
-            img_access = Gatekeeper.check_access(user_id, "image_analyze", amount=len(images_bytes))
+            img_access = Gatekeeper.consume_access(user_id, "image_analyze", amount=len(images_bytes))
             if not img_access["allowed"]:
                 # Limit reached: degrade to text-only mode and warn
                 images_bytes = []
@@ -91,20 +91,22 @@ def build_profile_router(settings: BackendSettings) -> APIRouter:
                 logger.info(f"User {user_id} image limit reached for profile, processing text only.")
 
         usecase = AnalyzeProfileUsecase(settings)
-        result = await usecase.execute(
-            user_id, 
-            req.user_note, 
-            req.target_months, 
-            req.auto_save,
-            req.profile_override,
-            req.metrics_override,
-            images=images_bytes
-        )
-        
-        # 2. Record Usage
-        Gatekeeper.record_usage(user_id, "profile")
-        if images_bytes:
-            Gatekeeper.record_usage(user_id, "image_analyze", amount=len(images_bytes))
+        try:
+            result = await usecase.execute(
+                user_id, 
+                req.user_note, 
+                req.target_months, 
+                req.auto_save,
+                req.profile_override,
+                req.metrics_override,
+                images=images_bytes
+            )
+        except BaseException:
+            # 2. Refund Usage
+            Gatekeeper.refund_usage(user_id, "profile")
+            if images_bytes:
+                Gatekeeper.refund_usage(user_id, "image_analyze", amount=len(images_bytes))
+            raise
             
         if warning_message:
             result.warning = warning_message
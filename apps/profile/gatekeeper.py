@@ -70,16 +70,10 @@ class Gatekeeper:
         return "expired", None
 
     @staticmethod
-    def check_access(user_id: str, feature: str, amount: int = 1) -> dict:
+    def _resolve_limit(user_id: str, feature: str):
         """
-        Check if user can access feature.
-        
-        Logic:
-        1. Locked Features (in locked_features list):
-           - Requires feature in user's whitelist_features
-        2. Standard Features:
-           - Check per-level daily limit from config
-           - -1 = unlimited
+        Returns (denial_or_None, limit, current_level).
+        Profile comes from ProfileService's cache, so no file I/O on the hot path.
         """
         profile = ProfileService.load_profile(user_id)
         current_level, expiry = Gatekeeper.get_current_effective_level(profile)
@@ -88,12 +82,12 @@ class Gatekeeper:
         locked_features = Gatekeeper.get_locked_features()
         if feature in locked_features:
             if feature in profile.whitelist_features:
-                return {"allowed": True, "reason": "Feature Unlocked"}
+                return {"allowed": True, "reason": "Feature Unlocked"}, -1, current_level
             return {
                 "allowed": False,
                 "code": "FEATURE_LOCKED",
                 "reason": f"此功能需要单独解锁"
-            }
+            }, None, current_level
         
         # --- 2. Check expiry ---
         if current_level == "expired":
@@ -101,25 +95,20 @@ class Gatekeeper:
                 "allowed": False,
                 "code": "SUBSCRIPTION_EXPIRED",
                 "reason": "订阅已过期，请续费"
-            }
+            }, None, current_level
         
-        # --- 3. Check per-level daily limit ---
+        # --- 3. Per-level daily limit ---
         limits = Gatekeeper.get_limits()
         feature_limits = limits.get(feature, {})
         
         # Get limit for current level (default: 5 for basic, 10 for pro, -1 for ultra)
         default_limits = {"basic": 5, "pro": 10, "ultra": -1}
         limit = feature_limits.get(current_level, default_limits.get(current_level, 5))
-        
-        # -1 means unlimited
-        if limit == -1:
-            return {"allowed": True, "reason": f"Unlimited ({current_level})"}
-        
-        # Check usage
-        usage = UsageTracker.get_today_usage(user_id)
-        current = usage.get(feature, 0)
-        
-        if current + amount > limit:
+        return None, limit, current_level
+
+    @staticmethod
+    def _limit_result(allowed: bool, current: int, limit: int) -> dict:
+        if not allowed:
             return {
                 "allowed": False,
                 "code": "DAILY_LIMIT_REACHED",
@@ -127,7 +116,6 @@ class Gatekeeper:
                 "current": current,
                 "reason": f"今日次数已用完 ({current}/{limit})"
             }
-        
         remaining = limit - current
         return {
             "allowed": True,
@@ -136,6 +124,53 @@ class Gatekeeper:
             "limit": limit
         }
 
+    @staticmethod
+    def check_access(user_id: str, feature: str, amount: int = 1) -> dict:
+        """
+        Check if user can access feature.
+        
+        Logic:
+        1. Locked Features (in locked_features list):
+           - Requires feature in user's whitelist_features
+        2. Standard Features:
+           - Check per-level daily limit from config
+           - -1 = unlimited
+        """
+        decided, limit, current_level = Gatekeeper._resolve_limit(user_id, feature)
+        if decided:
+            return decided
+        
+        # -1 means unlimited
+        if limit == -1:
+            return {"allowed": True, "reason": f"Unlimited ({current_level})"}
+        
+        # Check usage (in-memory ledger)
+        usage = UsageTracker.get_today_usage(user_id)
+        current = usage.get(feature, 0)
+        return Gatekeeper._limit_result(current + amount <= limit, current, limit)
+
+    @staticmethod
+    def consume_access(user_id: str, feature: str, amount: int = 1) -> dict:
+        """
+        Check and record usage in one atomic step (charged up front).
+        Same result shape as check_access; on success the usage is already recorded.
+        """
+        decided, limit, current_level = Gatekeeper._resolve_limit(user_id, feature)
+        if decided:
+            if decided["allowed"]:
+                UsageTracker.increment_usage(user_id, feature, amount)
+            return decided
+
+        allowed, current = UsageTracker.check_and_increment(user_id, feature, amount, limit)
+        if limit == -1:
+            return {"allowed": True, "reason": f"Unlimited ({current_level})"}
+        return Gatekeeper._limit_result(allowed, current, limit)
+
     @staticmethod
     def record_usage(user_id: str, feature: str, amount: int = 1):
         UsageTracker.increment_usage(user_id, feature, amount)
+
+    @staticmethod
+    def refund_usage(user_id: str, feature: str, amount: int = 1):
+        """Undo a consume_access charge when the paid-for call failed."""
+        UsageTracker.refund_usage(user_id, feature, amount)
@@ -1,5 +1,6 @@
 import json
 import shutil
+import threading
 from pathlib import Path
 from datetime import date, datetime
 from typing import Optional, Dict, Any
@@ -31,6 +32,11 @@ def _birth_date_from_age(age: int) -> str:
 
 
 class ProfileService:
+    # 进程内 Profile 缓存 {user_id: UserProfile}；profile.json 只经 save_profile 写入，
+    # 因此在 save_profile 里同步更新即可保持一致，读路径不再访问磁盘
+    _cache: Dict[str, UserProfile] = {}
+    _cache_lock = threading.Lock()
+
     @staticmethod
     def get_profile_path(user_id: str) -> Path:
         # user_data/u123/profile.json
@@ -68,6 +74,15 @@ class ProfileService:
 
     @staticmethod
     def load_profile(user_id: str) -> UserProfile:
+        """返回 Profile 副本（调用方可随意修改，需 save_profile 才生效）"""
+        with ProfileService._cache_lock:
+            cached = ProfileService._cache.get(user_id)
+        if cached is not None:
+            return cached.model_copy(deep=True)
+        return ProfileService._load_profile_from_disk(user_id)
+
+    @staticmethod
+    def _load_profile_from_disk(user_id: str) -> UserProfile:
         path = ProfileService.get_profile_path(user_id)
         if not path.exists():
             # New user entry point
@@ -84,6 +99,8 @@ class ProfileService:
             # Migration for existing users
             if ProfileService._ensure_account_info(user_id, p):
                 ProfileService.save_profile(user_id, p)
+            else:
+                ProfileService._cache_put(user_id, p)
             return p
         except Exception as e:
             # Fallback to default if corrupted
@@ -137,3 +154,11 @@ class ProfileService:
         
         with open(path, "w", encoding="utf-8") as f:
             f.write(profile.model_dump_json(indent=2))
+
+        ProfileService._cache_put(user_id, profile)
+
+    @staticmethod
+    def _cache_put(user_id: str, profile: UserProfile):
+        snapshot = profile.model_copy(deep=True)
+        with ProfileService._cache_lock:
+            ProfileService._cache[user_id] = snapshot
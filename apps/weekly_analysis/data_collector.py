@@ -12,6 +12,7 @@ from libs.storage_lib import global_storage
 from libs.core.config_loader import load_json
 from libs.core.project_paths import get_project_root
 from apps.common.record_service import RecordService
+from apps.diet import daily_rollup
 
 
 @dataclass
@@ -24,6 +25,8 @@ class WeeklyDataBundle:
 
     # Diet data
     diet_records: List[Dict] = field(default_factory=list)
+    # Per-day nutrition totals (apps.diet.daily_rollup), oldest first
+    daily_rollups: List[Dict] = field(default_factory=list)
     dish_library: List[Dict] = field(default_factory=list)
 
     # Keep data
@@ -60,12 +63,8 @@ class WeeklyDataBundle:
         if total_scale_points < 2:
             return False
         # Check diet coverage
-        diet_dates = set()
-        for r in self.diet_records:
-            occ = r.get("occurred_at", "")[:10]
-            if occ:
-                diet_dates.add(occ)
-        return len(diet_dates) >= 3
+        diet_days = sum(1 for day in self.daily_rollups if day["record_count"] > 0)
+        return diet_days >= 3
 
     @property
     def has_dimension_comparison(self) -> bool:
@@ -155,6 +154,7 @@ def collect_weekly_data(
     bundle.diet_records = RecordService.get_diet_records_range(
         user_id, start_str, end_str
     )
+    bundle.daily_rollups = daily_rollup.get_range(user_id, week_start, week_end)
 
     # 2. Collect Dish Library (most recent N entries)
     all_dishes = global_storage.read_dataset(
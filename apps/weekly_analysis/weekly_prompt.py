@@ -123,31 +123,17 @@ def _format_dish_library_for_prompt(dishes: List[Dict], limit: int = 30) -> str:
     return "\n".join(lines)
 
 
-def _calculate_daily_sodium_totals(records: List[Dict]) -> str:
-    """计算每日钠摄入汇总，用于交叉分析"""
-    if not records:
-        return "无数据"
-
-    daily_sodium = {}
-    for rec in records:
-        occurred = rec.get("occurred_at", "")[:10]
-        if not occurred:
-            continue
-
-        if occurred not in daily_sodium:
-            daily_sodium[occurred] = 0.0
-
-        for dish in rec.get("dishes", []):
-            for ing in dish.get("ingredients", []):
-                macros = ing.get("macros", {})
-                daily_sodium[occurred] += float(macros.get("sodium_mg", 0) or 0)
-
+def _calculate_daily_sodium_totals(daily_rollups: List[Dict]) -> str:
+    """计算每日钠摄入汇总，用于交叉分析（读取每日汇总）"""
     lines = []
-    for d, na in sorted(daily_sodium.items()):
+    for day in daily_rollups:
+        if not day["record_count"]:
+            continue
+        na = day["totals"]["sodium_mg"]
         warning = " ⚠️高" if na > 2300 else ""
-        lines.append(f"{d}: {na:.0f}mg{warning}")
+        lines.append(f"{day['date']}: {na:.0f}mg{warning}")
 
-    return "\n".join(lines)
+    return "\n".join(lines) if lines else "无数据"
 
 
 def build_weekly_analysis_prompt(bundle: WeeklyDataBundle) -> str:
@@ -175,7 +161,7 @@ def build_weekly_analysis_prompt(bundle: WeeklyDataBundle) -> str:
     dish_library = _format_dish_library_for_prompt(bundle.dish_library)
 
     # 新增：钠摄入汇总（用于交叉分析）
-    sodium_summary = _calculate_daily_sodium_totals(bundle.diet_records)
+    sodium_summary = _calculate_daily_sodium_totals(bundle.daily_rollups)
 
     # User profile and preferences
     profile_str = json.dumps(bundle.user_profile, ensure_ascii=False, indent=2) if bundle.user_profile else "无"
@@ -184,7 +170,7 @@ def build_weekly_analysis_prompt(bundle: WeeklyDataBundle) -> str:
     # Data counts for context
     summary = bundle.to_summary()
     diet_count = len(bundle.diet_records)
-    dish_count = sum(len(r.get("dishes", [])) for r in bundle.diet_records)
+    dish_count = sum(day["dish_count"] for day in bundle.daily_rollups)
     scale_count = summary["scale_record_count"]
 
     prompt = f"""## 角色设定
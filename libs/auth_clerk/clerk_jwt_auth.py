@@ -3,11 +3,19 @@ Clerk JWT Authentication.
 
 Provides JWT verification for Clerk-authenticated users.
 Uses PyJWT with JWKS for signature verification.
+
+Verified payloads are cached by token hash until `exp - leeway`, and recently
+rejected tokens are remembered for a short while, so the parallel API calls
+a page fires with the same token only pay for one RS256 verification. The
+JWKS is refreshed in the background before it expires.
 """
 
+import hashlib
 import logging
+import threading
 import time
-from typing import Optional, List
+from collections import OrderedDict, deque
+from typing import Optional, List, Tuple
 from dataclasses import dataclass
 
 import jwt
@@ -30,6 +38,23 @@ class ClerkJWTConfig:
     # Cache JWKS keys for performance (seconds)
     jwks_cache_seconds: int = 300
 
+    # Max number of verified tokens kept in memory
+    verified_cache_size: int = 1024
+
+    # How long a rejected token is rejected without re-verification (seconds)
+    negative_cache_seconds: int = 30
+
+
+# Clock skew tolerance for exp/nbf (seconds)
+LEEWAY_SECONDS = 60
+
+# Verified tokens are served from cache until this many seconds before exp.
+# Kept small: Clerk's default session tokens live only ~60s.
+CACHE_MARGIN_SECONDS = 5
+
+# Number of recent verification latencies kept for metrics
+LATENCY_SAMPLES = 512
+
 
 class ClerkJWTAuth:
     """
@@ -41,6 +66,18 @@ class ClerkJWTAuth:
     def __init__(self, config: Optional[ClerkJWTConfig] = None):
         self.config = config
         self._jwks_client: Optional[PyJWKClient] = None
+
+        # token hash -> (payload, valid_until)，最近使用的在末尾
+        self._verified: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        # token hash -> rejected_until
+        self._rejected: "OrderedDict[str, float]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        self._latencies_ms: deque = deque(maxlen=LATENCY_SAMPLES)
+        self._counters = {"cache_hits": 0, "negative_hits": 0, "verified": 0, "rejected": 0}
+
+        self._refresh_stop = threading.Event()
+        self._refresh_thread: Optional[threading.Thread] = None
         
         if config and config.jwks_url:
             self._init_jwks_client()
@@ -57,15 +94,44 @@ class ClerkJWTAuth:
         except Exception as e:
             logger.error("Failed to initialize Clerk JWKS client: %s", e)
             self._jwks_client = None
+            return
+
+        self._refresh_thread = threading.Thread(
+            target=self._refresh_jwks_loop, name="clerk-jwks-refresh", daemon=True
+        )
+        self._refresh_thread.start()
+
+    def _refresh_jwks_loop(self) -> None:
+        """后台刷新 JWKS，在缓存过期前完成，避免请求路径上同步拉取。"""
+        interval = max(30, int(self.config.jwks_cache_seconds * 0.8))
+        while True:
+            try:
+                self._jwks_client.get_jwk_set(refresh=True)
+                logger.debug("Clerk JWKS refreshed")
+            except Exception as e:
+                # 失败时请求路径仍会按需拉取
+                logger.warning("Clerk JWKS background refresh failed: %s", e)
+            if self._refresh_stop.wait(interval):
+                return
+
+    def close(self) -> None:
+        """Stop the background JWKS refresh."""
+        self._refresh_stop.set()
     
     def is_enabled(self) -> bool:
         """Check if Clerk JWT auth is enabled."""
         return self._jwks_client is not None
     
+    @staticmethod
+    def _token_key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
     def verify_token(self, token: str) -> Optional[dict]:
         """
         验证 Clerk JWT token。
         
+        同一 token 的重复请求直接命中缓存（已通过 / 近期被拒），不再做 RS256 验签。
+        
         Args:
             token: JWT token (不含 "Bearer " 前缀)
             
@@ -75,14 +141,63 @@ class ClerkJWTAuth:
         if not self.is_enabled():
             logger.warning("Clerk JWT auth not enabled, skipping verification")
             return None
+
+        key = self._token_key(token)
+        now = time.time()
+        with self._cache_lock:
+            hit = self._verified.get(key)
+            if hit is not None:
+                payload, valid_until = hit
+                if now < valid_until:
+                    self._verified.move_to_end(key)
+                    self._counters["cache_hits"] += 1
+                    return dict(payload)
+                del self._verified[key]
+
+            rejected_until = self._rejected.get(key)
+            if rejected_until is not None:
+                if now < rejected_until:
+                    self._counters["negative_hits"] += 1
+                    return None
+                del self._rejected[key]
+
+        started = time.perf_counter()
+        payload, cacheable = self._verify_uncached(token)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        with self._cache_lock:
+            self._latencies_ms.append(elapsed_ms)
+            if payload is not None:
+                self._counters["verified"] += 1
+                valid_until = payload.get("exp", 0) - CACHE_MARGIN_SECONDS
+                if valid_until > time.time():
+                    self._verified[key] = (payload, valid_until)
+                    while len(self._verified) > self.config.verified_cache_size:
+                        self._verified.popitem(last=False)
+                return dict(payload)
+
+            self._counters["rejected"] += 1
+            if cacheable:
+                self._rejected[key] = time.time() + self.config.negative_cache_seconds
+                while len(self._rejected) > self.config.verified_cache_size:
+                    self._rejected.popitem(last=False)
+            return None
+
+    def _verify_uncached(self, token: str) -> Tuple[Optional[dict], bool]:
+        """
+        Full JWKS lookup + RS256 verification.
         
+        Returns (payload or None, whether a rejection may be negatively cached).
+        Errors fetching keys (network, unknown kid during key rotation) are
+        not cached, so the next request retries.
+        """
         try:
             # 1. Get signing key from JWKS
             signing_key = self._jwks_client.get_signing_key_from_jwt(token)
             
             # 2. Decode and verify token
             # Add 60s leeway for clock skew issues (essential for distributed systems)
-            leeway = 60
+            leeway = LEEWAY_SECONDS
             payload = jwt.decode(
                 token,
                 signing_key.key,
@@ -102,38 +217,55 @@ class ClerkJWTAuth:
             
             if exp < current_time - leeway:
                 logger.warning("Clerk JWT expired: exp=%s, now=%s (leeway=%ss)", exp, current_time, leeway)
-                return None
+                return None, True
             
             if nbf > current_time + leeway:
                 logger.warning("Clerk JWT not yet valid: nbf=%s, now=%s (leeway=%ss)", nbf, current_time, leeway)
-                return None
+                return None, True
             
             # 4. Validate authorized party (azp claim) if present
             azp = payload.get("azp")
             if azp and self.config.authorized_parties:
                 if azp not in self.config.authorized_parties:
                     logger.warning("Clerk JWT invalid azp: %s not in %s", azp, self.config.authorized_parties)
-                    return None
+                    return None, True
             
             # 5. Check for pending status (Organizations feature)
             sts = payload.get("sts")
             if sts == "pending":
                 logger.warning("Clerk JWT user status is pending")
-                return None
+                return None, True
             
             logger.debug("Clerk JWT verified successfully: sub=%s", payload.get("sub"))
-            return payload
+            return payload, True
             
         except jwt.ExpiredSignatureError:
             logger.warning("Clerk JWT expired signature")
-            return None
+            return None, True
         except jwt.InvalidTokenError as e:
             logger.warning("Clerk JWT invalid: %s", e)
-            return None
+            return None, True
         except Exception as e:
             logger.error("Clerk JWT verification error: %s", e)
-            return None
+            return None, False
     
+    def get_metrics(self) -> dict:
+        """Cache counters and latency (ms) of recent full verifications."""
+        with self._cache_lock:
+            samples = sorted(self._latencies_ms)
+            metrics = dict(self._counters)
+            metrics["verified_cache_size"] = len(self._verified)
+            metrics["rejected_cache_size"] = len(self._rejected)
+        if samples:
+            metrics["verify_latency_ms"] = {
+                "count": len(samples),
+                "avg": round(sum(samples) / len(samples), 3),
+                "p50": round(samples[len(samples) // 2], 3),
+                "p95": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+                "max": round(samples[-1], 3),
+            }
+        return metrics
+
     def get_user_id(self, token: str) -> Optional[str]:
         """
         从 JWT 中提取用户 ID。
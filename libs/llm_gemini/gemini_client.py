@@ -20,6 +20,7 @@ from google import genai
 from google.genai import types
 
 from libs.api_keys.api_key_manager import APIKeyManager
+from libs.utils import json_codec
 
 logger = logging.getLogger(__name__)
 
@@ -93,8 +94,7 @@ class GeminiFilesCache:
     def _load_cache(self):
         if os.path.exists(self.cache_file):
             try:
-                with open(self.cache_file, "r", encoding="utf-8") as f:
-                    self.cache = json.load(f)
+                self.cache = json_codec.load_file(self.cache_file)
             except (json.JSONDecodeError, OSError) as e:
                 logger.warning("Failed to load gemini cache (resetting): %s", e)
                 self.cache = {}
@@ -104,8 +104,7 @@ class GeminiFilesCache:
 
     def _save_cache(self):
         try:
-            with open(self.cache_file, "w", encoding="utf-8") as f:
-                json.dump(self.cache, f, ensure_ascii=False, indent=2)
+            json_codec.dump_file(self.cache_file, self.cache)
         except OSError as e:
             logger.warning("Failed to save gemini cache: %s", e)
 
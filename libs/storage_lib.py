@@ -11,6 +11,8 @@ from pathlib import Path
 from typing import Any, Dict, List
 import shutil
 
+from libs.utils import json_codec
+
 class JsonlStorage:
     """
     一个线程安全、进程安全（基于 fcntl/locking，但在 Windows 上简化为追加）的 JSONL 存储器。
@@ -44,7 +46,7 @@ class JsonlStorage:
             data["created_at"] = datetime.now().isoformat()
 
         # 序列化
-        line = json.dumps(data, ensure_ascii=False)
+        line = json_codec.dumps(data)
 
         # Windows 下简单的追加写（此时不引入复杂的文件锁，依靠 OS 原子追加特性）
         # 注意：在极高并发下可能需要更严谨的锁，但在 Bot 场景下足够
@@ -77,7 +79,7 @@ class JsonlStorage:
             if not line:
                 continue
             try:
-                data.append(json.loads(line))
+                data.append(json_codec.loads(line))
             except json.JSONDecodeError:
                 continue
 
@@ -108,7 +110,7 @@ class JsonlStorage:
             # Ensure serialization
             if "created_at" not in item:
                 item["created_at"] = datetime.now().isoformat()
-            lines.append(json.dumps(item, ensure_ascii=False))
+            lines.append(json_codec.dumps(item))
 
         # Write atomic (or somewhat atomic on Windows via rename ideally, but simple overwrite here)
         with open(file_path, "w", encoding="utf-8") as f:
@@ -0,0 +1,85 @@
+"""
+JSON codec.
+
+Single entry point for JSON (de)serialization on hot paths (JSONL storage,
+caches, sidecars, API responses). Uses orjson when it is installed and falls
+back to the stdlib json module otherwise; both produce UTF-8 text with
+non-ASCII characters kept as-is, so files written by either read the same.
+
+Two output modes:
+- compact (default): no whitespace, for JSONL lines, caches and indexes
+- pretty: 2-space indent, for files people open by hand (profile, cards)
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+HAS_ORJSON = orjson is not None
+
+if HAS_ORJSON:
+    _ORJSON_COMPACT = orjson.OPT_NON_STR_KEYS
+    _ORJSON_PRETTY = orjson.OPT_NON_STR_KEYS | orjson.OPT_INDENT_2
+
+PathLike = Union[str, Path]
+
+
+def _stdlib_dumps(obj: Any, pretty: bool) -> str:
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def dumpb(obj: Any, pretty: bool = False) -> bytes:
+    """Serialize to UTF-8 bytes."""
+    if HAS_ORJSON:
+        try:
+            return orjson.dumps(obj, option=_ORJSON_PRETTY if pretty else _ORJSON_COMPACT)
+        except TypeError:
+            # orjson is stricter (e.g. ints beyond 64 bits, subclassed keys); let stdlib decide
+            pass
+    return _stdlib_dumps(obj, pretty).encode("utf-8")
+
+
+def dumps(obj: Any, pretty: bool = False) -> str:
+    """Serialize to str."""
+    if HAS_ORJSON:
+        return dumpb(obj, pretty).decode("utf-8")
+    return _stdlib_dumps(obj, pretty)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """
+    Parse JSON from str or bytes.
+    Raises json.JSONDecodeError on malformed input with either backend
+    (orjson.JSONDecodeError subclasses it).
+    """
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load_file(path: PathLike) -> Any:
+    """Read and parse a JSON file."""
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def dump_file(path: PathLike, obj: Any, pretty: bool = False, atomic: bool = True) -> None:
+    """
+    Write obj as JSON. With atomic=True the file is written to a sibling
+    .tmp file first and moved into place with os.replace.
+    """
+    payload = dumpb(obj, pretty)
+    path = str(path)
+    target = path + ".tmp" if atomic else path
+    with open(target, "wb") as f:
+        f.write(payload)
+    if atomic:
+        os.replace(target, path)
@@ -1,8 +1,10 @@
 
 import re
+import time
 import pypinyin
 import itertools
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import List, Dict, Any, Iterable, Tuple
 
 # Common polyphonic characters mapping: character -> [main pronunciation, alternative pronunciation]
 common_polyphonic = {
@@ -23,6 +25,15 @@ common_polyphonic = {
     "解": ["jie", "xie"],
 }
 
+# Precompiled character classes: Chinese (CJK Unified Ideographs) and ASCII letters
+_NON_TEXT_RE = re.compile(r"[^\u4e00-\u9fa5a-zA-Z]+")
+_CHINESE_RE = re.compile(r"[\u4e00-\u9fa5]")
+_PARTS_RE = re.compile(r"[\u4e00-\u9fa5]+|[a-z]+")
+
+# Bounded memo sizes: whole normalized strings and individual Chinese/English runs
+PHONETICS_CACHE_SIZE = 4096
+PART_CACHE_SIZE = 8192
+
 # Contextual rules: specific pronunciations for specific words
 context_rules = {
     "便": {
@@ -32,6 +43,110 @@ context_rules = {
     }
 }
 
+def _lazy_pinyin(text: str) -> List[str]:
+    return pypinyin.lazy_pinyin(text, style=pypinyin.NORMAL, strict=False)
+
+
+@lru_cache(maxsize=PART_CACHE_SIZE)
+def _char_pinyin(char: str) -> Tuple[str, ...]:
+    """Most common pronunciation of a single character, read out of context."""
+    return tuple(_lazy_pinyin(char)[:1])
+
+
+@lru_cache(maxsize=PART_CACHE_SIZE)
+def _part_phonetics(part: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """
+    Pinyin candidates for one normalized run (all Chinese or all lowercase English).
+
+    Returns:
+        tuple: (initials candidates, full pinyin candidates)
+    """
+    if not _CHINESE_RE.match(part):
+        # English: Initial = first char, Full = word
+        return (part[0],), (part,)
+
+    # Check context rules first
+    for char, words in context_rules.items():
+        if char not in part:
+            continue
+        fixed_pinyin = words.get(part)  # Exact match for special word
+        if fixed_pinyin is None:
+            continue
+
+        other_chars = part.replace(char, "")
+        if not other_chars:
+            # Single char
+            return (fixed_pinyin[0],), (fixed_pinyin,)
+
+        other_pinyins = _lazy_pinyin(other_chars)
+        other_initials = "".join([py[0] for py in other_pinyins])
+        other_full = "".join(other_pinyins)
+
+        # Insert fixed pronunciation at correct position
+        if part.index(char) == 0:  # Char at start
+            return (fixed_pinyin[0] + other_initials,), (fixed_pinyin + other_full,)
+        # Char at end (assuming 2-char word)
+        return (other_initials + fixed_pinyin[0],), (other_full + fixed_pinyin,)
+
+    # Use default logic
+    main_pinyins = _lazy_pinyin(part)
+    main_initials = "".join([py[0] for py in main_pinyins])
+    main_full = "".join(main_pinyins)
+
+    # Check for common polyphonic characters
+    alternative_initials = []
+    alternative_full = []
+
+    if len(part) <= 2 and any(char in common_polyphonic for char in part):  # Only for short words
+        char_variants = []
+        for char in part:
+            if char in common_polyphonic:
+                char_variants.append(common_polyphonic[char][:2])
+            else:
+                char_variants.append(_char_pinyin(char))
+
+        # Generate combinations (max 2)
+        for combo in itertools.islice(itertools.product(*char_variants), 2):
+            alt_initials = "".join([py[0] for py in combo])
+            alt_full = "".join(combo)
+            if alt_initials != main_initials:
+                alternative_initials.append(alt_initials)
+            if alt_full != main_full:
+                alternative_full.append(alt_full)
+
+    # Combine results
+    return (main_initials, *alternative_initials[:1]), (main_full, *alternative_full[:1])
+
+
+@lru_cache(maxsize=PHONETICS_CACHE_SIZE)
+def _normalized_phonetics(normalized_text: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Memoized phonetics for text already reduced to Chinese chars and lowercase letters."""
+    final_initials = [""]
+    final_full = [""]
+
+    for part in _PARTS_RE.findall(normalized_text):
+        part_initials, part_full = _part_phonetics(part)
+
+        final_initials = [existing + item for existing in final_initials for item in part_initials]
+        final_full = [existing + item for existing in final_full for item in part_full]
+
+        # Strictly control total combinations
+        if len(final_initials) > 3:
+            final_initials = final_initials[:3]
+            final_full = final_full[:3]
+
+    # Deduplicate and sort
+    return (
+        tuple(sorted(set(item for item in final_initials if item))),
+        tuple(sorted(set(item for item in final_full if item))),
+    )
+
+
+def _normalize(text: str) -> str:
+    """Keep Chinese and English, ignore punctuation/spaces/numbers; lowercase English."""
+    return _NON_TEXT_RE.sub("", text).lower()
+
+
 def extract_phonetics(text: str) -> Dict[str, List[str]]:
     """
     Extract pinyin information from text for search matching.
@@ -43,6 +158,9 @@ def extract_phonetics(text: str) -> Dict[str, List[str]]:
     2. Add alternative pronunciations only for common polyphonic characters.
     3. Strictly control number of combinations to avoid obscure pronunciations.
 
+    Results are memoized per normalized string (bounded LRU), so repeated
+    lookups of the same names cost a dict hit instead of a pypinyin run.
+
     Args:
         text (str): Input text.
 
@@ -52,138 +170,76 @@ def extract_phonetics(text: str) -> Dict[str, List[str]]:
     if not text or not isinstance(text, str):
         return {"pinyin_initials": [], "pinyin_full_list": []}
 
-    # 1. Normalize: keep Chinese and English, ignore punctuation/spaces/numbers
-    normalized_chars = []
-    for char in text:
-        if re.match(r"[\u4e00-\u9fa5]", char):  # Chinese
-            normalized_chars.append(char)
-        elif re.match(r"[a-zA-Z]", char):  # English
-            normalized_chars.append(char.lower())
-
-    if not normalized_chars:
+    normalized_text = _normalize(text)
+    if not normalized_text:
         return {"pinyin_initials": [], "pinyin_full_list": []}
 
-    normalized_text = "".join(normalized_chars)
-
-    # 2. Separate Chinese and English parts
-    parts = re.findall(r"[\u4e00-\u9fa5]+|[a-z]+", normalized_text)
-
-    part_results = []
-
-    for part in parts:
-        if re.match(r"[\u4e00-\u9fa5]+", part):  # Chinese part
-            # Check context rules first
-            context_applied = False
-            part_initials = []
-            part_full = []
-
-            for char in context_rules:
-                if char in part:
-                    for word, fixed_pinyin in context_rules[char].items():
-                        if word == part:  # Exact match for special word
-                            # Calculate result for fixed pronunciation
-                            other_chars = part.replace(char, "")
-                            if other_chars:
-                                other_pinyins = pypinyin.lazy_pinyin(
-                                    other_chars, style=pypinyin.NORMAL, strict=False
-                                )
-                                other_initials = "".join(
-                                    [py[0] for py in other_pinyins]
-                                )
-                                other_full = "".join(other_pinyins)
-
-                                # Insert fixed pronunciation at correct position
-                                char_pos = part.index(char)
-                                if char_pos == 0:  # Char at start
-                                    part_initials = [fixed_pinyin[0] + other_initials]
-                                    part_full = [fixed_pinyin + other_full]
-                                else:  # Char at end (assuming 2-char word)
-                                    part_initials = [other_initials + fixed_pinyin[0]]
-                                    part_full = [other_full + fixed_pinyin]
-                            else:
-                                # Single char
-                                part_initials = [fixed_pinyin[0]]
-                                part_full = [fixed_pinyin]
-                            context_applied = True
-                            break
-                if context_applied:
-                    break
-
-            if not context_applied:
-                # Use default logic
-                main_pinyins = pypinyin.lazy_pinyin(
-                    part, style=pypinyin.NORMAL, strict=False
-                )
-                main_initials = "".join([py[0] for py in main_pinyins])
-                main_full = "".join(main_pinyins)
-
-                # Check for common polyphonic characters
-                alternative_initials = []
-                alternative_full = []
-
-                has_polyphonic = any(char in common_polyphonic for char in part)
-
-                if has_polyphonic and len(part) <= 2:  # Only for short words
-                    char_variants = []
-                    for char in part:
-                        if char in common_polyphonic:
-                            char_variants.append(common_polyphonic[char][:2])
-                        else:
-                            main_char_pinyin = pypinyin.lazy_pinyin(
-                                char, style=pypinyin.NORMAL, strict=False
-                            )
-                            char_variants.append(main_char_pinyin[:1])
-
-                    # Generate combinations (max 2)
-                    combinations = list(itertools.product(*char_variants))
-                    if len(combinations) > 2:
-                        combinations = combinations[:2]
-
-                    for combo in combinations:
-                        alt_initials = "".join([py[0] for py in combo])
-                        alt_full = "".join(combo)
-                        if alt_initials != main_initials:
-                            alternative_initials.append(alt_initials)
-                        if alt_full != main_full:
-                            alternative_full.append(alt_full)
-
-                # Combine results
-                part_initials = [main_initials] + alternative_initials[:1]
-                part_full = [main_full] + alternative_full[:1]
-
-        else:  # English part
-            # English: Initial = first char, Full = word
-            part_initials = [part[0]] if part else [""]
-            part_full = [part]
-
-        part_results.append({"initials": part_initials, "full": part_full})
-
-    # 3. Combine all parts
-    final_initials = [""]
-    final_full = [""]
+    initials, full = _normalized_phonetics(normalized_text)
+    return {"pinyin_initials": list(initials), "pinyin_full_list": list(full)}
 
-    for part_result in part_results:
-        new_initials = []
-        new_full = []
 
-        for existing_initial in final_initials:
-            for part_initial in part_result["initials"]:
-                new_initials.append(existing_initial + part_initial)
+def extract_phonetics_batch(texts: Iterable[str]) -> List[Dict[str, List[str]]]:
+    """
+    Extract phonetics for many strings at once.
 
-        for existing_full in final_full:
-            for part_full_item in part_result["full"]:
-                new_full.append(existing_full + part_full_item)
+    Duplicate inputs are computed once; results keep the input order.
 
-        final_initials = new_initials
-        final_full = new_full
+    Args:
+        texts: Input strings.
 
-        # Strictly control total combinations
-        if len(final_initials) > 3:
-            final_initials = final_initials[:3]
-            final_full = final_full[:3]
+    Returns:
+        list: One extract_phonetics result per input.
+    """
+    computed: Dict[Any, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {}
+    results = []
+    for text in texts:
+        if text not in computed:
+            normalized_text = _normalize(text) if text and isinstance(text, str) else ""
+            computed[text] = _normalized_phonetics(normalized_text) if normalized_text else ((), ())
+        initials, full = computed[text]
+        results.append({"pinyin_initials": list(initials), "pinyin_full_list": list(full)})
+    return results
+
+
+def phonetics_cache_info() -> Dict[str, Any]:
+    """Hit/miss statistics of the phonetics memo."""
+    return {
+        "strings": _normalized_phonetics.cache_info()._asdict(),
+        "parts": _part_phonetics.cache_info()._asdict(),
+    }
 
-    # 4. Deduplicate and sort
-    pinyin_initials = sorted(list(set([item for item in final_initials if item])))
-    pinyin_full_list = sorted(list(set([item for item in final_full if item])))
 
-    return {"pinyin_initials": pinyin_initials, "pinyin_full_list": pinyin_full_list}
+def _benchmark(rounds: int = 2000) -> None:
+    """Micro-benchmark: cold vs memoized extraction on typical dish/card titles."""
+    samples = [
+        "番茄炒蛋", "宫保鸡丁 米饭", "方便面", "便宜的牛奶", "Coca Cola 零度",
+        "重庆小面", "长寿面 加蛋", "还行的早餐", "单人套餐", "鸡胸肉沙拉 light",
+    ]
+
+    _normalized_phonetics.cache_clear()
+    _part_phonetics.cache_clear()
+    _char_pinyin.cache_clear()
+    start = time.perf_counter()
+    for sample in samples:
+        extract_phonetics(sample)
+    cold = (time.perf_counter() - start) / len(samples)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for sample in samples:
+            extract_phonetics(sample)
+    warm = (time.perf_counter() - start) / (rounds * len(samples))
+
+    start = time.perf_counter()
+    for _ in range(rounds // 10):
+        extract_phonetics_batch(samples * 10)
+    batch = (time.perf_counter() - start) / (rounds * len(samples))
+
+    print(f"cold:     {cold * 1e6:8.1f} us/call")
+    print(f"memoized: {warm * 1e6:8.1f} us/call")
+    print(f"batch:    {batch * 1e6:8.1f} us/item")
+    print(phonetics_cache_info())
+
+
+if __name__ == "__main__":
+    _benchmark()
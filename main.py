@@ -85,20 +85,15 @@ def setup_application():
                     scheduler_type = event.data.get(SchedulerConstKeys.SCHEDULER_TYPE)
 
                     if scheduler_type == SchedulerTaskTypes.DAILY_SCHEDULE:
-                        # 尝试生成卡片再发送？
                         card_data = result.response_content
 
-                        for user_id in result.user_list:
-                            card_content = {"type": "card_json", "data": card_data}
-                            card_id = feishu_adapter.sender.create_card_entity(card_content)
-                            if card_id:
-                                result.response_content = {"type": "card", "data": {"card_id": card_id}}
-                            msg_success, msg_id =feishu_adapter.sender.send_direct_message(user_id, result)
+                        # 批量预取用户名，后续发送链路不再逐个查询
+                        feishu_adapter.sender.resolve_user_names(result.user_list)
 
-                            if card_id:
-                                cache_service = app_controller.get_service(ServiceNames.CACHE)
-                                cache_service.update_message_id_card_id_mapping(msg_id, card_id, "日报卡片")
-                                cache_service.save_message_id_card_id_mapping()
+                        # 并发限速群发，映射文件在全部发送后统一保存
+                        feishu_adapter.sender.broadcast_card(
+                            result.user_list, card_data, "日报卡片"
+                        )
 
                     else:
                         _, msg_id =feishu_adapter.sender.send_direct_message(admin_id, result)
@@ -291,9 +286,8 @@ def run_scheduler_loop(app_controller):
     scheduler_service = app_controller.get_service(ServiceNames.SCHEDULER)
 
     try:
-        while True:
-            scheduler_service.run_pending()
-            time.sleep(1)
+        # 事件驱动：按最近的触发时间休眠，任务在线程池中运行
+        scheduler_service.run_forever()
     except KeyboardInterrupt:
         pass
     except Exception as e: